@@ -5,13 +5,15 @@ from datetime import datetime
 import discord
 import logging
 import math
+import metrics
 import os
+import time
 import traceback
 import glob
 
 from discord.ext import commands
 from config import config
-from db import SQL
+from db import REST, SQL
 from discord_info import GUILD_ID, WELCOME_LOBBY
 from pytz import timezone
 
@@ -65,6 +67,27 @@ async def on_ready():
     logging.info("Connected as {0.user} and ready!".format(bot))
 
 
+@bot.event
+async def on_socket_event_type(event_type):
+    metrics.GATEWAY_EVENTS.inc(event=event_type)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.command_started = time.perf_counter()
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    elapsed = time.perf_counter() - ctx.command_started
+    metrics.COMMAND_LATENCY.observe(elapsed, command=ctx.command.qualified_name)
+    logging.info(
+        f"<<<COMMAND>>> !{ctx.command.qualified_name} "
+        f"by {ctx.author.id} in {ctx.channel.id} "
+        f"{'failed' if ctx.command_failed else 'ok'} ({elapsed:.3f}s)"
+    )
+
+
 class NotInTheWelcomeLobby(commands.CheckFailure):
     pass
 
@@ -115,9 +138,13 @@ async def main():
                 logging.warning(
                     "Failed to load extension {}\n{}".format(extension, exc)
                 )
+        await metrics.start("bot_port")
         logging.info(f"Starting! Discord Version {discord.__version__}")
         await bot.start(config.discord.botsecret)
+        await REST.close()
         logging.info("Done, closing out")
 
 
-asyncio.run(main())
+# Worker processes (e.g. for !cryptogram) import this module too
+if __name__ == "__main__":
+    asyncio.run(main())
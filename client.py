@@ -4,9 +4,11 @@ import asyncio
 import discord
 import json
 import logging
+import metrics
 import nest_asyncio
 import os
 import pymysql
+import time
 
 from common import (
     build_puzzle_embed,
@@ -15,6 +17,7 @@ from common import (
 )
 from config import config
 from datetime import datetime, timedelta
+from db import REST
 from discord_info import (
     GUILD_ID,
     STATUS_CHANNEL,
@@ -67,7 +70,11 @@ async def gen_handle_server_request(reader, writer):
         if message:
             logging.info("Recv: %r" % message)
             command, *args = message.split()
+            start = time.perf_counter()
             response = await gen_run(command, args) + "\n"
+            metrics.COMMAND_LATENCY.observe(
+                time.perf_counter() - start, command=command
+            )
     except Exception as e:
         logging.error(e, exc_info=e)
     finally:
@@ -139,6 +146,11 @@ async def gen_run(command, args):
     raise Exception("command {0} not supported!".format(command))
 
 
+@client.event
+async def on_socket_event_type(event_type):
+    metrics.GATEWAY_EVENTS.inc(event=event_type)
+
+
 @client.event
 async def on_error(*args, **kwargs):
     await client.close()
@@ -510,6 +522,11 @@ def get_puzzle_and_channel(puzzle_name):
 
 
 def _get_puzzle_from_db(puzzle_name):
+    with metrics.DB_LATENCY.time(query="puzzle_by_name"):
+        return _select_puzzle_by_name(puzzle_name)
+
+
+def _select_puzzle_by_name(puzzle_name):
     connection = get_db_connection()
     logging.info("Connected to DB!")
     with connection.cursor() as cursor:
@@ -564,8 +581,10 @@ async def main():
         logging.getLogger("discord").setLevel(logging.WARNING)
 
     logging.info("Starting!")
+    await metrics.start("client_port")
     async with client:
         await client.start(config.discord.botsecret)
+        await REST.close()
     logging.info("Done, closing out")
 
 
@@ -106,3 +106,119 @@ def plural(num, singular, plural=None):
     if num == 1:
         return "1 {}".format(singular)
     return "{} {}".format(num, plural or (singular + "s"))
+
+
+MESSAGE_LIMIT = 2000
+EMBEDS_PER_MESSAGE = 3  # Embeds share a 6000 char limit per message
+
+
+def paginate(text, limit=MESSAGE_LIMIT):
+    """Splits text into pages of at most `limit` chars, between lines where
+    possible. A code block which spans pages gets closed at the end of one
+    page and reopened (with the same language) at the start of the next."""
+    if len(text) <= limit:
+        return [text]
+    # Always leave room to close a code block
+    limit -= len("\n```")
+    pages = []
+    page = []
+    size = 0
+    fence = None
+
+    def flush():
+        pages.append("\n".join(page) + ("\n```" if fence else ""))
+        page[:] = [fence] if fence else []
+        return len(fence) if fence else 0
+
+    for line in text.split("\n"):
+        while size + bool(page) + len(line) > limit:
+            if page and page != [fence]:
+                size = flush()
+                continue
+            # Too long even for a fresh page, so split the line itself
+            room = limit - size - bool(page)
+            page.append(line[:room])
+            line = line[room:]
+            size = flush()
+        size += bool(page) + len(line)
+        page.append(line)
+        for _ in range(line.count("```")):
+            if fence is None:
+                language = line.split("```", 1)[1].split("`")[0].strip()
+                fence = "```" + ("" if " " in language else language)
+            else:
+                fence = None
+    if page and page != [fence]:
+        pages.append("\n".join(page))
+    return pages
+
+
+async def send_paginated(send, text, *, embeds=False, buttons=False, author=None):
+    """Sends text which may be over Discord's limit, using `send` (e.g.
+    ctx.reply or channel.send). With `embeds`, pages go out as embeds,
+    several to a message, so long listings need fewer API calls. With
+    `buttons`, only the first page gets sent, with buttons to flip through
+    the rest, which only `author` (if given) can press."""
+    if buttons:
+        pages = paginate(text, limit=MESSAGE_LIMIT - len("\n-# Page 99/99"))
+        if len(pages) > 1:
+            view = Paginator(pages, author)
+            view.message = await send(view.content(), view=view)
+            return
+    pages = paginate(text)
+    if not embeds:
+        for page in pages:
+            await send(page)
+        return
+    for i in range(0, len(pages), EMBEDS_PER_MESSAGE):
+        await send(
+            embeds=[
+                discord.Embed(description=page)
+                for page in pages[i : i + EMBEDS_PER_MESSAGE]
+            ]
+        )
+
+
+class Paginator(discord.ui.View):
+    def __init__(self, pages, author=None, timeout=600.0):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.author = author
+        self.page = 0
+        self.message = None
+        self._update_buttons()
+
+    def content(self):
+        return "{}\n-# Page {}/{}".format(
+            self.pages[self.page], self.page + 1, len(self.pages)
+        )
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == len(self.pages) - 1
+
+    async def interaction_check(self, interaction):
+        if self.author is None or interaction.user.id == self.author.id:
+            return True
+        await interaction.response.send_message(
+            f"Only {self.author.mention} can turn these pages.", ephemeral=True
+        )
+        return False
+
+    async def _show(self, interaction):
+        self._update_buttons()
+        await interaction.response.edit_message(content=self.content(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        self.page = max(0, self.page - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        self.page = min(len(self.pages) - 1, self.page + 1)
+        await self._show(interaction)
+
+    async def on_timeout(self):
+        if self.message:
+            await self.message.edit(view=None)
@@ -1,58 +1,118 @@
 """Methods for interacting with the puzzbost REST api and SQL database"""
 
 import aiohttp
+import asyncio
 import discord
 import logging
+import metrics
 import pymysql
 import re
+import time
 from config import config
 from discord_info import is_puzzle_channel
 from munch import munchify
 
 
 class REST:
+    # Class variable to store the pooled session once established
+    session = None
+
+    # Whether Puzzleboss accepts all botstats in one POST; None until we try
+    batch_botstats = None
+
+    @staticmethod
+    def _get_session():
+        if REST.session and not REST.session.closed:
+            return REST.session
+        REST.session = aiohttp.ClientSession()
+        return REST.session
+
+    @staticmethod
+    async def close():
+        if REST.session:
+            await REST.session.close()
+            REST.session = None
+
     @staticmethod
     async def get(path):
         url = config.puzzledb["rest_url"] + path
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    logging.info(f"GET to {path} ; Response status = {response.status}")
-                else:
-                    resp_text = await response.text()
-                    logging.error(
-                        f"GET to {path} ; Response status = {response.status} ; Response = {resp_text}"
-                    )
-                return response
+        start = time.perf_counter()
+        async with REST._get_session().get(url) as response:
+            metrics.REST_LATENCY.observe(
+                time.perf_counter() - start, method="GET", status=response.status
+            )
+            if response.status == 200:
+                logging.info(f"GET to {path} ; Response status = {response.status}")
+            else:
+                resp_text = await response.text()
+                logging.error(
+                    f"GET to {path} ; Response status = {response.status} ; Response = {resp_text}"
+                )
+            return response
 
     @staticmethod
     async def post(path, data=None):
         url = config.puzzledb["rest_url"] + path
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data) as response:
-                if response.status == 200:
-                    logging.info(
-                        f"POST to {path} ; "
-                        f"Data = {data} ; "
-                        f"Response status = {response.status}"
-                    )
-                else:
-                    resp_text = await response.text()
-                    logging.error(
-                        f"POST to {path} ; "
-                        f"Data = {data} ; "
-                        f"Response status = {response.status} ; "
-                        f"Response = {resp_text}"
-                    )
-                return response
+        start = time.perf_counter()
+        async with REST._get_session().post(url, json=data) as response:
+            metrics.REST_LATENCY.observe(
+                time.perf_counter() - start, method="POST", status=response.status
+            )
+            if response.status == 200:
+                logging.info(
+                    f"POST to {path} ; "
+                    f"Data = {data} ; "
+                    f"Response status = {response.status}"
+                )
+            else:
+                resp_text = await response.text()
+                logging.error(
+                    f"POST to {path} ; "
+                    f"Data = {data} ; "
+                    f"Response status = {response.status} ; "
+                    f"Response = {resp_text}"
+                )
+            return response
+
+    @staticmethod
+    async def post_botstats(botstats):
+        """Uploads a dict of botstats, returning the ones which failed. If
+        the batch upload fails, we fall back to posting them individually."""
+        if REST.batch_botstats is not False:
+            try:
+                response = await REST.post("/botstats", botstats)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Batch botstats failed: {e!r}")
+            else:
+                if 200 <= response.status < 300:
+                    REST.batch_botstats = True
+                    return {}
+                if response.status in [404, 405]:
+                    logging.info("Batch botstats unsupported")
+                    REST.batch_botstats = False
+
+        keys = list(botstats.keys())
+        responses = await asyncio.gather(
+            *[REST.post(f"/botstats/{key}", {"val": botstats[key]}) for key in keys],
+            return_exceptions=True,
+        )
+        return {
+            key: botstats[key]
+            for key, response in zip(keys, responses)
+            if isinstance(response, Exception) or not 200 <= response.status < 300
+        }
 
     @staticmethod
     async def update_puzzle(puzzle_id, **parts):
-        return await REST._post_parts("puzzles", puzzle_id, parts)
+        response = await REST._post_parts("puzzles", puzzle_id, parts)
+        PuzzleCache.invalidate()
+        return response
 
     @staticmethod
     async def update_round(round_id, **parts):
-        return await REST._post_parts("rounds", round_id, parts)
+        response = await REST._post_parts("rounds", round_id, parts)
+        PuzzleCache.invalidate()
+        return response
 
     @staticmethod
     async def update_solver(solver_id, **parts):
@@ -95,17 +155,19 @@ class SQL:
     def select_one(query: str, args=None):
         assert query.split()[0].upper() == "SELECT", "SELECT only!"
         connection = SQL._get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute(query, args)
-            return cursor.fetchone()
+        with metrics.DB_LATENCY.time(query="select_one"):
+            with connection.cursor() as cursor:
+                cursor.execute(query, args)
+                return cursor.fetchone()
 
     @staticmethod
     def select_all(query: str, args=None):
         assert query.split()[0].upper() == "SELECT", "SELECT only!"
         connection = SQL._get_db_connection()
-        with connection.cursor() as cursor:
-            cursor.execute(query, args)
-            return cursor.fetchall()
+        with metrics.DB_LATENCY.time(query="select_all"):
+            with connection.cursor() as cursor:
+                cursor.execute(query, args)
+                return cursor.fetchall()
 
     @staticmethod
     def get_hunt_config():
@@ -242,7 +304,8 @@ class SQL:
                 answer,
                 xyzloc,
                 tags,
-                comments
+                comments,
+                cursolvers
             FROM puzzle_view
             WHERE
                 roundname <> "mistakes"
@@ -250,6 +313,29 @@ class SQL:
             """,
         )
 
+    @staticmethod
+    def get_solve_times():
+        return SQL.select_all(
+            """
+            SELECT
+                p.name,
+                p.roundname AS round_name,
+                a.solve_time
+            FROM (
+                SELECT
+                    puzzle_id,
+                    MAX(time) - INTERVAL 5 HOUR AS solve_time
+                FROM activity
+                WHERE type = 'solve'
+                GROUP BY puzzle_id
+            ) a
+            JOIN (SELECT id, name, roundname FROM puzzle_view WHERE status = 'Solved') p
+                ON (a.puzzle_id = p.id)
+            ORDER BY
+                a.solve_time
+            """,
+        )
+
     @staticmethod
     def get_hipri_puzzles():
         return SQL.select_all(
@@ -325,6 +411,45 @@ class SQL:
             """,
         )
 
+    @staticmethod
+    def get_pending_solvers():
+        """Registrations still waiting on an email confirmation"""
+        return SQL.select_all(
+            """
+            SELECT
+                username,
+                fullname
+            FROM newuser
+            """,
+        )
+
+    @staticmethod
+    def get_solver_puzzle_names():
+        """Every solver's Discord ID, and the puzzles they've worked on"""
+        return SQL.select_all(
+            """
+            SELECT
+                id AS solver_id,
+                chat_uid AS discord_id,
+                puzzles
+            FROM solver_view
+            ORDER BY id
+            """,
+        )
+
+    @staticmethod
+    def get_puzzle_links():
+        return SQL.select_all(
+            """
+            SELECT
+                name,
+                roundname AS round_name,
+                puzzle_uri
+            FROM puzzle_view
+            ORDER BY id
+            """,
+        )
+
     @staticmethod
     def get_solver_ids_since(time):
         rows = SQL.select_all(
@@ -337,3 +462,82 @@ class SQL:
             time,
         )
         return [row["solver_id"] for row in rows]
+
+
+class PuzzleCache:
+    """In-memory snapshot of get_all_puzzles and get_solved_round_names.
+
+    Refreshed on the next read after invalidate() (which we call whenever we
+    learn that a puzzle changed), or once the snapshot is max_age seconds old,
+    to catch edits made directly in Puzzleboss. Each refresh is diffed against
+    the previous snapshot, and subscribers get called with (old, new) for
+    every puzzle which changed, so they can update incrementally.
+    """
+
+    max_age = 30.0
+    puzzles = {}
+    solved_round_names = []
+    version = 0
+    fetched_at = 0.0
+    stale = True
+    listeners = []
+
+    @staticmethod
+    def invalidate():
+        PuzzleCache.stale = True
+
+    @staticmethod
+    def subscribe(listener):
+        """Calls listener(old, new) for each puzzle change, starting with
+        (None, puzzle) for every puzzle we already know about"""
+        PuzzleCache.listeners.append(listener)
+        for puzzle in PuzzleCache.puzzles.values():
+            listener(None, puzzle)
+
+    @staticmethod
+    def unsubscribe(listener):
+        if listener in PuzzleCache.listeners:
+            PuzzleCache.listeners.remove(listener)
+
+    @staticmethod
+    def get_all_puzzles():
+        PuzzleCache._refresh_if_needed()
+        return list(PuzzleCache.puzzles.values())
+
+    @staticmethod
+    def get_solved_round_names():
+        PuzzleCache._refresh_if_needed()
+        return PuzzleCache.solved_round_names
+
+    @staticmethod
+    def _refresh_if_needed():
+        age = time.monotonic() - PuzzleCache.fetched_at
+        if PuzzleCache.stale or age > PuzzleCache.max_age:
+            PuzzleCache.refresh()
+
+    @staticmethod
+    def refresh():
+        # If the queries fail, we're still stale, and the next read retries
+        fetched_at = time.monotonic()
+        puzzles = {puzzle["id"]: puzzle for puzzle in SQL.get_all_puzzles()}
+        solved_round_names = SQL.get_solved_round_names()
+
+        changes = [
+            (PuzzleCache.puzzles.get(id), puzzle)
+            for id, puzzle in puzzles.items()
+            if PuzzleCache.puzzles.get(id) != puzzle
+        ] + [
+            (puzzle, None)
+            for id, puzzle in PuzzleCache.puzzles.items()
+            if id not in puzzles
+        ]
+        PuzzleCache.stale = False
+        PuzzleCache.fetched_at = fetched_at
+        if not changes and solved_round_names == PuzzleCache.solved_round_names:
+            return
+        PuzzleCache.puzzles = puzzles
+        PuzzleCache.solved_round_names = solved_round_names
+        PuzzleCache.version += 1
+        for listener in PuzzleCache.listeners:
+            for old, new in changes:
+                listener(old, new)
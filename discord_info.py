@@ -17,6 +17,8 @@ WELCOME_LOBBY = int(config.guild.channels.welcome_lobby)
 PUZZTECH_CHANNEL = int(config.guild.channels.puzztech)
 STATUS_CHANNEL = int(config.guild.channels.status)
 TABLE_REPORT_CHANNEL = int(config.guild.channels.table_report)
+# Optional: where to keep a live list of folks needing verification
+VERIFICATION_CHANNEL = int(config.guild.channels.get("verification", 0) or 0)
 
 PUZZLE_CATEGORY = int(config.guild.categories.puzzles)
 SOLVED_PUZZLE_CATEGORY = int(config.guild.categories.solved_puzzles)
@@ -73,3 +75,70 @@ def is_table_channel(channel):
 
 def get_tables(guild):
     return [channel for channel in guild.voice_channels if is_table_channel(channel)]
+
+
+class MemberIndex:
+    """Who has which role, who is online, and who is sitting at which table.
+    Built once from the member cache, then kept current from gateway events,
+    so readers never have to walk every member."""
+
+    def __init__(self):
+        self.ready = False
+        self.member_roles = {}
+        self.members_by_role = {}
+        self.online = set()
+        self.online_by_role = {}
+        self.member_table = {}
+        self.table_members = {}
+
+    def rebuild(self, guild):
+        self.__init__()
+        for member in guild.members:
+            self.update_member(member)
+            self.update_voice(member)
+        self.ready = True
+
+    def update_member(self, member):
+        """Refresh a member's roles and online status"""
+        self._forget_roles(member.id)
+        roles = frozenset(role.id for role in member.roles)
+        self.member_roles[member.id] = roles
+        is_online = member.status != discord.Status.offline
+        if is_online:
+            self.online.add(member.id)
+        for role_id in roles:
+            self.members_by_role.setdefault(role_id, set()).add(member.id)
+            if is_online:
+                self.online_by_role.setdefault(role_id, set()).add(member.id)
+
+    def update_voice(self, member):
+        """Refresh which table (if any) a member is sitting at"""
+        self._forget_table(member.id)
+        table = get_table(member)
+        if table:
+            self.member_table[member.id] = table.id
+            self.table_members.setdefault(table.id, set()).add(member.id)
+
+    def remove_member(self, member):
+        self._forget_roles(member.id)
+        self._forget_table(member.id)
+
+    def _forget_roles(self, member_id):
+        self.online.discard(member_id)
+        for role_id in self.member_roles.pop(member_id, ()):
+            self.members_by_role[role_id].discard(member_id)
+            self.online_by_role.get(role_id, set()).discard(member_id)
+
+    def _forget_table(self, member_id):
+        table_id = self.member_table.pop(member_id, None)
+        if table_id is not None:
+            self.table_members[table_id].discard(member_id)
+
+    def members_with_role(self, role_id):
+        return self.members_by_role.get(role_id, set())
+
+    def online_with_role(self, role_id):
+        return self.online_by_role.get(role_id, set())
+
+    def at_table(self, table_id):
+        return self.table_members.get(table_id, set())
@@ -1,25 +1,188 @@
 """Get an overview of the entire hunt status"""
 
-from db import REST, SQL
+import asyncio
+from db import PuzzleCache, REST, SQL
 import discord
 from discord.ext import commands, tasks
+from discord.ext.commands import has_any_role
 import discord_info
 import json
+import io
 import logging
-from quickchart import QuickChart
+import metrics
 import re
-from common import plural, xyzloc_mention
-from datetime import timedelta
+import time
+from common import plural, send_paginated, xyzloc_mention
+from datetime import datetime, timedelta
+from extensions.util.activity import ActivityWindow
+import extensions.util.chart as chart
+from extensions.util.forecast import SolveForecast
+from extensions.util.timeseries import ColumnStore, flatten
 import typing
 
 
+class RoundSummary:
+    """Per-round puzzle counts for !status, kept current one changed puzzle
+    at a time as PuzzleCache notices changes"""
+
+    STATUSES = ["Solved", "Needs eyes", "Critical", "WTF", "Unnecessary"]
+
+    def __init__(self):
+        self.rounds = {}
+        self.total = 0
+        self.solved = 0
+
+    def apply(self, old, new):
+        if old:
+            self._count(old, -1)
+        if new:
+            self._count(new, 1)
+
+    def _count(self, puzzle, delta):
+        round_name = puzzle["round_name"]
+        if round_name not in self.rounds:
+            self.rounds[round_name] = {
+                "total": 0,
+                "Other": 0,
+                **{status: 0 for status in self.STATUSES},
+                "num_metas": 0,
+                "num_metas_solved": 0,
+                "max_id": 0,
+                "xyzlocs": {},
+            }
+        round = self.rounds[round_name]
+        status = puzzle["status"]
+        round["total"] += delta
+        round[status if status in self.STATUSES else "Other"] += delta
+        if puzzle["ismeta"]:
+            round["num_metas"] += delta
+            if status == "Solved":
+                round["num_metas_solved"] += delta
+        xyzloc = puzzle["xyzloc"]
+        if xyzloc and status != "Solved":
+            round["xyzlocs"][xyzloc] = round["xyzlocs"].get(xyzloc, 0) + delta
+            if not round["xyzlocs"][xyzloc]:
+                del round["xyzlocs"][xyzloc]
+        # Puzzle ids only go up, so a removal can't lower this in practice
+        round["max_id"] = max(round["max_id"], int(puzzle["id"]))
+        if not round["total"]:
+            del self.rounds[round_name]
+
+        self.total += delta
+        if status == "Solved" and puzzle["answer"]:
+            self.solved += delta
+
+    def approx_solvers(self, round_name, table_sizes):
+        xyzlocs = self.rounds[round_name]["xyzlocs"]
+        return sum(table_sizes.get(xyzloc, 0) for xyzloc in xyzlocs)
+
+
+class HipriView:
+    """Priority puzzles for !hipri, kept current from PuzzleCache changes.
+
+    Everything in a puzzle's priority score which only changes along with
+    the puzzle itself is precomputed here; !hipri just adds on how long it's
+    been neglected.
+    """
+
+    STATUSES = {"Critical": 300, "Needs eyes": 200, "WTF": 100}
+    # Metas are always listed, unless there's nothing left to do on them
+    DONE_STATUSES = ["Solved", "Unnecessary"]
+
+    def __init__(self):
+        self.puzzles = {}
+        self.base_scores = {}
+        self.status_since = {}
+        self.last_active = {}
+        self.version = 0
+
+    def apply(self, old, new):
+        puzzle = new or old
+        id = puzzle["id"]
+        # We only know when a status changed if we saw it happen, so puzzles
+        # we first see at startup don't get time-in-status points yet
+        if new is None:
+            self.status_since.pop(id, None)
+        elif old is not None and old["status"] != new["status"]:
+            self.status_since[id] = time.time()
+        if new and (
+            new["status"] in self.STATUSES
+            or (new["ismeta"] and new["status"] not in self.DONE_STATUSES)
+        ):
+            solvers = [name for name in (new["cursolvers"] or "").split(",") if name]
+            channel_id = new["channel_id"] or ""
+            self.puzzles[id] = dict(
+                new,
+                num_solvers=len(solvers),
+                discord_channel_id=int(channel_id) if channel_id.isdigit() else 0,
+            )
+            self.base_scores[id] = (
+                self.STATUSES.get(new["status"], 0)
+                + (50 if new["ismeta"] else 0)
+                - 20 * len(solvers)
+            )
+        elif id in self.puzzles:
+            del self.puzzles[id]
+            del self.base_scores[id]
+        self.version += 1
+
+    def touch(self, channel_id, timestamp):
+        self.last_active[channel_id] = timestamp
+
+    def idle_seconds(self, puzzle, now):
+        return now - self.last_active.get(puzzle["discord_channel_id"], now)
+
+    def score(self, puzzle, now):
+        """Up to 2 points per idle minute (for 2 hours), and half a point per
+        minute in this status (for 4 hours, once we've seen it change), on top
+        of the base score"""
+        idle_minutes = self.idle_seconds(puzzle, now) / 60
+        status_minutes = (now - self.status_since.get(puzzle["id"], now)) / 60
+        return (
+            self.base_scores[puzzle["id"]]
+            + 2 * min(idle_minutes, 120)
+            + 0.5 * min(status_minutes, 240)
+        )
+
+    def ranked(self, now):
+        return sorted(
+            self.puzzles.values(),
+            key=lambda puzzle: (-self.score(puzzle, now), puzzle["id"]),
+        )
+
+
 class HuntStatus(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.activity = ActivityWindow(minutes=15)
+        self.activity_backfilled = False
+        self.member_index = discord_info.MemberIndex()
+        self.solve_times = None
+        self.solve_version = 0
+        self.progress_config = None
+        self.progress_chart = None
+        self.forecast = None
+        self.metrics_store = ColumnStore("logs/metrics")
+        self.botstats_pending = {}
+        self.botstats_upload = None
+        self.wrapups = None
+        self.wrapup_sender = None
+        self.round_summary = RoundSummary()
+        self.status_embed = None
+        self.hipri_view = HipriView()
+        self.hipri_response = None
+        PuzzleCache.subscribe(self.round_summary.apply)
+        PuzzleCache.subscribe(self.hipri_view.apply)
         self.log_metrics.start()
 
     def cog_unload(self):
         self.log_metrics.cancel()
+        PuzzleCache.unsubscribe(self.round_summary.apply)
+        PuzzleCache.unsubscribe(self.hipri_view.apply)
+        if self.botstats_upload:
+            self.botstats_upload.cancel()
+        if self.wrapup_sender:
+            self.wrapup_sender.cancel()
 
     @tasks.loop(seconds=60.0, reconnect=True)
     async def log_metrics(self):
@@ -31,49 +194,26 @@ class HuntStatus(commands.Cog):
             return
         if now > self.bot.hunt_ends:
             return
-        members = discord_info.get_team_members(guild)
-        online_members = [
-            member for member in members if member.status != discord.Status.offline
-        ]
-        puzzles = SQL.get_all_puzzles()
-        rounds = set(puzzle["round_name"] for puzzle in puzzles)
-        solved = [
-            puzzle
-            for puzzle in puzzles
-            if puzzle["status"] == "Solved" and puzzle["answer"]
-        ]
+        index = self._get_member_index(guild)
+        members = index.members_with_role(discord_info.HUNT_MEMBER_ROLE)
+        online_members = index.online_with_role(discord_info.HUNT_MEMBER_ROLE)
+        PuzzleCache.get_all_puzzles()
+        summary = self.round_summary
         active_in_voice = set()
         tables_in_use = set()
-        tables = [
-            channel
-            for channel in guild.voice_channels
-            if "tables" in str(channel.category).lower()
-        ]
-        for table in tables:
-            for user in table.members:
-                if user in members and user.voice != discord.VoiceState.self_deaf:
-                    active_in_voice.add(user.id)
-                    tables_in_use.add(table.id)
+        for table_id, table_members in index.table_members.items():
+            table_members = table_members & members
+            if table_members:
+                active_in_voice |= table_members
+                tables_in_use.add(table_id)
 
         time_window_start = now - timedelta(minutes=15.0)
-        last_loop_snowflake = (
-            discord.utils.time_snowflake(now - timedelta(seconds=60.0), high=False) - 1
-        )
+        if not self.activity_backfilled:
+            await self._backfill_activity(guild, members, time_window_start)
 
-        active_in_text = set()
-        messages_per_minute = 0
-        for channel in guild.text_channels:
-            last_message_id = channel.last_message_id
-            if not last_message_id:
-                continue
-            last_message_time = discord.utils.snowflake_time(last_message_id)
-            if last_message_time < time_window_start:
-                continue
-            async for message in channel.history(after=time_window_start):
-                if message.author in members:
-                    active_in_text.add(message.author.id)
-                    if message.id >= last_loop_snowflake:
-                        messages_per_minute += 1
+        active_in_text = self.activity.authors()
+        messages_per_minute = self.activity.messages(minutes=1)
+        active_text_channels = len(self.activity.channels())
 
         active_in_sheets = set()
         solvers = SQL.get_all_solvers()
@@ -86,7 +226,7 @@ class HuntStatus(commands.Cog):
         emoji_roles = discord_info.get_emoji_roles(guild)
         in_person_role = emoji_roles.get("🏛️", None)
         if in_person_role is not None:
-            in_person_members = set(member.id for member in in_person_role.members)
+            in_person_members = index.members_with_role(in_person_role.id)
         else:
             in_person_members = set()
         active_anywhere = set().union(active_in_text, active_in_voice, active_in_sheets)
@@ -95,9 +235,9 @@ class HuntStatus(commands.Cog):
             "time": self.bot.now().strftime("%Y-%m-%dT%H:%M:%S"),
             "hours_in": self.get_hunt_hours_clock(),
             "puzzles": {
-                "total": len(puzzles),
-                "solved": len(solved),
-                "rounds": len(rounds),
+                "total": summary.total,
+                "solved": summary.solved,
+                "rounds": len(summary.rounds),
             },
             "members": {
                 "total": len(members),
@@ -117,7 +257,9 @@ class HuntStatus(commands.Cog):
                 ),
             },
             "messages_per_minute": messages_per_minute,
+            "active_text_channels": active_text_channels,
             "tables_in_use": len(tables_in_use),
+            "forecast": self._project(),
         }
 
         logging.info(
@@ -125,6 +267,12 @@ class HuntStatus(commands.Cog):
             f"{json.dumps(metrics_payload)}"
         )
 
+        self._export_gauges(metrics_payload)
+        try:
+            self.metrics_store.append(time.time(), flatten(metrics_payload))
+        except OSError as e:
+            logging.error(e, exc_info=e)
+
         members_metrics = metrics_payload["members"]
         botstats = {
             "puzzcord_members_total": members_metrics["total"],
@@ -138,8 +286,111 @@ class HuntStatus(commands.Cog):
             "puzzcord_messages_per_minute": metrics_payload["messages_per_minute"],
             "puzzcord_tables_in_use": metrics_payload["tables_in_use"],
         }
-        for key, val in botstats.items():
-            await REST.post(f"/botstats/{key}", data={"val": val})
+        self.botstats_pending.update(botstats)
+        if not self.botstats_upload or self.botstats_upload.done():
+            self.botstats_upload = asyncio.create_task(self._upload_botstats())
+
+    def _export_gauges(self, payload, prefix="puzzcord"):
+        """Mirrors numeric metrics_payload values as /metrics gauges,
+        named the same way as botstats (e.g. puzzcord_members_online)"""
+        for key, val in payload.items():
+            name = f"{prefix}_{key}"
+            if isinstance(val, dict):
+                self._export_gauges(val, prefix=name)
+            elif isinstance(val, (int, float)):
+                metrics.gauge(name, f"log_metrics: {key}").set(val)
+
+    async def _upload_botstats(self):
+        """Drains pending botstats in the background, so a slow Puzzleboss
+        never holds up the metrics loop. Botstats are gauges, so a newer
+        snapshot queued while we were retrying replaces the older values."""
+        backoff = 5.0
+        while self.botstats_pending:
+            botstats, self.botstats_pending = self.botstats_pending, {}
+            try:
+                failed = await asyncio.wait_for(
+                    REST.post_botstats(botstats), timeout=45.0
+                )
+            except Exception as e:
+                logging.warning(f"Botstats upload failed: {e!r}")
+                failed = botstats
+            if not failed:
+                backoff = 5.0
+                continue
+            self.botstats_pending = {**failed, **self.botstats_pending}
+            logging.warning(f"Retrying {len(failed)} botstats in {backoff:.0f} seconds")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _backfill_activity(self, guild, members, after):
+        """Seed the activity window from channel history, once per startup.
+        After this, on_message keeps it current without any API calls."""
+        self.activity_backfilled = True
+        for channel in guild.text_channels:
+            last_message_id = channel.last_message_id
+            if not last_message_id:
+                continue
+            last_message_time = discord.utils.snowflake_time(last_message_id)
+            if last_message_time < after:
+                continue
+            async for message in channel.history(after=after):
+                if message.author.id in members:
+                    self.activity.record(
+                        message.author.id,
+                        channel.id,
+                        message.created_at.timestamp(),
+                    )
+
+    def _get_member_index(self, guild):
+        if not self.member_index.ready:
+            self.member_index.rebuild(guild)
+        return self.member_index
+
+    @commands.Cog.listener("on_ready")
+    async def rebuild_member_index(self):
+        guild = self.bot.get_guild(discord_info.GUILD_ID)
+        if guild:
+            self.member_index.rebuild(guild)
+
+    @commands.Cog.listener("on_presence_update")
+    async def index_presence(self, before, after):
+        if after.guild.id == discord_info.GUILD_ID and self.member_index.ready:
+            self.member_index.update_member(after)
+
+    @commands.Cog.listener("on_member_update")
+    async def index_member(self, before, after):
+        if after.guild.id == discord_info.GUILD_ID and self.member_index.ready:
+            self.member_index.update_member(after)
+
+    @commands.Cog.listener("on_member_join")
+    async def index_new_member(self, member):
+        if member.guild.id == discord_info.GUILD_ID and self.member_index.ready:
+            self.member_index.update_member(member)
+
+    @commands.Cog.listener("on_member_remove")
+    async def unindex_member(self, member):
+        if member.guild.id == discord_info.GUILD_ID and self.member_index.ready:
+            self.member_index.remove_member(member)
+
+    @commands.Cog.listener("on_voice_state_update")
+    async def index_voice(self, member, before, after):
+        if member.guild.id == discord_info.GUILD_ID and self.member_index.ready:
+            self.member_index.update_voice(member)
+
+    @commands.Cog.listener("on_message")
+    async def track_activity(self, message):
+        if not message.guild or message.guild.id != discord_info.GUILD_ID:
+            return
+        author = message.author
+        if not author.bot:
+            self.hipri_view.touch(message.channel.id, message.created_at.timestamp())
+        if not isinstance(author, discord.Member):
+            return
+        if author.get_role(discord_info.HUNT_MEMBER_ROLE) is None:
+            return
+        self.activity.record(
+            author.id, message.channel.id, message.created_at.timestamp()
+        )
 
     @commands.command()
     async def help(self, ctx, category: typing.Optional[str]):
@@ -153,14 +404,19 @@ Assorted puzzle-solving tools and utilities. (These all work as !tools abc or ju
 
 Commands:
   abc        Converts letters A-Z to/from numbers 1-26
+  anagram    Finds words and phrases using exactly the given letters
   atbash     Atbash cipher: flips A-Z to Z-A
   braille    Print the braille alphabet
+  cryptogram Solves a simple substitution cipher
+  letterbank Finds words using all of the given letters, and only them
   morse      Convert to/from morse code (/ for word boundaries)
-  nutrimatic Queries nutrimatic.org
-  qat        Queries Qat, a multi-pattern word searcher
+  nutrimatic Matches word and phrase patterns, nutrimatic.org style
+  qat        Qat-style multi-pattern word search
   roll       Rolls a dice in NdN format.
   rot        Rotates a message through all rot N and displays the permutations
   stuck      Suggests some tips from the Have You Tried? list
+  subanagram Finds words using some of the given letters
+  vigenere   Cracks (or decrypts) a Vigenère cipher
 ```
 """
             )
@@ -265,18 +521,8 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
             return
 
         author = ctx.author
-        solver = SQL.select_one(
-            """
-            SELECT
-                puzzles
-            FROM solver_view
-            WHERE chat_uid = %s
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (str(author.id),),
-        )
-        if not solver:
+        wrapups = self._get_wrapups()
+        if author.id not in wrapups:
             await ctx.reply(
                 (
                     f"Sorry, {author.mention}, I couldn't find your "
@@ -285,8 +531,8 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
                 )
             )
             return
-        puzzles = (solver["puzzles"] or "").split(",")
-        if not puzzles:
+        embeds = wrapups[author.id]
+        if not embeds:
             await ctx.reply(
                 (
                     f"Sorry, {author.mention}, I couldn't find any puzzles "
@@ -296,21 +542,61 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
                 )
             )
             return
-        puzzles = SQL.select_all(
-            """
-            SELECT
-                name,
-                roundname AS round_name,
-                puzzle_uri
-            FROM puzzle_view
-            WHERE name IN ({})
-            ORDER BY id
-            """.format(
-                ",".join(["%s"] * len(puzzles))
-            ),
-            tuple(puzzles),
+        await ctx.reply(content="{0.mention}:".format(author), embed=embeds[0])
+        for embed in embeds[1:]:
+            await ctx.reply(embed=embed)
+
+    @has_any_role("Puzzleboss", "Puzztech")
+    @commands.command()
+    async def wrapupall(self, ctx, action: typing.Optional[str]):
+        """Rebuild everyone's !wrapup. `!wrapupall dm` also DMs it to them all,
+        and `!wrapupall stop` stops that partway"""
+        if action == "stop":
+            if self.wrapup_sender and not self.wrapup_sender.done():
+                self.wrapup_sender.cancel()
+                await ctx.reply("Stopped sending wrapups.")
+            else:
+                await ctx.reply("Not sending wrapups right now.")
+            return
+        if self.wrapup_sender and not self.wrapup_sender.done():
+            await ctx.reply("Still sending wrapups! Use `!wrapupall stop` first.")
+            return
+        self.wrapups = None
+        wrapups = self._get_wrapups()
+        num_with_puzzles = len([embeds for embeds in wrapups.values() if embeds])
+        await ctx.reply(
+            "Built wrapups for **{}** ({} with puzzles).".format(
+                plural(len(wrapups), "solver"), num_with_puzzles
+            )
         )
+        if action == "dm":
+            guild = ctx.guild or self.bot.get_guild(discord_info.GUILD_ID)
+            self.wrapup_sender = asyncio.create_task(self._send_wrapups(ctx, guild))
+
+    def _get_wrapups(self):
+        """Discord ID -> rendered !wrapup embeds, for every solver at once.
 
+        Built in one pass over solver_view and puzzle_view the first time
+        anyone asks after Hunt, so the post-Hunt rush is all cache hits.
+        """
+        if self.wrapups is None:
+            puzzles = {puzzle["name"]: puzzle for puzzle in SQL.get_puzzle_links()}
+            order = {name: i for i, name in enumerate(puzzles)}
+            wrapups = {}
+            # Ordered by id, so a re-registered solver's newest account wins
+            for solver in SQL.get_solver_puzzle_names():
+                if not (solver["discord_id"] or "").isdigit():
+                    continue
+                names = set((solver["puzzles"] or "").split(","))
+                worked = [puzzles[name] for name in names if name in puzzles]
+                worked.sort(key=lambda puzzle: order[puzzle["name"]])
+                wrapups[int(solver["discord_id"])] = (
+                    self._render_wrapup(worked) if worked else []
+                )
+            self.wrapups = wrapups
+        return self.wrapups
+
+    def _render_wrapup(self, puzzles):
         def link(uri, label):
             return f"[`{label}`]({uri})"
 
@@ -345,77 +631,90 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
         embed.set_footer(
             text="based on approximate data, assembled hastily with love by danny"
         )
-        await ctx.reply(content="{0.mention}:".format(author), embed=embed)
-        if len(descriptions) == 1:
-            return
-        for description in descriptions[1:]:
-            await ctx.reply(embed=discord.Embed(description=description))
+        return [embed] + [
+            discord.Embed(description=description) for description in descriptions[1:]
+        ]
+
+    async def _send_wrapups(self, ctx, guild):
+        """DMs every hunter their wrapup, one at a time. discord.py already
+        waits out 429s, but we pace ourselves so we don't hit many of them,
+        and slow down further whenever we do."""
+        recipients = []
+        for discord_id, embeds in self._get_wrapups().items():
+            member = guild.get_member(discord_id)
+            if embeds and member and not member.bot:
+                recipients.append((member, embeds))
+        progress = await ctx.reply(
+            "DMing wrapups to **{}**...".format(plural(len(recipients), "hunter"))
+        )
+        interval = 1.0
+        sent, failed = 0, 0
+        for i, (member, embeds) in enumerate(recipients):
+            try:
+                await member.send(
+                    content="Thanks for hunting with us! Here's your wrapup:",
+                    embed=embeds[0],
+                )
+                for embed in embeds[1:]:
+                    await member.send(embed=embed)
+                sent += 1
+            except discord.Forbidden:
+                # They've turned off DMs from server members
+                failed += 1
+            except discord.HTTPException as e:
+                failed += 1
+                logging.warning(f"Couldn't DM wrapup to {member}: {e}")
+                if e.status == 429:
+                    interval = min(interval * 2, 30.0)
+            if (i + 1) % 25 == 0:
+                await progress.edit(
+                    content="DMing wrapups: {}/{} sent, {} failed...".format(
+                        sent, len(recipients), failed
+                    )
+                )
+            await asyncio.sleep(interval)
+        await progress.edit(
+            content="Done DMing wrapups: {} sent, {} failed.".format(sent, failed)
+        )
 
     @commands.command(aliases=["hunt"])
     async def status(self, ctx):
         """Hunt status update"""
-        tables = discord_info.get_tables(ctx.guild)
-        table_sizes = {table.name: len(table.members) for table in tables}
-        puzzles = SQL.get_all_puzzles()
-        rounds = {}
-        for puzzle in puzzles:
-            round_name = puzzle["round_name"]
-            if round_name not in rounds:
-                rounds[round_name] = {
-                    "total": 0,
-                    "Solved": 0,
-                    "Other": 0,
-                    "Needs eyes": 0,
-                    "Critical": 0,
-                    "WTF": 0,
-                    "Unnecessary": 0,
-                    "approx_solvers": 0,
-                    "solver_tables": [],
-                    "num_metas": 0,
-                    "num_metas_solved": 0,
-                    "max_id": 0,
-                }
-            rounds[round_name]["total"] += 1
-            status = puzzle["status"]
-            if status in rounds[round_name]:
-                rounds[round_name][status] += 1
-            else:
-                rounds[round_name]["Other"] += 1
-
-            xyzloc = puzzle["xyzloc"]
-            if xyzloc in table_sizes and status != "Solved":
-                if xyzloc not in rounds[round_name]["solver_tables"]:
-                    rounds[round_name]["approx_solvers"] += table_sizes[xyzloc]
-                    rounds[round_name]["solver_tables"].append(xyzloc)
+        guild = ctx.guild if ctx.guild else self.bot.get_guild(discord_info.GUILD_ID)
+        index = self._get_member_index(guild)
+        tables = discord_info.get_tables(guild)
+        table_sizes = {table.name: len(index.at_table(table.id)) for table in tables}
+        online_members = index.online_with_role(discord_info.HUNT_MEMBER_ROLE)
+        PuzzleCache.get_all_puzzles()
 
-            if puzzle["ismeta"]:
-                rounds[round_name]["num_metas"] += 1
-                if status == "Solved":
-                    rounds[round_name]["num_metas_solved"] += 1
+        # Only rebuild the embed if something it shows has actually changed
+        cache_key = (
+            PuzzleCache.version,
+            tuple(sorted(table_sizes.items())),
+            len(online_members),
+        )
+        if not self.status_embed or self.status_embed[0] != cache_key:
+            embed = self._build_status_embed(table_sizes, len(online_members))
+            self.status_embed = (cache_key, embed)
+        embed = self.status_embed[1].copy()
+        embed.timestamp = self.bot.now()
+        embed.set_footer(text=self.get_hunt_hours_clock())
+        await ctx.reply(embed=embed)
 
-            rounds[round_name]["max_id"] = max(
-                rounds[round_name]["max_id"], int(puzzle["id"])
-            )
+    def _build_status_embed(self, table_sizes, num_online):
+        summary = self.round_summary
+        rounds = {
+            name: dict(round, approx_solvers=summary.approx_solvers(name, table_sizes))
+            for name, round in summary.rounds.items()
+        }
         rounds = dict(
             sorted(
                 rounds.items(),
                 key=lambda item: (-item[1]["approx_solvers"], -item[1]["max_id"]),
             )
         )
-        solved = [
-            puzzle
-            for puzzle in puzzles
-            if puzzle["status"] == "Solved" and puzzle["answer"]
-        ]
-
-        guild = ctx.guild if ctx.guild else self.bot.get_guild(discord_info.GUILD_ID)
-        members = discord_info.get_team_members(guild)
-        online_members = [
-            member for member in members if member.status != discord.Status.offline
-        ]
         embed = discord.Embed(
             title="Hunt Status 📈📊",
-            timestamp=self.bot.now(),
             description=(
                 "🔄 Rounds: **{} opened**\n"
                 + "🧩 Puzzles: **{} solved** out of **{} open**\n"
@@ -423,14 +722,13 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
                 + "\n**Rounds:**"
             ).format(
                 len(rounds),
-                len(solved),
-                len(puzzles),
-                len(online_members),
-                # len(members),
+                summary.solved,
+                summary.total,
+                num_online,
             ),
         )
 
-        solved_round_names = SQL.get_solved_round_names()
+        solved_round_names = PuzzleCache.get_solved_round_names()
 
         for name, round in rounds.items():
             if name in solved_round_names:
@@ -461,7 +759,6 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
         for name in solved_round_names:
             if name not in rounds:
                 continue
-            round = rounds[name]
             solved_rounds.append("`{}` ({Solved}/{total})".format(name, **rounds[name]))
         if solved_rounds:
             embed.add_field(
@@ -469,9 +766,7 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
                 value="\n".join(solved_rounds),
                 inline=True,
             )
-
-        embed.set_footer(text=self.get_hunt_hours_clock())
-        await ctx.reply(embed=embed)
+        return embed
 
     def get_hunt_hours_clock(self):
         now = self.bot.now()
@@ -487,86 +782,348 @@ We'll use it for team meetings & HQ interactions, but it's also fun to stay conn
     @commands.command()
     async def progress(self, ctx):
         """Build graph of solve progress (vs. prior years)"""
-        qc = QuickChart()
-        qc.width = 1000
-        qc.height = 600
-        ordered_solve_times = SQL.select_all(
-            """
-            SELECT
-                a.solve_time
-            FROM (
-                SELECT
-                    puzzle_id,
-                    MAX(time) - INTERVAL 5 HOUR AS solve_time
-                FROM activity
-                WHERE type = 'solve'
-                GROUP BY puzzle_id
-            ) a
-            JOIN (SELECT id FROM puzzle_view WHERE status = 'Solved') p
-                ON (a.puzzle_id = p.id)
-            ORDER BY
-                a.solve_time
-            """,
+        now = self.bot.now().replace(tzinfo=None)
+        solve_times = self._get_solve_times()
+        # The chart only changes on a solve, or as "now" creeps rightwards
+        cache_key = (self.solve_version, now.strftime("%d@%H:") + str(now.minute // 15))
+        if not self.progress_chart or self.progress_chart[0] != cache_key:
+            png = self._render_progress(solve_times, now)
+            self.progress_chart = (cache_key, png)
+        _, png = self.progress_chart
+        await ctx.reply(file=discord.File(io.BytesIO(png), filename="progress.png"))
+
+    def _get_solve_times(self):
+        """Puzzle name -> (local solve time, round name), loaded from the DB
+        once and then kept current from solve announcements"""
+        if self.solve_times is None:
+            self.solve_times = {
+                row["name"]: (row["solve_time"], row["round_name"])
+                for row in SQL.get_solve_times()
+            }
+            self.solve_version += 1
+        return self.solve_times
+
+    @commands.Cog.listener("on_message")
+    async def invalidate_puzzles(self, message):
+        # client.py announces every puzzle change from Puzzleboss here
+        if message.channel.id != discord_info.STATUS_CHANNEL:
+            return
+        if message.author.id != self.bot.user.id:
+            return
+        PuzzleCache.invalidate()
+
+    @commands.Cog.listener("on_message")
+    async def track_solves(self, message):
+        if message.channel.id != discord_info.STATUS_CHANNEL:
+            return
+        if message.author.id != self.bot.user.id:
+            return
+        if "has been solved!" not in message.content:
+            return
+        if self.solve_times is None or not message.channel_mentions:
+            return
+        puzzle = SQL.get_puzzle_for_channel(message.channel_mentions[0])
+        if not puzzle:
+            return
+        solve_time = message.created_at.astimezone(self.bot.tz).replace(tzinfo=None)
+        self.solve_times[puzzle["name"]] = (solve_time, puzzle["round_name"])
+        self.solve_version += 1
+        if self.forecast is not None:
+            self.forecast.add(
+                puzzle["name"], self._hunt_seconds(solve_time), puzzle["round_name"]
+            )
+
+    def _chart_time(self, x):
+        """progress-chart.json uses DD@HH:MM, relative to this year's Hunt"""
+        day, hour_minute = x.split("@")
+        hour, minute = hour_minute.split(":")
+        begins = self.bot.hunt_begins
+        return datetime(begins.year, begins.month, int(day), int(hour), int(minute))
+
+    def _render_progress(self, solve_times, now):
+        if self.progress_config is None:
+            with open("progress-chart.json", "r") as f:
+                self.progress_config = json.load(f)
+        options = self.progress_config["options"]
+        x_axis = options["scales"]["xAxes"][0]
+        y_axis = options["scales"]["yAxes"][0]
+        x_min = self._chart_time(x_axis["ticks"]["min"])
+        x_max = self._chart_time(x_axis["ticks"]["max"])
+
+        def hours(when):
+            return (when - x_min).total_seconds() / 3600
+
+        ordered_solve_times = sorted(
+            solve_time for solve_time, _ in solve_times.values()
         )
-        current_json = json.dumps(
-            [
-                {"x": r["solve_time"].strftime("%d@%H:%M"), "y": i + 1}
-                for (i, r) in enumerate(ordered_solve_times)
-            ]
-            + [
-                {
-                    "x": self.bot.now().strftime("%d@%H:%M"),
-                    "y": len(ordered_solve_times),
-                }
-            ]
+        current = [(hours(t), i + 1) for (i, t) in enumerate(ordered_solve_times)]
+        current.append((hours(now), len(ordered_solve_times)))
+
+        datasets = []
+        for dataset in self.progress_config["data"]["datasets"]:
+            chart_dataset = {
+                "label": dataset["label"],
+                "line_width": dataset.get("borderWidth", 2),
+                "fill": dataset.get("fill", False) is True,
+            }
+            if dataset["data"]:
+                chart_dataset["points"] = [
+                    (hours(self._chart_time(p["x"])), p.get("y", None))
+                    for p in dataset["data"]
+                ]
+            else:
+                # The empty dataset is this year's
+                chart_dataset["points"] = current
+                chart_dataset["line_width"] = 3
+            rgba = re.findall(r"[\d.]+", dataset.get("backgroundColor", ""))
+            if len(rgba) == 4:
+                chart_dataset["color"] = tuple(int(c) for c in rgba[:3])
+                chart_dataset["alpha"] = float(rgba[3])
+            datasets.append(chart_dataset)
+
+        def hour_label(when):
+            return "{} {}{}".format(
+                when.strftime("%a"),
+                when.hour % 12 or 12,
+                "AM" if when.hour < 12 else "PM",
+            )
+
+        step = x_axis["time"].get("stepSize", 6)
+        x_ticks = [
+            (h, hour_label(x_min + timedelta(hours=h)))
+            for h in range(0, int(hours(x_max)) + 1, step)
+        ]
+        y_ticks = [
+            (y, str(y))
+            for y in range(
+                y_axis["ticks"]["min"],
+                y_axis["ticks"]["max"] + 1,
+                y_axis["ticks"]["stepSize"],
+            )
+        ]
+        return chart.render_line_chart(
+            datasets,
+            x_range=(0, hours(x_max)),
+            y_range=(y_axis["ticks"]["min"], y_axis["ticks"]["max"]),
+            x_ticks=x_ticks,
+            y_ticks=y_ticks,
+            title=options["title"]["text"],
+            y_label=y_axis["scaleLabel"]["labelString"],
         )
-        with open("progress-chart.json", "r") as f:
-            chart_config_json = f.read().replace("[]", current_json)
-        qc.config = json.loads(chart_config_json)
-        await ctx.reply(qc.get_short_url())
 
     @progress.error
     async def progress_error(self, ctx, error):
         await ctx.reply(f"[progress] Error! {error}")
         raise error
 
-    @commands.guild_only()
+    @commands.command(name="metrics")
+    async def metrics_history(
+        self, ctx, field: typing.Optional[str], window: typing.Optional[str]
+    ):
+        """Recent history of a logged metric, e.g. !metrics members.online 6h"""
+        fields = self.metrics_store.fields()
+        if field not in fields:
+            await ctx.reply(
+                "Usage: `!metrics <field> [window, e.g. 90m, 6h, 2d]`\n"
+                + "Fields: "
+                + ", ".join(f"`{field}`" for field in fields)
+            )
+            return
+        window = window or "6h"
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)([mhd])", window)
+        if not match:
+            await ctx.reply(f"Sorry, I don't understand `{window}` as a window.")
+            return
+        seconds = float(match[1]) * {"m": 60, "h": 3600, "d": 86400}[match[2]]
+        now = time.time()
+        points = self.metrics_store.query(field, since=now - seconds)
+        if not points:
+            await ctx.reply(f"No `{field}` data in the last {window}.")
+            return
+        values = [value for _, value in points]
+        await ctx.reply(
+            "`{}` over the last {}:\n```\n{}\n```"
+            "latest **{:g}**, min **{:g}**, max **{:g}**, mean **{:.1f}** "
+            "({})".format(
+                field,
+                window,
+                self._sparkline(points, now - seconds, now),
+                values[-1],
+                min(values),
+                max(values),
+                sum(values) / len(values),
+                plural(len(values), "sample"),
+            )
+        )
+
+    def _sparkline(self, points, start, end, width=48):
+        slots = [[] for _ in range(width)]
+        for timestamp, value in points:
+            slot = int((timestamp - start) * width / (end - start))
+            slots[min(max(slot, 0), width - 1)].append(value)
+        averages = [sum(slot) / len(slot) if slot else None for slot in slots]
+        known = [value for value in averages if value is not None]
+        low, high = min(known), max(known)
+        bars = "▁▂▃▄▅▆▇█"
+        return "".join(
+            (
+                " "
+                if value is None
+                else bars[int((value - low) * (len(bars) - 1) / ((high - low) or 1))]
+            )
+            for value in averages
+        )
+
     @commands.command()
-    async def hipri(self, ctx):
-        """Show hipri puzzles"""
-        puzzles = sorted(
-            SQL.get_hipri_puzzles(),
-            key=lambda puzzle: (
-                puzzle["status"],
-                -1 * int(puzzle["ismeta"]),
-                puzzle["id"],
+    async def forecast(self, ctx):
+        """Project when we'll finish the open puzzles, at our recent pace"""
+        overall = self._project()
+        embed = discord.Embed(
+            title="Forecast 🔮",
+            timestamp=self.bot.now(),
+            description=(
+                "📈 Pace: **{:.1f} solves/hour** over the last {:g} hours\n"
+                + "🧩 Open puzzles left: **{}**\n"
+                + "⏱️ Done in: **{}**\n"
+                + "\n**Rounds:**"
+            ).format(
+                overall["solves_per_hour"],
+                self.forecast.window / 3600,
+                overall["remaining"],
+                self._format_eta(overall),
             ),
         )
-        response = "**Priority Puzzles ({}):**\n".format(len(puzzles))
+        solved_round_names = PuzzleCache.get_solved_round_names()
+        projections = {
+            name: self._project(name)
+            for name in self.round_summary.rounds
+            if name not in solved_round_names
+        }
+        ranked = sorted(
+            projections.items(), key=lambda item: -item[1]["solves_per_hour"]
+        )
+        # Discord allows 25 fields per embed, so leave room to say what's cut
+        shown = ranked if len(ranked) <= 25 else ranked[:24]
+        for name, projection in shown:
+            embed.add_field(
+                name=name,
+                value=(
+                    "📈 **{:.1f}**/hour\n🧩 **{}** left\n⏱️ {}".format(
+                        projection["solves_per_hour"],
+                        projection["remaining"],
+                        self._format_eta(projection),
+                    )
+                ),
+                inline=True,
+            )
+        if len(ranked) > len(shown):
+            embed.add_field(
+                name="...",
+                value="and {}, at a slower pace".format(
+                    plural(len(ranked) - len(shown), "more round")
+                ),
+                inline=True,
+            )
+        embed.set_footer(text=self.get_hunt_hours_clock())
+        await ctx.reply(embed=embed)
+
+    def _hunt_seconds(self, when):
+        """Seconds since Hunt began, for a naive local time"""
+        return (when - self.bot.hunt_begins.replace(tzinfo=None)).total_seconds()
+
+    def _get_forecast(self):
+        if self.forecast is None:
+            forecast = SolveForecast(window_hours=3.0, start=0.0)
+            forecast.load(
+                (name, self._hunt_seconds(solve_time), round_name)
+                for name, (solve_time, round_name) in self._get_solve_times().items()
+            )
+            self.forecast = forecast
+        return self.forecast
+
+    def _project(self, round_name=None):
+        """Forecast for the open puzzles, in one round or across the Hunt"""
+        PuzzleCache.get_all_puzzles()
+        rounds = self.round_summary.rounds
+        if round_name is not None:
+            rounds = {round_name: rounds[round_name]}
+        remaining = sum(
+            round["total"] - round["Solved"] - round["Unnecessary"]
+            for round in rounds.values()
+        )
+        now = self._hunt_seconds(self.bot.now().replace(tzinfo=None))
+        return self._get_forecast().project(remaining, now, round_name)
+
+    def _format_eta(self, projection):
+        if projection["hours_to_finish"] == 0:
+            return "done!"
+        if projection["hours_to_finish"] is None:
+            return "no recent solves"
+        high = projection["hours_to_finish_high"]
+        return "~{:.1f}h ({:.1f}h to {})".format(
+            projection["hours_to_finish"],
+            projection["hours_to_finish_low"],
+            "{:.1f}h".format(high) if high is not None else "???",
+        )
+
+    @commands.guild_only()
+    @commands.command()
+    async def hipri(self, ctx):
+        """Show hipri puzzles, most neglected first"""
+        PuzzleCache.get_all_puzzles()
+        view = self.hipri_view
+        now = time.time()
+        # Idle times are shown to the minute, so that's as fresh as we need
+        cache_key = (view.version, int(now // 60))
+        if not self.hipri_response or self.hipri_response[0] != cache_key:
+            self._seed_last_active(ctx.guild)
+            response = self._render_hipri(ctx.guild, view.ranked(now), now)
+            self.hipri_response = (cache_key, response)
+        await send_paginated(ctx.reply, self.hipri_response[1])
+
+    def _seed_last_active(self, guild):
+        """Falls back on each channel's cached last message, for channels we
+        haven't seen a message in since startup"""
+        view = self.hipri_view
+        for puzzle in view.puzzles.values():
+            channel_id = puzzle["discord_channel_id"]
+            if channel_id in view.last_active:
+                continue
+            channel = guild.get_channel(channel_id)
+            if channel and channel.last_message_id:
+                view.touch(
+                    channel_id,
+                    discord.utils.snowflake_time(channel.last_message_id).timestamp(),
+                )
+
+    def _render_hipri(self, guild, puzzles, now):
+        response = "**Priority Puzzles ({}):**\n\n".format(len(puzzles))
         prefixes = {
             "Critical": "🔥",
             "Needs eyes": "🔴",
             "WTF": "☣️",
         }
-        status = None
         for puzzle in puzzles:
-            if status != puzzle["status"]:
-                response += "\n"
-            status = puzzle["status"]
-            response += prefixes[status]
+            response += prefixes.get(puzzle["status"], "🏅")
             response += " {status}: `{name}` (<#{channel_id}>)".format(**puzzle)
             if puzzle["ismeta"]:
                 response += " [**META** 🏅]"
             if puzzle["xyzloc"]:
-                response += " in **{}**".format(
-                    xyzloc_mention(ctx.guild, puzzle["xyzloc"])
-                )
+                response += " in **{}**".format(xyzloc_mention(guild, puzzle["xyzloc"]))
+            idle_minutes = int(self.hipri_view.idle_seconds(puzzle, now) // 60)
+            details = []
+            if idle_minutes:
+                details.append(f"quiet for {idle_minutes}m")
+            if puzzle["num_solvers"]:
+                details.append(plural(puzzle["num_solvers"], "solver"))
+            if details:
+                response += " — " + ", ".join(details)
             if puzzle["comments"]:
                 comments = puzzle["comments"].replace("`", "'")[:200]
                 comments = discord.utils.escape_markdown(comments)
                 response += "\n`        Comments: {}`".format(comments)
             response += "\n"
-        await ctx.reply(response)
+        return response
 
     @commands.Cog.listener("on_message")
     async def fix_hunt_emails(self, message):
@@ -1,28 +1,45 @@
 """Puzzboss-only commands"""
 
 import aiohttp
-from common import plural
-from db import REST, SQL
+import asyncio
+import csv
+from common import MESSAGE_LIMIT, paginate, plural, send_paginated
+from db import PuzzleCache, REST, SQL
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import guild_only, has_any_role, MemberConverter, errors
+import io
 import json
 import logging
 import re
+import statistics
 from urllib.parse import quote_plus, urlencode
 import time
 import typing
+from extensions.util.huntsite import extract_globals, FetchError, HuntSite
+from extensions.util.hints import HintTracker, RESPONDED, title_key
+import extensions.util.names as names
 
 from discord_info import (
     BETABOSS_ROLE,
+    GUILD_ID,
     HUNT_MEMBER_ROLE,
     PUZZBOSS_ROLE,
     PUZZTECH_ROLE,
+    STATUS_CHANNEL,
+    VERIFICATION_CHANNEL,
     VISITOR_ROLE,
     VOICE_OF_THE_ROOM_ROLE,
 )
 
 
+def _format_duration(seconds):
+    minutes = round(seconds / 60)
+    if minutes < 60:
+        return f"{minutes}m"
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+
 def print_user(user: discord.Member):
     username = str(user)
     if user.display_name != username:
@@ -30,9 +47,129 @@ def print_user(user: discord.Member):
     return username
 
 
+class VerificationIndex:
+    """Who still needs verifying, on both the Discord and Puzzleboss sides.
+
+    Built once from the member cache and the solver tables, then kept current
+    from member events and !verify, so the listings only ever cost as much
+    as what's in them. Registrations happen on the Puzzleboss website rather
+    than through us, so the solver side is also re-read every max_age seconds.
+    """
+
+    max_age = 60.0
+
+    def __init__(self):
+        self.ready = False
+        self.version = 0
+        self.fetched_at = 0.0
+        # Discord ID -> Puzzleboss solver ID
+        self.verified = {}
+        # Solver ID -> solver, for accounts without a Discord user yet
+        self.unmatched = {}
+        # Username -> newuser row, for unconfirmed registrations
+        self.pending = {}
+        # Discord ID -> Member, for non-visitors without a solver account
+        self.members = {}
+        self.unverified = {}
+
+    def rebuild(self, guild):
+        self.__init__()
+        self.refresh_solvers()
+        for member in guild.members:
+            self.update_member(member)
+        self.ready = True
+
+    def refresh_if_needed(self):
+        if time.monotonic() - self.fetched_at > self.max_age:
+            self.refresh_solvers()
+
+    def refresh_solvers(self):
+        self.fetched_at = time.monotonic()
+        verified = {}
+        unmatched = {}
+        for solver in SQL.get_all_solvers():
+            if solver["discord_id"]:
+                verified[int(solver["discord_id"])] = solver["solver_id"]
+            elif solver["name"] != "puzzleboss":
+                unmatched[solver["solver_id"]] = solver
+        pending = {row["username"]: row for row in SQL.get_pending_solvers()}
+        if (verified, unmatched, pending) == (
+            self.verified,
+            self.unmatched,
+            self.pending,
+        ):
+            return
+        for discord_id in verified.keys() - self.verified.keys():
+            self.unverified.pop(discord_id, None)
+        for discord_id in self.verified.keys() - verified.keys():
+            if discord_id in self.members:
+                self.unverified[discord_id] = self.members[discord_id]
+        self.verified = verified
+        self.unmatched = unmatched
+        self.pending = pending
+        self.version += 1
+
+    def update_member(self, member):
+        if member.bot or VISITOR_ROLE in [role.id for role in member.roles]:
+            self.remove_member(member)
+            return
+        self.members[member.id] = member
+        if member.id not in self.verified:
+            self.unverified[member.id] = member
+        self.version += 1
+
+    def remove_member(self, member):
+        self.members.pop(member.id, None)
+        if self.unverified.pop(member.id, None):
+            self.version += 1
+
+    def mark_verified(self, member, solver_id):
+        self.verified[member.id] = solver_id
+        self.unverified.pop(member.id, None)
+        self.unmatched.pop(solver_id, None)
+        self.version += 1
+
+    def unverified_members(self):
+        return sorted(self.unverified.values(), key=lambda member: member.joined_at)
+
+    def unmatched_solvers(self):
+        return sorted(
+            self.unmatched.values(),
+            key=lambda solver: solver["solver_id"],
+            reverse=True,
+        )
+
+
 class Puzzboss(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        config = bot.hunt_config
+        self.hunt_site = HuntSite()
+        self.hunt_state = None
+        self.activity_log = None
+        self.reported = None
+        self.hint_tracker = HintTracker()
+        self.puzzle_channels = None
+        self.hints_seeded = False
+        self.verification = VerificationIndex()
+        self.dashboard_version = None
+        # Hunt config values from the DB are strings
+        interval = float(config.get("scrape_interval_seconds", 0) or 0)
+        if interval and config.get("scrape_url", None):
+            self.auto_sync.change_interval(seconds=interval)
+            self.auto_sync.start()
+        hint_interval = float(config.get("hint_interval_seconds", 0) or 0)
+        if hint_interval and config.get("scrape_cookie", None):
+            self.hint_watcher.change_interval(seconds=hint_interval)
+            self.hint_watcher.start()
+        if VERIFICATION_CHANNEL:
+            self.verification_dashboard.start()
+
+    async def cog_unload(self):
+        self.auto_sync.cancel()
+        self.hint_watcher.cancel()
+        self.verification_dashboard.cancel()
+        await self.hunt_site.close()
 
     @has_any_role("RoleVerifier", "Puzzleboss", "Puzztech")
     @guild_only()
@@ -177,15 +314,7 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
             response += "{} matches found:\n\n{}".format(
                 len(results), "\n".join(results)
             )
-        try:
-            await ctx.reply(response)
-        except Exception:
-            response = f"{discord_result}\n\nChecking Puzzleboss accounts... Error! 😔\n"
-            response += (
-                "Sorry, too many matches ({}) found to display in Discord. "
-                + "Please narrow your query."
-            ).format(len(results))
-            await ctx.reply(response)
+        await send_paginated(ctx.reply, response, buttons=True, author=ctx.author)
 
     def _lookup_discord_user(self, member: discord.Member):
         member_tag = "Discord user `{0}`".format(print_user(member))
@@ -469,37 +598,47 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
     @guild_only()
     @commands.command()
     async def duplicates(self, ctx):
-        """Try to find duplicate guild members"""
+        """Try to find duplicate guild members
+        Matches usernames and global names loosely, ignoring case, digits,
+        punctuation and lookalike characters."""
         visitor_role = ctx.guild.get_role(VISITOR_ROLE)
-        members = [
-            member
+        members = {
+            member.id: member
             for member in ctx.guild.members
             if not member.bot and visitor_role not in member.roles
-        ]
-        member_names = [member.name for member in members]
-
-        dupe_members = [
-            member for member in members if member_names.count(member.name) > 1
-        ]
-        dupe_members = sorted(dupe_members, key=lambda member: member.name)
-        if not dupe_members:
+        }
+        # Nicknames are left out, since they're often just a first name
+        dupe_pairs = names.find_duplicates(
+            {member.id: member.name for member in members.values()},
+            {member.id: [member.global_name] for member in members.values()},
+        )
+        if not dupe_pairs:
             await ctx.reply("Looks like all obvious duplicates have been cleared!")
             return
 
         member_role = ctx.guild.get_role(HUNT_MEMBER_ROLE)
-        lines = [
-            "Joined {0.joined_at:%Y-%m-%d %H:%M}: {1}{2}".format(
-                member,
-                print_user(member),
-                "  [Team Member]" if member_role in member.roles else "",
+        pairs = []
+        for i, j, similarity in dupe_pairs:
+            pair = sorted([members[i], members[j]], key=lambda m: m.joined_at)
+            pairs.append(
+                f"{similarity:.0%} alike:\n"
+                + "\n".join(
+                    "Joined {0.joined_at:%Y-%m-%d %H:%M}: {1}{2}".format(
+                        member,
+                        print_user(member),
+                        "  [Team Member]" if member_role in member.roles else "",
+                    )
+                    for member in pair
+                )
             )
-            for member in dupe_members
-        ]
-        await ctx.reply(
-            f"Potential dupe members ({len(lines)}):\n"
+        num_members = len({i for pair in dupe_pairs for i in pair[:2]})
+        await send_paginated(
+            ctx.reply,
+            f"Potential dupe members ({num_members}, in {len(pairs)} pairs):\n"
             + "```\n"
-            + "\n".join(lines)
-            + "\n```"
+            + "\n\n".join(pairs)
+            + "\n```",
+            embeds=True,
         )
 
     @has_any_role("RoleVerifier", "Beta Boss", "Puzzleboss", "Puzztech")
@@ -507,32 +646,23 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
     @commands.command()
     async def unmatched(self, ctx):
         """Unmatched Puzzleboss accounts w/o Discord accounts yet"""
-        unmatched_users = SQL.select_all(
-            """
-            SELECT
-                name,
-                fullname
-            FROM solver_view
-            WHERE
-                chat_uid IS NULL
-                AND name <> 'puzzleboss'
-            ORDER BY id DESC
-            """,
-        )
-
+        self._ensure_verification(ctx.guild)
+        unmatched_users = self.verification.unmatched_solvers()
         if not unmatched_users:
             await ctx.reply("Looks like all PB accounts are matched, nice!")
             return
 
-        await ctx.reply(
-            f"Puzzleboss accounts without matching Discord accounts ({len(unmatched_users)}):\n```"
+        await send_paginated(
+            ctx.reply,
+            f"Puzzleboss accounts without matching Discord accounts ({len(unmatched_users)}):\n```\n"
             + "\n".join(
                 [
                     user["name"] + " (" + user["fullname"] + ")"
                     for user in unmatched_users
                 ]
             )
-            + "\n```"
+            + "\n```",
+            embeds=True,
         )
 
     @has_any_role("RoleVerifier", "Beta Boss", "Puzzleboss", "Puzztech")
@@ -540,32 +670,24 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
     @commands.command()
     async def unverified(self, ctx):
         """Lists not-yet-verified team members"""
-        rows = SQL.select_all(
-            """
-            SELECT
-                DISTINCT chat_uid
-            FROM solver_view
-            WHERE chat_uid IS NOT NULL
-            """,
-        )
-        verified_discord_ids = [int(row["chat_uid"]) for row in rows]
-        visitor_role = ctx.guild.get_role(VISITOR_ROLE)
-        unverified_users = [
-            member
-            for member in ctx.guild.members
-            if visitor_role not in member.roles
-            and member.id not in verified_discord_ids
-            and not member.bot
-        ]
-        unverified_users = sorted(unverified_users, key=lambda member: member.joined_at)
+        self._ensure_verification(ctx.guild)
+        await send_paginated(ctx.reply, self._unverified_report(ctx.guild), embeds=True)
+
+    def _ensure_verification(self, guild):
+        if not self.verification.ready:
+            self.verification.rebuild(guild)
+        else:
+            self.verification.refresh_if_needed()
+
+    def _unverified_report(self, guild):
+        unverified_users = self.verification.unverified_members()
         if not unverified_users:
-            await ctx.reply(
+            return (
                 "Looks like all team members are verified, nice!\n\n"
                 + "(If this is unexpected, try adding the Team Member "
                 + "role to someone first.)"
             )
-            return
-        member_role = ctx.guild.get_role(HUNT_MEMBER_ROLE)
+        member_role = guild.get_role(HUNT_MEMBER_ROLE)
         unverified_other = [
             "Joined {0.joined_at:%Y-%m-%d %H:%M}: {1}".format(
                 member, print_user(member)
@@ -596,23 +718,11 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         else:
             unverified_members = ""
 
-        rows = SQL.select_all(
-            """
-            SELECT
-                id,
-                name,
-                fullname
-            FROM solver_view
-            WHERE
-                chat_uid IS NULL
-                AND id > 320
-            ORDER BY id DESC
-            LIMIT 10
-            """,
-        )
         unverified_new_accounts = [
-            f"{row['name']} ({row['fullname']}, ID {row['id']})" for row in rows
-        ]
+            f"{solver['name']} ({solver['fullname']}, ID {solver['solver_id']})"
+            for solver in self.verification.unmatched_solvers()
+            if solver["solver_id"] > 320
+        ][:10]
         if unverified_new_accounts:
             unverified_new_accounts = (
                 "\nRecent Puzzleboss accounts needing Discord users:\n```{0}```".format(
@@ -622,16 +732,9 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         else:
             unverified_new_accounts = ""
 
-        rows = SQL.select_all(
-            """
-            SELECT
-                username,
-                fullname
-            FROM newuser
-            """,
-        )
         accounts_being_registered = [
-            f"{row['username']} ({row['fullname']})" for row in rows
+            f"{row['username']} ({row['fullname']})"
+            for row in self.verification.pending.values()
         ]
         if accounts_being_registered:
             accounts_being_registered = "\nPuzzleboss accounts pending confirmation before creation/reset:\n```{0}```".format(
@@ -640,21 +743,70 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         else:
             accounts_being_registered = ""
 
-        await ctx.reply(
+        return (
             unverified_other
             + unverified_members
             + unverified_new_accounts
             + accounts_being_registered
         )
 
+    @tasks.loop(seconds=15.0, reconnect=True)
+    async def verification_dashboard(self):
+        """Keeps the latest message in the verification channel showing
+        everyone who still needs verifying"""
+        guild = self.bot.get_guild(GUILD_ID)
+        if not guild:
+            return
+        channel = guild.get_channel(VERIFICATION_CHANNEL)
+        if not channel:
+            return
+        self._ensure_verification(guild)
+        if self.verification.version == self.dashboard_version:
+            return
+        messages = [message async for message in channel.history(limit=1)]
+        message = messages[0] if messages else None
+        if not message or message.author != guild.me:
+            message = await channel.send("Fetching verification status...")
+
+        pages = paginate(self._unverified_report(guild), MESSAGE_LIMIT - 60)
+        content = pages[0]
+        if len(pages) > 1:
+            content += "\n\n_(Truncated, run `!unverified` for everyone.)_"
+        await message.edit(content=content, suppress=True)
+        self.dashboard_version = self.verification.version
+
+    @commands.Cog.listener("on_ready")
+    async def rebuild_verification(self):
+        guild = self.bot.get_guild(GUILD_ID)
+        if guild:
+            self.verification.rebuild(guild)
+
+    @commands.Cog.listener("on_member_join")
+    async def index_unverified_member(self, member):
+        if member.guild.id == GUILD_ID and self.verification.ready:
+            self.verification.update_member(member)
+
+    @commands.Cog.listener("on_member_update")
+    async def reindex_unverified_member(self, before, after):
+        if after.guild.id != GUILD_ID or not self.verification.ready:
+            return
+        if before.roles != after.roles:
+            self.verification.update_member(after)
+
+    @commands.Cog.listener("on_member_remove")
+    async def unindex_unverified_member(self, member):
+        if member.guild.id == GUILD_ID and self.verification.ready:
+            self.verification.remove_member(member)
+
     @has_any_role("RoleVerifier", "Beta Boss", "Puzzleboss", "Puzztech")
     @guild_only()
-    @commands.command()
+    @commands.group(invoke_without_command=True)
     async def verify(
         self, ctx, member: typing.Union[discord.Member, str], *, username: str
     ):
         """Verifies a team member with their email
         Usage: !verify @member username[@importanthuntpoll.org]
+        For lots of people at once, see `!verify bulk`.
         """
         if not isinstance(member, discord.Member) and " " in username:
             # Let's perform some surgery, and stitch the actual member name
@@ -728,6 +880,7 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         await REST.update_solver(
             solver["id"], chat_uid=str(member.id), chat_name=str(member)
         )
+        self.verification.mark_verified(member, solver["id"])
         member_role = ctx.guild.get_role(HUNT_MEMBER_ROLE)
         if member_role not in member.roles:
             logging.info("{0.command}: Adding member role!".format(ctx))
@@ -761,6 +914,137 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         )
         raise error
 
+    @has_any_role("RoleVerifier", "Beta Boss", "Puzzleboss", "Puzztech")
+    @guild_only()
+    @verify.command(name="bulk")
+    async def verify_bulk(self, ctx, *, entries: typing.Optional[str]):
+        """Verifies lots of team members at once
+        Either attach a CSV of `member,username` rows, or list them one per
+        line after the command:
+        ```
+        !verify bulk
+        @member1 username1
+        "Fancy Name" FancyPerson
+        ```
+        Members can be mentions, IDs, usernames or display names."""
+        text = entries or ""
+        for attachment in ctx.message.attachments:
+            text += "\n" + (await attachment.read()).decode("utf-8", errors="replace")
+        rows = self._parse_bulk_entries(text)
+        if not rows:
+            await ctx.reply(
+                "Usage: `!verify bulk` with a CSV attached, or with "
+                + "`[Discord name] [Puzzleboss username]` on each line after it."
+            )
+            return
+
+        self._ensure_verification(ctx.guild)
+        members = self._member_lookup(ctx.guild)
+        solvers = {solver["name"].lower(): solver for solver in SQL.get_all_solvers()}
+        pending = {username.lower() for username in self.verification.pending}
+        problems = []
+        already_verified = []
+        to_verify = []
+        for name, username in rows:
+            username = username.replace("@" + self.bot.team_domain, "")
+            member = self._resolve_member(members, name)
+            solver = solvers.get(username.lower(), None)
+            if member is False:
+                problems.append(f"{name}: ambiguous Discord name, use a mention or ID")
+            elif member is None:
+                problems.append(f"{name}: no such Discord member")
+            elif solver is None and username.lower() in pending:
+                problems.append(f"{username}: hasn't confirmed their email yet")
+            elif solver is None:
+                problems.append(f"{username}: no such Puzzleboss account")
+            elif self.verification.verified.get(member.id) == solver["solver_id"]:
+                already_verified.append(member)
+            else:
+                to_verify.append((member, solver))
+
+        logging.info(
+            "{0.command}: Verifying {1} members, skipping {2}".format(
+                ctx, len(to_verify), len(rows) - len(to_verify)
+            )
+        )
+        member_role = ctx.guild.get_role(HUNT_MEMBER_ROLE)
+        semaphore = asyncio.Semaphore(4)
+
+        async def verify_one(member, solver):
+            async with semaphore:
+                response = await REST.update_solver(
+                    solver["solver_id"], chat_uid=str(member.id), chat_name=str(member)
+                )
+                if response.status != 200:
+                    return f"Puzzleboss returned {response.status}"
+                self.verification.mark_verified(member, solver["solver_id"])
+                if member_role not in member.roles:
+                    await member.add_roles(member_role)
+
+        results = await asyncio.gather(
+            *[verify_one(member, solver) for member, solver in to_verify],
+            return_exceptions=True,
+        )
+        verified = []
+        for (member, solver), result in zip(to_verify, results):
+            if result is None:
+                verified.append(f"{print_user(member)} as {solver['name']}")
+            else:
+                problems.append(f"{print_user(member)} as {solver['name']}: {result}")
+
+        response = (
+            f"**Bulk verify:** {len(verified)} verified, "
+            f"{len(already_verified)} already verified, "
+            f"{plural(len(problems), 'problem')}."
+        )
+        if verified:
+            response += "\n\nVerified:\n```\n{0}\n```".format("\n".join(verified))
+        if problems:
+            response += "\n\nNeeds a look:\n```\n{0}\n```".format("\n".join(problems))
+        await send_paginated(ctx.reply, response, embeds=True)
+
+    @staticmethod
+    def _parse_bulk_entries(text):
+        """(member, username) pairs, from CSV rows or whitespace-separated
+        lines where the username is the last word"""
+        rows = []
+        for row in csv.reader(io.StringIO(text)):
+            row = [cell.strip() for cell in row if cell.strip()]
+            if len(row) == 1:
+                row = row[0].rsplit(None, 1)
+            if len(row) < 2:
+                continue
+            name, username = row[0].strip('"'), row[1]
+            if username.lower() in ["username", "email"]:
+                # Header row
+                continue
+            rows.append((name, username))
+        return rows
+
+    @staticmethod
+    def _member_lookup(guild):
+        """Every way of naming a member -> that member, or False when a
+        display name is shared between several. IDs and usernames are unique,
+        so they win over anyone else's display name."""
+        lookup = {}
+        for member in guild.members:
+            for key in {member.display_name, member.global_name}:
+                if not key:
+                    continue
+                key = key.lower()
+                lookup[key] = member if lookup.get(key, member) is member else False
+        for member in guild.members:
+            for key in {str(member.id), str(member), member.name}:
+                lookup[key.lower()] = member
+        return lookup
+
+    @staticmethod
+    def _resolve_member(lookup, name):
+        mention = re.fullmatch(r"<@!?(\d+)>", name)
+        if mention:
+            name = mention.group(1)
+        return lookup.get(name.lower().lstrip("@"), None)
+
     @has_any_role("Puzztech")
     @guild_only()
     @commands.command(name="relinkdoc", aliases=["linkdoc"])
@@ -797,53 +1081,88 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
         if not url:
             await ctx.reply("No url")
             return
-        cookie = config.get("scrape_cookie", None)
-        if not cookie:
+        if not config.get("scrape_cookie", None):
             await ctx.reply("No cookie")
-        headers = {
-            "accept": "text/html",
-            "cache-control": "max-age=0",
-            "cookie": cookie,
-            "user-agent": "Puzzleboss v0.1 HuntTeam:"
-            + config.get("team_name", "Unknown"),
-        }
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    await ctx.reply(f"Scrape error code {response.status}")
-                    return
-                result = await response.text()
-        if "window.initialAllPuzzlesState = " not in result:
-            await ctx.reply("Data not found in scrape")
             return
         try:
-            m = re.search(
-                r"(?<=window.initialAllPuzzlesState = )\{.*?\}(?=[;<])", result
-            )
-            if m is None:
-                await ctx.reply("Cannot find window.initialAllPuzzlesState JSON")
-                return
-            data = json.loads(m.group(0))
-            currency = data.get("currency", 0)
-            rounds = data.get("rounds", [])
-        except json.JSONDecodeError as _:
-            await ctx.reply("Cannot parse window.initialAllPuzzlesState JSON")
-            return
-        db_puzzles = SQL.get_all_puzzles()
-        discrepancies = []
-        puzzles_to_buy = []
-        try:
-            m = re.search(r"(?<=window.initialNavBarState = )\{.*?\}(?=[;<])", result)
-            if m is None:
-                await ctx.reply("Cannot find window.initialNavBarState JSON")
-                return
-            data = json.loads(m.group(0))
-            num_open_puzzles = data.get("overworldPuzzlesOpen", 0)
-            max_width = data.get("maxOverworldWidth", 0)
-            num_puzzles_we_can_open = max_width - num_open_puzzles
-        except json.JSONDecodeError as _:
-            await ctx.reply("Cannot parse window.initialNavBarState JSON")
+            state = await self._get_hunt_state()
+        except (FetchError, ValueError) as e:
+            await ctx.reply(str(e))
             return
+        currency = state["currency"]
+        num_puzzles_we_can_open = state["num_puzzles_we_can_open"]
+        diff = self._diff_puzzles(
+            state["rounds"], PuzzleCache.get_all_puzzles(), currency
+        )
+        show_add_link = "zoz" in ctx.author.name.lower()
+        discrepancies = [
+            self._format_discrepancy(discrepancy, show_add_link)
+            for discrepancy in diff["new"] + diff["answers"]
+        ]
+        puzzles_to_buy = [
+            self._format_unlockable(puzzle) for puzzle in diff["unlockable"]
+        ]
+        discrepancies = "\n".join(discrepancies)
+        puzzles_to_buy = "\n".join(puzzles_to_buy)
+
+        if not discrepancies and not puzzles_to_buy:
+            await ctx.reply("Hunt website and Puzzleboss appear to be in sync :)")
+        elif not discrepancies and puzzles_to_buy and num_puzzles_we_can_open:
+            await send_paginated(
+                ctx.reply,
+                f"No discrepancies found, but we have {plural(currency, 'key')} "
+                f"we can use to open up to {plural(num_puzzles_we_can_open, 'puzzle')}:\n{puzzles_to_buy}",
+            )
+        elif not discrepancies and puzzles_to_buy and not num_puzzles_we_can_open:
+            await send_paginated(
+                ctx.reply,
+                f"No discrepancies found, and we have {plural(currency, 'key')} "
+                f"but cannot open any of these puzzles until we solve something:\n{puzzles_to_buy}",
+            )
+        elif discrepancies and not puzzles_to_buy:
+            await send_paginated(ctx.reply, f"Discrepancies found:\n{discrepancies}")
+        elif num_puzzles_we_can_open:
+            await send_paginated(
+                ctx.reply,
+                f"Discrepancies found:\n{discrepancies}\n\n"
+                f"We also have {plural(currency, 'key')} we can use to open up to {plural(num_puzzles_we_can_open, 'puzzle')}:\n"
+                f"{puzzles_to_buy}",
+            )
+        else:
+            await send_paginated(
+                ctx.reply,
+                f"Discrepancies found:\n{discrepancies}\n\n"
+                f"We also have {plural(currency, 'key')} but cannot open any of these puzzles until we solve something:\n"
+                f"{puzzles_to_buy}",
+            )
+
+    @staticmethod
+    def _normalize_puzzle_uri(uri):
+        """Older Puzzleboss entries link to /rounds/<round>?puzzle=<slug>,
+        which is the same puzzle as /puzzles/<slug>"""
+        if "/rounds/" not in uri or "?puzzle=" not in uri:
+            return uri
+        prefix, rest = uri.split("/rounds/", 1)
+        _, slug = rest.split("?puzzle=", 1)
+        return f"{prefix}/puzzles/{slug}"
+
+    @staticmethod
+    def _normalize_answer(answer):
+        return (answer or "").replace(" ", "") or None
+
+    def _diff_puzzles(self, rounds, db_puzzles, currency):
+        """Reconciles scraped rounds against Puzzleboss in a single pass,
+        looking each scraped puzzle up in an index of normalized DB URIs.
+
+        Returns new puzzles, answer mismatches and (if we have currency to
+        spend) unlockable puzzles, each as a list of dicts with a `key` which
+        stays the same for as long as the discrepancy does."""
+        by_uri = {
+            self._normalize_puzzle_uri(puzzle["puzzle_uri"]): puzzle
+            for puzzle in db_puzzles
+            if puzzle["puzzle_uri"]
+        }
+        diff = {"new": [], "answers": [], "unlockable": []}
         for round in rounds:
             round_name = round.get("title", "?")
             for puzzle in round.get("puzzles", []):
@@ -854,177 +1173,293 @@ He reached hastily into his pocket. The bum had stopped him and asked for a dime
                     continue
                 if puzzle.get("state", "?") != "unlocked":
                     if currency and not puzzle.get("hide_unlockable", False):
-                        bullet = "* "
-                        if is_meta:
-                            bullet += "**🏆META🏆** "
-                        bullet += f"{name} in `{round_name}`"
-                        if puzzle.get("desc", ""):
-                            bullet += f" (_{puzzle['desc']}_)"
-                        puzzles_to_buy.append(bullet)
+                        diff["unlockable"].append(
+                            {
+                                "key": ("unlockable", slug),
+                                "name": name,
+                                "round_name": round_name,
+                                "is_meta": is_meta,
+                                "desc": puzzle.get("desc", ""),
+                            }
+                        )
                     continue
                 puzzle_uri = (
                     f"{self.bot.hunt_config.hunt_domain}/puzzles/" + quote_plus(slug)
                 )
-                db_puzzle = None
-                for p in db_puzzles:
-                    db_puzzle_uri = re.sub(
-                        r"/rounds/\w+\?puzzle=", "/puzzles/", p["puzzle_uri"]
-                    )
-                    if db_puzzle_uri == puzzle_uri:
-                        db_puzzle = p
-                        break
+                db_puzzle = by_uri.get(puzzle_uri, None)
                 if not db_puzzle:
-                    add_puzzle_params = {
-                        "puzzurl": puzzle_uri,
-                        "puzzid": name,
-                        "roundname": round_name.replace(" ", ""),
-                    }
-                    if is_meta:
-                        add_puzzle_params["is_meta"] = 1
-                    add_puzzle_url = (
-                        "https://importanthuntpoll.org/pb/addpuzzle.php?"
-                        + urlencode(add_puzzle_params)
-                    )
-                    zoz_link = (
-                        f": {add_puzzle_url}"
-                        if "zoz" in ctx.author.name.lower()
-                        else "."
-                    )
-                    meta = "🏆META🏆 " if is_meta else ""
-                    discrepancies.append(
-                        f"* **New {meta}puzzle:** [{name}]({puzzle_uri}) "
-                        f"in round `{round_name}` needs to be added! "
-                        f"Click [here]({add_puzzle_url}) to add{zoz_link}"
+                    diff["new"].append(
+                        {
+                            "key": ("new", puzzle_uri),
+                            "name": name,
+                            "puzzle_uri": puzzle_uri,
+                            "round_name": round_name,
+                            "is_meta": is_meta,
+                        }
                     )
                     continue
-                answer = puzzle.get("answer", None)
-                if answer:
-                    answer = answer.replace(" ", "")
-                if not answer:
-                    answer = None
-                db_answer = db_puzzle["answer"]
-                if db_answer:
-                    db_answer = db_answer.replace(" ", "")
-                if not db_answer:
-                    db_answer = None
-                channel = f"<#{db_puzzle['channel_id']}>"
+                answer = self._normalize_answer(puzzle.get("answer", None))
+                db_answer = self._normalize_answer(db_puzzle["answer"])
                 if answer == db_answer:
                     continue
-                elif answer and not db_answer:
-                    discrepancies.append(
-                        f"* **Solved!** {channel} needs answer `{answer}`"
-                    )
-                elif not answer and db_answer:
-                    discrepancies.append(
-                        f"* Mis-labeled! {channel} lists answer `{db_answer}` "
-                        f"but is not marked as solved on the Hunt website"
-                    )
-                else:
-                    discrepancies.append(
-                        f"* Mis-labeled! {channel} lists answer `{db_answer}` "
-                        f"but the Hunt website says `{answer}`"
-                    )
-        discrepancies = "\n".join(discrepancies)
-        puzzles_to_buy = "\n".join(puzzles_to_buy)
-
-        async def send_chunks(message):
-            if len(message) < 2000:
-                await ctx.reply(message)
-                return
-            chunks = []
-            chunk = ""
-            first_line = True
-            for line in message.split("\n"):
-                if not first_line:
-                    line = "\n" + line
-                first_line = False
-                if len(line) >= 2000:
-                    chunk += line[: (2000 - len(chunk))]
-                    chunks.append(chunk)
-                    chunk = line[2000:]
-                    continue
-                if len(chunk) + len(line) >= 2000:
-                    chunks.append(chunk)
-                    chunk = ""
-                chunk += line
-            if chunk:
-                chunks.append(chunk)
-            for chunk in chunks:
-                await ctx.reply(chunk)
+                diff["answers"].append(
+                    {
+                        "key": ("answer", db_puzzle["id"], answer, db_answer),
+                        "channel_id": db_puzzle["channel_id"],
+                        "answer": answer,
+                        "db_answer": db_answer,
+                    }
+                )
+        return diff
 
-        if not discrepancies and not puzzles_to_buy:
-            await ctx.reply("Hunt website and Puzzleboss appear to be in sync :)")
-        elif not discrepancies and puzzles_to_buy and num_puzzles_we_can_open:
-            await send_chunks(
-                f"No discrepancies found, but we have {plural(currency, 'key')} "
-                f"we can use to open up to {plural(num_puzzles_we_can_open, 'puzzle')}:\n{puzzles_to_buy}"
-            )
-        elif not discrepancies and puzzles_to_buy and not num_puzzles_we_can_open:
-            await send_chunks(
-                f"No discrepancies found, and we have {plural(currency, 'key')} "
-                f"but cannot open any of these puzzles until we solve something:\n{puzzles_to_buy}"
+    def _format_discrepancy(self, discrepancy, show_add_link=False):
+        kind = discrepancy["key"][0]
+        if kind == "new":
+            name = discrepancy["name"]
+            puzzle_uri = discrepancy["puzzle_uri"]
+            round_name = discrepancy["round_name"]
+            add_puzzle_params = {
+                "puzzurl": puzzle_uri,
+                "puzzid": name,
+                "roundname": round_name.replace(" ", ""),
+            }
+            if discrepancy["is_meta"]:
+                add_puzzle_params["is_meta"] = 1
+            add_puzzle_url = (
+                "https://importanthuntpoll.org/pb/addpuzzle.php?"
+                + urlencode(add_puzzle_params)
             )
-        elif discrepancies and not puzzles_to_buy:
-            await send_chunks(f"Discrepancies found:\n{discrepancies}")
-        elif num_puzzles_we_can_open:
-            await send_chunks(
-                f"Discrepancies found:\n{discrepancies}\n\n"
-                f"We also have {plural(currency, 'key')} we can use to open up to {plural(num_puzzles_we_can_open, 'puzzle')}:\n"
-                f"{puzzles_to_buy}"
+            zoz_link = f": {add_puzzle_url}" if show_add_link else "."
+            meta = "🏆META🏆 " if discrepancy["is_meta"] else ""
+            return (
+                f"* **New {meta}puzzle:** [{name}]({puzzle_uri}) "
+                f"in round `{round_name}` needs to be added! "
+                f"Click [here]({add_puzzle_url}) to add{zoz_link}"
             )
-        else:
-            await send_chunks(
-                f"Discrepancies found:\n{discrepancies}\n\n"
-                f"We also have {plural(currency, 'key')} but cannot open any of these puzzles until we solve something:\n"
-                f"{puzzles_to_buy}"
+        channel = f"<#{discrepancy['channel_id']}>"
+        answer = discrepancy["answer"]
+        db_answer = discrepancy["db_answer"]
+        if answer and not db_answer:
+            return f"* **Solved!** {channel} needs answer `{answer}`"
+        if not answer:
+            return (
+                f"* Mis-labeled! {channel} lists answer `{db_answer}` "
+                f"but is not marked as solved on the Hunt website"
             )
+        return (
+            f"* Mis-labeled! {channel} lists answer `{db_answer}` "
+            f"but the Hunt website says `{answer}`"
+        )
+
+    def _format_unlockable(self, puzzle):
+        bullet = "* "
+        if puzzle["is_meta"]:
+            bullet += "**🏆META🏆** "
+        bullet += f"{puzzle['name']} in `{puzzle['round_name']}`"
+        if puzzle["desc"]:
+            bullet += f" (_{puzzle['desc']}_)"
+        return bullet
 
     @commands.command()
     async def hints(self, ctx):
-        config = self.bot.hunt_config
-        url = config.hunt_domain + "/activity_log"
-        cookie = config.get("scrape_cookie", None)
-        if not cookie:
+        """Which hints are we waiting on, and how long do they take?"""
+        if not self.bot.hunt_config.get("scrape_cookie", None):
             await ctx.reply("No cookie")
-        headers = {
-            "accept": "text/html",
-            "cache-control": "max-age=0",
-            "cookie": cookie,
-            "user-agent": "Puzzleboss v0.1 HuntTeam:"
-            + config.get("team_name", "Unknown"),
+            return
+        if not self.hint_watcher.is_running() or not self.hints_seeded:
+            try:
+                await self._update_hints()
+            except (FetchError, ValueError) as e:
+                await ctx.reply(str(e))
+                return
+
+        now = time.time()
+        lines = []
+        for puzzle in self.hint_tracker.pending():
+            lines.append(
+                f"Hint currently pending for **{puzzle.title}**, "
+                f"requested {_format_duration(now - puzzle.requested_at)} ago"
+            )
+        answered = self.hint_tracker.answered()
+        if answered:
+            puzzle = answered[0]
+            lines.append(
+                f"**Latest hint:** Came back for **{puzzle.title}** "
+                f"{_format_duration(now - puzzle.responded_at)} ago"
+            )
+        if not lines:
+            await ctx.reply("No hint info I can find so far! (Check Activity Log)")
+            return
+
+        latencies = self.hint_tracker.all_latencies()
+        if latencies:
+            lines.append(
+                "\nHints take {0} on average ({1} median, {2} longest), "
+                "over {3}:".format(
+                    _format_duration(statistics.fmean(latencies)),
+                    _format_duration(statistics.median(latencies)),
+                    _format_duration(max(latencies)),
+                    plural(len(latencies), "response"),
+                )
+            )
+            rows = []
+            for puzzle in answered:
+                stats = puzzle.stats()
+                if stats:
+                    rows.append(
+                        "{0:<30} {1:>2}x  median {2:>7}  max {3:>7}".format(
+                            puzzle.title[:30],
+                            stats["responses"],
+                            _format_duration(stats["median"]),
+                            _format_duration(stats["max"]),
+                        )
+                    )
+            lines.append("```\n" + "\n".join(rows) + "\n```")
+        await send_paginated(ctx.reply, "\n".join(lines))
+
+    async def _get_hunt_state(self):
+        """The Hunt website's puzzle list, parsed. Refetching an unchanged
+        page is cheap, and we only reparse when its contents change."""
+        page, _ = await self._fetch(self.bot.hunt_config.scrape_url)
+        if not self.hunt_state or self.hunt_state[0] != page.digest:
+            self.hunt_state = (page.digest, self._parse_hunt_state(page.text))
+        return self.hunt_state[1]
+
+    async def _get_activity_log(self):
+        url = self.bot.hunt_config.hunt_domain + "/activity_log"
+        page, _ = await self._fetch(url)
+        if not self.activity_log or self.activity_log[0] != page.digest:
+            self.activity_log = (page.digest, self._parse_activity_log(page.text))
+        return self.activity_log[1]
+
+    async def _fetch(self, url):
+        # Read the cookie each time, so !reload picks up a new one
+        config = self.bot.hunt_config
+        return await self.hunt_site.fetch(
+            url,
+            config.get("scrape_cookie", None) or "",
+            config.get("team_name", "Unknown"),
+        )
+
+    def _parse_hunt_state(self, result):
+        data = self._extract_globals(
+            result, ["initialAllPuzzlesState", "initialNavBarState"]
+        )
+        puzzles_state = data["initialAllPuzzlesState"]
+        nav_bar_state = data["initialNavBarState"]
+        num_open_puzzles = nav_bar_state.get("overworldPuzzlesOpen", 0)
+        max_width = nav_bar_state.get("maxOverworldWidth", 0)
+        return {
+            "currency": puzzles_state.get("currency", 0),
+            "rounds": puzzles_state.get("rounds", []),
+            "num_puzzles_we_can_open": max_width - num_open_puzzles,
         }
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    await ctx.reply(f"Scrape error code {response.status}")
-                    return
-                result = await response.text()
-        if "window.initialActivityLog = " not in result:
-            await ctx.reply("Data not found in scrape")
+
+    def _parse_activity_log(self, result):
+        return self._extract_globals(result, ["initialActivityLog"])[
+            "initialActivityLog"
+        ]
+
+    def _extract_globals(self, result, names):
+        """Pulls every `window.<name> = ...` we need from a page in one pass,
+        raising ValueError with something to tell the user if we can't"""
+        try:
+            data = extract_globals(result, names)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Cannot parse window.* JSON: {e}")
+        for name in names:
+            if name not in data:
+                raise ValueError(f"Cannot find window.{name} JSON")
+        return data
+
+    @tasks.loop(seconds=120.0, reconnect=True)
+    async def auto_sync(self):
+        """Scrapes the Hunt website in the background, and pushes anything
+        new (discrepancies, unlockable puzzles) to the status channel"""
+        channel = self.bot.get_channel(STATUS_CHANNEL)
+        if not channel:
             return
         try:
-            m = re.search(
-                r"(?<=window.initialActivityLog = )[\[{].*?[\]}](?=[;<])", result
+            await self._sync_to(channel)
+        except (aiohttp.ClientError, asyncio.TimeoutError, FetchError, ValueError) as e:
+            logging.warning(f"[auto_sync] Scrape failed: {e!r}")
+        except Exception:
+            # Anything else would stop the loop for the rest of the hunt
+            logging.exception("[auto_sync] Sync failed")
+
+    async def _sync_to(self, channel):
+        state = await self._get_hunt_state()
+        diff = self._diff_puzzles(
+            state["rounds"], PuzzleCache.get_all_puzzles(), state["currency"]
+        )
+        found = {}
+        for discrepancy in diff["new"] + diff["answers"]:
+            found[discrepancy["key"]] = self._format_discrepancy(discrepancy)
+        if state["num_puzzles_we_can_open"]:
+            for puzzle in diff["unlockable"]:
+                bullet = self._format_unlockable(puzzle)
+                found[puzzle["key"]] = "* **Can unlock:** " + bullet[2:]
+
+        # The first scrape after startup just learns what's already known
+        if self.reported is None:
+            self.reported = set(found)
+            return
+        new = [line for key, line in found.items() if key not in self.reported]
+        # Forget anything that's been resolved, so we'd report it again
+        self.reported = set(found)
+        if new:
+            await send_paginated(
+                channel.send, "**Hunt website sync:**\n" + "\n".join(new)
             )
-            if m is None:
-                await ctx.reply("Cannot find window.initialActivityLog JSON")
-                return
-            logs = json.loads(m.group(0))
-        except json.JSONDecodeError as _:
-            await ctx.reply("Cannot parse window.initialActivityLog JSON")
+
+    @tasks.loop(seconds=60, reconnect=True)
+    async def hint_watcher(self):
+        """Polls the activity log, and lets each puzzle's channel know when
+        their hint comes back"""
+        try:
+            await self._update_hints()
+        except (aiohttp.ClientError, asyncio.TimeoutError, FetchError, ValueError) as e:
+            logging.warning(f"[hint_watcher] Scrape failed: {e!r}")
+        except Exception:
+            # Anything else would stop the loop for the rest of the hunt
+            logging.exception("[hint_watcher] Hint update failed")
+
+    async def _update_hints(self):
+        logs = await self._get_activity_log()
+        changes = self.hint_tracker.update(logs, time.time())
+        # The first scrape after startup just learns what's already known
+        if not self.hints_seeded:
+            self.hints_seeded = True
             return
-        for log in logs[::-1]:
-            if log["type"] == "hint_responded":
-                await ctx.reply(
-                    f"**Hint available!** (Came back for **{log['resource_title']}**)"
-                )
-                return
-            if log["type"] == "hint_requested":
-                await ctx.reply(
-                    f"Hint currently pending for **{log['resource_title']}**, need to wait"
-                )
-                return
-        await ctx.reply("No hint info I can find so far! (Check Activity Log)")
+        for kind, puzzle in changes:
+            if kind != RESPONDED:
+                continue
+            content = f"**Hint available!** (Came back for **{puzzle.title}**"
+            if puzzle.latencies:
+                content += f", after {_format_duration(puzzle.latencies[-1])}"
+            content += ")"
+            channel = self._get_puzzle_channel(puzzle.title)
+            if channel:
+                await channel.send(content)
+                continue
+            channel = self.bot.get_channel(STATUS_CHANNEL)
+            if channel:
+                await channel.send(content)
+
+    def _get_puzzle_channel(self, title):
+        """The channel for a puzzle, going by its title on the Hunt website"""
+        puzzles = PuzzleCache.get_all_puzzles()
+        if not self.puzzle_channels or self.puzzle_channels[0] != PuzzleCache.version:
+            self.puzzle_channels = (
+                PuzzleCache.version,
+                {
+                    title_key(puzzle["name"]): int(puzzle["channel_id"])
+                    for puzzle in puzzles
+                    if puzzle["channel_id"]
+                },
+            )
+        channel_id = self.puzzle_channels[1].get(title_key(title), None)
+        return self.bot.get_channel(channel_id) if channel_id else None
 
 
 async def setup(bot):
@@ -3,7 +3,7 @@
 import aiohttp
 import asyncio
 from datetime import datetime, timedelta
-from db import REST, SQL
+from db import PuzzleCache, REST, SQL
 import discord
 from discord.ext import commands, tasks
 from discord.ext.commands import guild_only
@@ -11,7 +11,7 @@ import discord_info
 import logging
 import re
 import typing
-from common import build_puzzle_embed, xyzloc_mention
+from common import build_puzzle_embed, send_paginated, xyzloc_mention
 from pytz import timezone
 
 
@@ -86,17 +86,18 @@ class PuzzleStatus(commands.Cog):
         """What is happening at each table?
         Equivalent to calling `!location all` or `!whereis everything`"""
         table_channel = ctx.guild.get_channel(discord_info.TABLE_REPORT_CHANNEL)
-        await ctx.reply(
+        await send_paginated(
+            ctx.reply,
             "{0}\n\n_(Note: Check {1} for a live-updating version.)_".format(
                 self._tables(ctx.guild), table_channel.mention
-            )
+            ),
         )
 
     def _tables(self, guild):
         tables = discord_info.get_tables(guild)
         table_sizes = {table.name: len(table.members) for table in tables}
         xyzlocs = {table.name: [] for table in tables}
-        puzzles = SQL.get_all_puzzles()
+        puzzles = PuzzleCache.get_all_puzzles()
         quiet_puzzles = {}
         for puzzle in puzzles:
             if puzzle["status"] in ["Solved"]:
@@ -119,7 +120,7 @@ class PuzzleStatus(commands.Cog):
             xyzlocs[xyzloc].append("<#{channel_id}>".format(**puzzle))
 
         quiet_puzzles_str = ""
-        solved_rounds = SQL.get_solved_round_names()
+        solved_rounds = PuzzleCache.get_solved_round_names()
         quiet_puzzles = sorted(quiet_puzzles.items(), key=lambda x: -1 * max(x[1]))
         for round_name, channels in quiet_puzzles:
             if round_name in solved_rounds:
@@ -1,19 +1,58 @@
 """Contains bot commands for things that are useful for solving puzzles"""
 
+import asyncio
+import concurrent.futures
+from common import send_paginated
+from config import config
 import discord
 from discord.ext import commands
 from db import SQL
+import logging
+import multiprocessing
+import os
 import string
 import random
+import extensions.util.anagram as anagram
+import extensions.util.ciphers as ciphers
+import extensions.util.cryptogram as cryptogram
+import extensions.util.ngrams as ngrams
+from extensions.util.nutrimatic import PatternError, PhraseIndex
+from extensions.util.qat import QatError, Query, TooBroadError
+from extensions.util.words import WordIndex
 import extensions.util.urlhandler as urlhandler
 import extensions.util.tables as tables
 
 from bs4 import BeautifulSoup
 
+CRYPTOGRAM_BUDGET = 3.0
+# Longest message !rot takes, so a single rotation fits in one reply
+ROT_MAX_LENGTH = 1900
+
 
 class SolvingTools(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.wordlists = config.get("wordlists", {})
+        self.indexes = {}
+        self.indexes_lock = asyncio.Lock()
+        self.cryptogram_pool = None
+        self.cryptogram_workers = min(4, os.cpu_count() or 1)
+
+    def cog_unload(self):
+        if self.cryptogram_pool:
+            self.cryptogram_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _get_index(self, name, loader):
+        """A local wordlist from the config, indexed by `loader` on first
+        use, or None if we don't have one"""
+        path = self.wordlists.get(name, None)
+        if not path or not os.path.exists(path):
+            return None
+        async with self.indexes_lock:
+            if name not in self.indexes:
+                logging.info(f"Loading {name} wordlist from {path}")
+                self.indexes[name] = await asyncio.to_thread(loader, path)
+        return self.indexes[name]
 
     @commands.group(aliases=["tool"])
     async def tools(self, ctx):
@@ -103,6 +142,7 @@ class SolvingTools(commands.Cog):
     async def rot_alias(self, ctx, *, msg: str):
         """Rotates a message through all rot N and displays the permutations
         Limited to the first 60 chars due to Discord message size limits.
+        Also ranks every shift, Atbash and affine cipher by how English it looks.
         To rotate for a specific rotN, use something like `!rot13 foobar`"""
         return await self.rot(ctx, msg=msg)
 
@@ -110,7 +150,11 @@ class SolvingTools(commands.Cog):
     async def rot(self, ctx, *, msg: str):
         """Rotates a message through all rot N and displays the permutations
         Limited to the first 60 chars due to Discord message size limits.
+        Also ranks every shift, Atbash and affine cipher by how English it looks.
         To rotate for a specific rotN, use something like `!tools rot13 foobar`"""
+        if len(msg) > ROT_MAX_LENGTH:
+            await ctx.reply("Sorry, that's too long for Discord. Try a shorter string")
+            return
         response = "```\n" + "ROT  -N   N   MESSAGE\n"
         upper = string.ascii_uppercase * 2
         i = 0
@@ -120,12 +164,21 @@ class SolvingTools(commands.Cog):
             )
             i += 1
         response += "```"
-        try:
-            await ctx.reply(response)
-        except Exception:
-            await ctx.reply(
-                "Sorry, response was too long for Discord. Try a shorter string"
+        if len(ngrams.encode(msg)) >= 4:
+            model = await self._ngram_model()
+            ranked = ciphers.rank_monoalphabetic(msg, model, limit=5)
+            response += "\n**Most English-like:**\n```\n{0}\n```".format(
+                "\n".join(f"{name:<12} {text[:60]}" for _, name, text in ranked)
             )
+        await send_paginated(ctx.reply, response)
+
+    async def _ngram_model(self):
+        """English n-gram statistics from the config, or just letter
+        frequencies if there aren't any"""
+        return (
+            await self._get_index("ngrams", ngrams.NgramModel.from_file)
+            or ngrams.MONOGRAMS
+        )
 
     @commands.command(
         name="rot0", aliases=[f"rot{n}" for n in range(1, 26)], hidden=True
@@ -137,6 +190,9 @@ class SolvingTools(commands.Cog):
     @tools.command(name="rot0", aliases=[f"rot{n}" for n in range(1, 26)], hidden=True)
     async def rot_specific(self, ctx, *, msg: str):
         """Rotates a message just by rotN"""
+        if len(msg) > ROT_MAX_LENGTH:
+            await ctx.reply("Sorry, that's too long for Discord. Try a shorter string")
+            return
         i = int(ctx.invoked_with[3:])
         all_rotn = self._all_rotn(msg)
         response = "```\n" + "ROT  -N   N   MESSAGE\n"
@@ -145,12 +201,7 @@ class SolvingTools(commands.Cog):
             upper[i + 25], i - 26, i, all_rotn[i]
         )
         response += "```"
-        try:
-            await ctx.reply(response)
-        except Exception:
-            await ctx.reply(
-                "Sorry, response was too long for Discord. Try a shorter string"
-            )
+        await send_paginated(ctx.reply, response)
 
     def _all_rotn(self, msg):
         lower = string.ascii_lowercase * 2
@@ -166,6 +217,137 @@ class SolvingTools(commands.Cog):
             chars.append(c * 26)
         return ["".join(x) for x in zip(*chars)]
 
+    @commands.command(name="vigenere", aliases=["vig"], hidden=True)
+    async def vigenere_alias(self, ctx, *, text: str):
+        """Cracks (or decrypts) a Vigenère cipher
+        Usage: !vigenere Xn vzd xwy addx dz shxih
+        Usage: !vigenere key=puzzle Xn vzd xwy addx dz shxih
+        """
+        return await self.vigenere(ctx, text=text)
+
+    @tools.command(name="vigenere", aliases=["vig"])
+    async def vigenere(self, ctx, *, text: str):
+        """Cracks (or decrypts) a Vigenère cipher
+        Usage: !tools vigenere Xn vzd xwy addx dz shxih
+        Usage: !tools vigenere key=puzzle Xn vzd xwy addx dz shxih
+        """
+        first, _, rest = text.partition(" ")
+        if first.lower().startswith("key=") and rest:
+            key = first[len("key=") :]
+            await send_paginated(
+                ctx.reply,
+                f"Decrypted with key `{key}`:\n```\n"
+                + ciphers.vigenere_decrypt(rest, key)
+                + "\n```",
+            )
+            return
+        if len(ngrams.encode(text)) < 10:
+            await ctx.reply("I need at least 10 letters to crack that.")
+            return
+        model = await self._ngram_model()
+        results = await asyncio.to_thread(ciphers.crack_vigenere, text, model)
+        lines = [
+            f"**Key `{key}`** (period {len(key)}, IoC {ioc:.3f}, "
+            f"score {score:.2f}/letter):\n```\n{plaintext[:400]}\n```"
+            for score, key, ioc, plaintext in results
+        ]
+        await send_paginated(
+            ctx.reply,
+            "Most likely Vigenère keys (English IoC is about "
+            f"{ciphers.ENGLISH_IOC}, random is {ciphers.RANDOM_IOC:.3f}):\n"
+            + "\n".join(lines),
+        )
+
+    @commands.command(name="cryptogram", aliases=["crypto"], hidden=True)
+    async def cryptogram_alias(self, ctx, *, text: str):
+        """Solves a simple substitution cipher (cryptogram)
+        Usage: !cryptogram Gsv jfrxp yildm ulc qfnkh levi gsv ozab wlt
+        """
+        return await self.cryptogram(ctx, text=text)
+
+    @tools.command(name="cryptogram", aliases=["crypto"])
+    async def cryptogram(self, ctx, *, text: str):
+        """Solves a simple substitution cipher (cryptogram)
+        Usage: !tools cryptogram Gsv jfrxp yildm ulc qfnkh levi gsv ozab wlt
+        """
+        codes = ngrams.encode(text)
+        if len(codes) < 20:
+            await ctx.reply("I need at least 20 letters to solve that.")
+            return
+        pool = await self._cryptogram_pool()
+        if not pool:
+            await ctx.reply(
+                "Sorry, I need n-gram counts or a wordlist for that. "
+                "Try https://quipqiup.com/ instead."
+            )
+            return
+        loop = asyncio.get_running_loop()
+        # Each worker climbs from its own restarts, and the best key wins.
+        # Fresh seeds each time, so asking again can find something better
+        async with ctx.typing():
+            try:
+                results = await asyncio.gather(
+                    *[
+                        loop.run_in_executor(
+                            pool,
+                            cryptogram.solve,
+                            codes,
+                            CRYPTOGRAM_BUDGET,
+                            random.randrange(2**32),
+                        )
+                        for _ in range(self.cryptogram_workers)
+                    ]
+                )
+            except concurrent.futures.process.BrokenProcessPool:
+                logging.exception("Cryptogram worker died")
+                # Start a fresh pool next time
+                pool.shutdown(wait=False, cancel_futures=True)
+                if self.cryptogram_pool is pool:
+                    self.cryptogram_pool = None
+                await ctx.reply("Sorry, the solver crashed. Try again?")
+                return
+        _, key = max(results)
+        present = set(codes)
+        plaintext = text.translate(ciphers.translation(key))
+        await send_paginated(
+            ctx.reply,
+            "Best guess:\n```\n{0}\n```Key:\n```\nCipher: {1}\nPlain:  {2}\n```".format(
+                plaintext,
+                string.ascii_uppercase,
+                "".join(
+                    string.ascii_lowercase[key[c]] if c in present else "."
+                    for c in range(26)
+                ),
+            ),
+        )
+
+    async def _cryptogram_pool(self):
+        """Worker processes for hill climbing, set up with quadgram-ish
+        statistics, or None if we don't have any"""
+        if self.cryptogram_pool:
+            return self.cryptogram_pool
+        model = await self._ngram_model()
+        if model.n < 3:
+            index = await self._get_index("words", WordIndex.from_file)
+            if not index:
+                return None
+            async with self.indexes_lock:
+                if "wordlist_ngrams" not in self.indexes:
+                    self.indexes["wordlist_ngrams"] = await asyncio.to_thread(
+                        ngrams.NgramModel.from_words, index.words
+                    )
+            model = self.indexes["wordlist_ngrams"]
+        if not self.cryptogram_pool:
+            # Forking the bot could copy locks held by its other threads into
+            # the workers, so start them from a clean forkserver instead
+            self.cryptogram_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.cryptogram_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=cryptogram.init,
+                initargs=(model.logprobs.tobytes(), model.n),
+            )
+        return self.cryptogram_pool
+
     @commands.command(name="roll", hidden=True)
     async def roll_alias(self, ctx, dice: str):
         """Rolls a dice in NdN format."""
@@ -210,8 +392,9 @@ class SolvingTools(commands.Cog):
 
     @commands.command(name="nutrimatic", aliases=["nut"], hidden=True)
     async def nutrimatic_alias(self, ctx, *, query: str):
-        """Queries nutrimatic.org
+        """Matches word and phrase patterns, nutrimatic.org style
         Matches patterns against a dictionary of words and phrases mined from Wikipedia. Text is normalized to lowercase letters, numbers and spaces. More common results are returned first.
+        If a local phrase list is configured, we search that instead, and only fall back to the website for syntax we don't support.
 
         See https://nutrimatic.org for syntax.
 
@@ -227,8 +410,9 @@ class SolvingTools(commands.Cog):
 
     @tools.command(name="nutrimatic", aliases=["nut"])
     async def nutrimatic(self, ctx, *, query: str):
-        """Queries nutrimatic.org
+        """Matches word and phrase patterns, nutrimatic.org style
         Matches patterns against a dictionary of words and phrases mined from Wikipedia. Text is normalized to lowercase letters, numbers and spaces. More common results are returned first.
+        If a local phrase list is configured, we search that instead, and only fall back to the website for syntax we don't support.
 
         See https://nutrimatic.org for syntax.
 
@@ -288,6 +472,15 @@ class SolvingTools(commands.Cog):
                 + "]"
             )
             query = query.replace("�", noname).replace("@", noname)
+        index = await self._get_index("phrases", PhraseIndex.from_file)
+        if index:
+            try:
+                result = await self._local_nutrimatic(index, query)
+                await send_paginated(ctx.reply, result, buttons=True, author=ctx.author)
+                return
+            except PatternError as e:
+                # Not something we support locally, so let the website try
+                logging.info(f"{ctx.command}: Falling back to nutrimatic.org: {e}")
         params = {"q": query}
         response = await urlhandler.get(url, params=params)
         soup = BeautifulSoup(response, "html.parser")
@@ -303,31 +496,73 @@ class SolvingTools(commands.Cog):
                 f"No results for `!nut {query}`, so assuming a case-error:\n"
                 f"`!nut {query.lower()}` yields:\n```\n{results}```"
             )
+        await send_paginated(ctx.reply, result, buttons=True, author=ctx.author)
+
+    async def _local_nutrimatic(self, index, query):
+        """Like nutrimatic.org, but against our phrase list. Raises
+        PatternError for syntax we don't support."""
+        header = f"`!nut {query}` yields:\n"
         try:
-            await ctx.reply(result)
-        except Exception:
-            await ctx.reply(
-                "Sorry, response was too long for Discord. "
-                + "Try a shorter string or go directly to the tool online here:\n"
-                + urlhandler.build(url, params=params)
+            results, truncated = await asyncio.to_thread(index.search, query)
+        except PatternError:
+            if query == query.lower():
+                raise
+            results = []
+        if not results and query != query.lower():
+            results, truncated = await asyncio.to_thread(index.search, query.lower())
+            header = (
+                f"No results for `!nut {query}`, so assuming a case-error:\n"
+                f"`!nut {query.lower()}` yields:\n"
             )
+        if not results:
+            return header + "_(Nothing in the local phrase list.)_"
+        result = header + "```\n" + "\n".join(results) + "\n```"
+        if truncated:
+            result += (
+                "_(Search cut short, so these may not be the most common matches.)_"
+            )
+        return result
 
     @commands.command(name="qat", hidden=True)
     async def qat_alias(self, ctx, *, query: str):
-        """Queries Qat, a multi-pattern word searcher
+        """Qat-style multi-pattern word search
         Qat lets you search for words matching a given pattern.
 
         See https://www.quinapalus.com/qat.html for syntax.
+        If a local wordlist is configured, we search that instead, and only fall back to the website for syntax we don't support.
         """
         return await self.qat(ctx, query=query)
 
     @tools.command(name="qat")
     async def qat(self, ctx, *, query: str):
-        """Queries Qat, a multi-pattern word searcher
+        """Qat-style multi-pattern word search
         Qat lets you search for words matching a given pattern.
 
         See https://www.quinapalus.com/qat.html for syntax.
+        If a local wordlist is configured, we search that instead, and only fall back to the website for syntax we don't support.
         """
+        index = await self._get_index("words", WordIndex.from_file)
+        if index:
+            try:
+                qat_query = Query(query.replace('"', ""))
+            except TooBroadError as e:
+                await ctx.reply(f"Sorry, that's too broad to search. {e}.")
+                return
+            except QatError as e:
+                logging.info(f"{ctx.command}: Falling back to Qat online: {e}")
+            else:
+                results, truncated = await asyncio.to_thread(qat_query.search, index)
+                result = f"`!qat {query}` yields:\n"
+                if results:
+                    result += "```\n{0}\n```".format(
+                        "\n".join(" ".join(words) for words in results)
+                    )
+                else:
+                    result += "_(Nothing in the local wordlist.)_"
+                if truncated:
+                    result += "\n_(Search cut short, so there may be more.)_"
+                await send_paginated(ctx.reply, result, buttons=True, author=ctx.author)
+                return
         url = "https://www.quinapalus.com/cgi-bin/qat"
         params = {"pat": query.replace('"', "")}
         response = await urlhandler.get(url, params=params)
@@ -341,14 +576,140 @@ class SolvingTools(commands.Cog):
             .replace("\xa0", "")
         )
         result = f"`!qat {query}` yields:\n```\n{result}\n```"
-        try:
-            await ctx.reply(result)
-        except Exception:
+        await send_paginated(ctx.reply, result, buttons=True, author=ctx.author)
+
+    async def _anagram_index(self, ctx):
+        index = await self._get_index("words", WordIndex.from_file)
+        if not index:
             await ctx.reply(
-                "Sorry, response was too long for Discord. "
-                + "Try a shorter string or go directly to the tool online here:\n"
-                + urlhandler.build(url, params=params)
+                "Sorry, I need a local wordlist for that. "
+                "Try https://wordsmith.org/anagram/ instead."
+            )
+        return index
+
+    @commands.command(name="anagram", aliases=["an"], hidden=True)
+    async def anagram_alias(self, ctx, *, letters: str):
+        """Finds words and phrases using exactly the given letters
+        Usage: !anagram dormitory
+        Add a number to allow phrases of up to that many words (default 3, max 4):
+        Usage: !anagram astronomers 2
+        """
+        return await self.anagram(ctx, letters=letters)
+
+    @tools.command(name="anagram", aliases=["an"])
+    async def anagram(self, ctx, *, letters: str):
+        """Finds words and phrases using exactly the given letters
+        Usage: !tools anagram dormitory
+        Add a number to allow phrases of up to that many words (default 3, max 4):
+        Usage: !tools anagram astronomers 2
+        """
+        max_words = 3
+        text, _, last = letters.rpartition(" ")
+        if text and last.isdigit():
+            letters, max_words = text, max(1, min(4, int(last)))
+        index = await self._anagram_index(ctx)
+        if not index:
+            return
+        try:
+            words = anagram.anagrams(index, letters)
+            phrases, truncated = await asyncio.to_thread(
+                anagram.multi_anagrams, index, letters, max_words
+            )
+        except anagram.AnagramError as e:
+            await ctx.reply(str(e))
+            return
+        result = f"Anagrams of `{letters}`:\n"
+        if words:
+            result += "**Words:** " + ", ".join(words[:30]) + "\n"
+        phrases = [phrase for phrase in phrases if len(phrase) > 1]
+        if phrases:
+            result += "**Phrases:**\n```\n{0}\n```".format(
+                "\n".join(" ".join(phrase) for phrase in phrases)
+            )
+        if not words and not phrases:
+            result += "_(Nothing in the local wordlist.)_\n"
+        if truncated:
+            result += "_(Search cut short, so there may be more.)_"
+        await send_paginated(ctx.reply, result, buttons=True, author=ctx.author)
+
+    @commands.command(name="subanagram", aliases=["subanagrams"], hidden=True)
+    async def subanagram_alias(self, ctx, *, letters: str):
+        """Finds words using some of the given letters, longest first
+        Usage: !subanagram aeinrst
+        """
+        return await self.subanagram(ctx, letters=letters)
+
+    @tools.command(name="subanagram", aliases=["subanagrams"])
+    async def subanagram(self, ctx, *, letters: str):
+        """Finds words using some of the given letters, longest first
+        Usage: !tools subanagram aeinrst
+        """
+        index = await self._anagram_index(ctx)
+        if not index:
+            return
+        try:
+            matches, truncated = await asyncio.to_thread(
+                anagram.subanagrams, index, letters
+            )
+        except anagram.AnagramError as e:
+            await ctx.reply(str(e))
+            return
+        await send_paginated(
+            ctx.reply,
+            self._by_length(
+                f"Words in `{letters}`:\n", [word for _, word in matches], truncated
+            ),
+            buttons=True,
+            author=ctx.author,
+        )
+
+    @commands.command(name="letterbank", aliases=["lb"], hidden=True)
+    async def letterbank_alias(self, ctx, *, letters: str):
+        """Finds words using all of the given letters, and only them, repeated as needed
+        Usage: !letterbank aegmnt
+        """
+        return await self.letterbank(ctx, letters=letters)
+
+    @tools.command(name="letterbank", aliases=["lb"])
+    async def letterbank(self, ctx, *, letters: str):
+        """Finds words using all of the given letters, and only them, repeated as needed
+        Usage: !tools letterbank aegmnt
+        """
+        index = await self._anagram_index(ctx)
+        if not index:
+            return
+        try:
+            matches, truncated = await asyncio.to_thread(
+                anagram.letterbank, index, letters
+            )
+        except anagram.AnagramError as e:
+            await ctx.reply(str(e))
+            return
+        await send_paginated(
+            ctx.reply,
+            self._by_length(f"Letter bank `{letters}`:\n", matches, truncated),
+            buttons=True,
+            author=ctx.author,
+        )
+
+    def _by_length(self, header, words, truncated, per_length=15):
+        """Words (most common first) listed by length, longest first"""
+        by_length = {}
+        for word in words:
+            by_length.setdefault(len(word), []).append(word)
+        if not by_length:
+            return header + "_(Nothing in the local wordlist.)_"
+        lines = []
+        for length in sorted(by_length, reverse=True):
+            shown = by_length[length][:per_length]
+            more = len(by_length[length]) - len(shown)
+            lines.append(
+                f"{length:2d}: " + " ".join(shown) + (f" (+{more})" if more else "")
             )
+        result = header + "```\n" + "\n".join(lines) + "\n```"
+        if truncated:
+            result += "_(Search cut short, so there may be more.)_"
+        return result
 
     @commands.command(name="abc", hidden=True)
     async def abc_alias(self, ctx, *args: str):
@@ -0,0 +1,73 @@
+"""Sliding window of recent chat activity, bucketed per minute"""
+
+import time
+
+
+class _Bucket:
+    __slots__ = ("minute", "messages", "authors", "channels")
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.messages = 0
+        self.authors = set()
+        self.channels = {}
+
+
+class ActivityWindow:
+    """Ring buffer of per-minute buckets, fed one message at a time.
+
+    Each bucket tracks its message count, distinct authors and messages per
+    channel, so any query over the window only touches `minutes` buckets.
+    """
+
+    def __init__(self, minutes=15):
+        self.minutes = minutes
+        self.buckets = [None] * minutes
+
+    def record(self, author_id, channel_id, timestamp=None):
+        """Count one message. `timestamp` is POSIX seconds (default: now)"""
+        if timestamp is None:
+            timestamp = time.time()
+        minute = int(timestamp // 60)
+        slot = minute % self.minutes
+        bucket = self.buckets[slot]
+        if bucket is None or bucket.minute != minute:
+            if bucket is not None and bucket.minute > minute:
+                # Older than anything the window still covers
+                return
+            bucket = self.buckets[slot] = _Bucket(minute)
+        bucket.messages += 1
+        bucket.authors.add(author_id)
+        bucket.channels[channel_id] = bucket.channels.get(channel_id, 0) + 1
+
+    def _recent(self, minutes, now=None, include_current=True):
+        if now is None:
+            now = time.time()
+        current = int(now // 60)
+        newest = current if include_current else current - 1
+        oldest = current - min(minutes, self.minutes) + 1
+        for bucket in self.buckets:
+            if bucket is not None and oldest <= bucket.minute <= newest:
+                yield bucket
+
+    def authors(self, minutes=None, now=None):
+        """Distinct authors seen in the last `minutes` (default: whole window)"""
+        authors = set()
+        for bucket in self._recent(minutes or self.minutes, now):
+            authors.update(bucket.authors)
+        return authors
+
+    def messages(self, minutes=1, now=None):
+        """Messages sent over the last `minutes` complete minutes"""
+        return sum(
+            bucket.messages
+            for bucket in self._recent(minutes + 1, now, include_current=False)
+        )
+
+    def channels(self, minutes=None, now=None):
+        """Mapping of channel id to message count over the last `minutes`"""
+        channels = {}
+        for bucket in self._recent(minutes or self.minutes, now):
+            for channel_id, count in bucket.channels.items():
+                channels[channel_id] = channels.get(channel_id, 0) + count
+        return channels
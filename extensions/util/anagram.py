@@ -0,0 +1,159 @@
+"""Anagrams, subanagrams and letter banks over a WordIndex.
+
+Single-word anagrams are one lookup in the index's signature table. Every
+other search starts by narrowing the wordlist to words whose letters are all
+available, using the index's letter masks, and then works with each word's
+letter counts packed into one integer: six bits per letter, with the top bit
+of each field as a guard. Subtracting one packed word from another then
+borrows into a guard bit exactly when some letter runs out, so checking that
+a word fits in the letters we have left is one subtraction and one AND.
+"""
+
+import time
+
+from extensions.util.words import ALPHABET, letter_mask
+
+FIELD = 6
+GUARDS = sum(1 << (FIELD * n + FIELD - 1) for n in range(26))
+MAX_LETTERS = (1 << (FIELD - 1)) - 1
+
+
+class AnagramError(ValueError):
+    pass
+
+
+def _letters(text):
+    letters = "".join(c for c in text.lower() if c in ALPHABET)
+    if not letters:
+        raise AnagramError("No letters to anagram")
+    if max(letters.count(c) for c in set(letters)) > MAX_LETTERS:
+        raise AnagramError(f"At most {MAX_LETTERS} of any one letter, please")
+    return letters
+
+
+def pack(word):
+    """Letter counts of `word` packed into one integer"""
+    packed = 0
+    for c in word:
+        packed += 1 << (FIELD * (ord(c) - 97))
+    return packed
+
+
+def fits(packed, within):
+    """Whether every letter counted in `packed` is also in `within`"""
+    return ((within | GUARDS) - packed) & GUARDS == GUARDS
+
+
+class _Deadline:
+    def __init__(self, budget):
+        self.deadline = time.perf_counter() + budget
+        self.checks = 0
+
+    def passed(self):
+        self.checks += 1
+        return self.checks % 4096 == 0 and time.perf_counter() > self.deadline
+
+
+def anagrams(index, text):
+    """Single words using exactly the letters of `text`, most common first"""
+    letters = _letters(text)
+    return [index.words[i] for i in sorted(index.anagrams(letters))]
+
+
+def subanagrams(index, text, min_length=3, budget=1.0):
+    """Words that can be made from some of the letters of `text`, as
+    (word ID, word) pairs, most common first, and whether we ran out of
+    time. IDs are ranks, so they sort by how common the words are."""
+    letters = _letters(text)
+    within = pack(letters)
+    deadline = _Deadline(budget)
+    matches = []
+    candidates = index.candidates(
+        min_length, len(letters), allowed=letter_mask(letters), ordered=False
+    )
+    for i in candidates:
+        if deadline.passed():
+            return sorted(matches), True
+        word = index.words[i]
+        if fits(pack(word), within):
+            matches.append((i, word))
+    return sorted(matches), False
+
+
+def letterbank(index, text, min_length=None, budget=1.0):
+    """Words using every letter of `text`, and no others, as often as they
+    like, most common first, and whether we ran out of time"""
+    mask = letter_mask(_letters(text))
+    deadline = _Deadline(budget)
+    matches = []
+    # Each letter at least once, so they're at least as long as the bank
+    candidates = index.candidates(
+        min_length or bin(mask).count("1"), required=mask, allowed=mask, ordered=False
+    )
+    for i in candidates:
+        if deadline.passed():
+            return [index.words[i] for i in sorted(matches)], True
+        matches.append(i)
+    return [index.words[i] for i in sorted(matches)], False
+
+
+def multi_anagrams(
+    index, text, max_words=3, min_length=2, limit=50, budget=1.0, max_results=20000
+):
+    """Phrases of up to `max_words` words using exactly the letters of
+    `text`, as lists of words, and whether we ran out of time or results.
+    Phrases are ranked by their rarest word, then by how few words they
+    have. Each set of letters is spelled with its most common word, so
+    "dormitory" gives "dirty room" but not also "dirty moor"."""
+    letters = _letters(text)
+    target = pack(letters)
+    subwords, truncated = subanagrams(index, letters, min_length, budget / 2)
+    # The most common word for each distinct packed set of letters
+    best = {}
+    for i, word in subwords:
+        best.setdefault(pack(word), (i, word))
+    # Longest words first, so each phrase is found once, in this order
+    words = sorted(
+        ((len(word), packed, i, word) for packed, (i, word) in best.items()),
+        key=lambda entry: (-entry[0], entry[1]),
+    )
+    position = {packed: n for n, (_, packed, _, _) in enumerate(words)}
+    deadline = _Deadline(budget / 2)
+    results = []
+
+    def search(remaining, length, start, words_left, phrase):
+        # The last word has to be exactly what's left
+        last = position.get(remaining)
+        if last is not None and last >= start:
+            results.append(phrase + [words[last]])
+            if len(results) >= max_results:
+                raise TimeoutError
+        if words_left == 1:
+            return
+        for n in range(start, len(words)):
+            word_length, packed, _, _ = words[n]
+            # Later words are no longer than this one, so they can't use up
+            # the rest unless it's short enough
+            if word_length * words_left < length:
+                return
+            if deadline.passed():
+                raise TimeoutError
+            if word_length >= length:
+                continue
+            if fits(packed, remaining):
+                search(
+                    remaining - packed,
+                    length - word_length,
+                    n,
+                    words_left - 1,
+                    phrase + [words[n]],
+                )
+
+    try:
+        search(target, len(letters), 0, max_words, [])
+    except TimeoutError:
+        truncated = True
+    ranked = sorted(
+        results, key=lambda phrase: (max(i for _, _, i, _ in phrase), len(phrase))
+    )
+    return [[word for _, _, _, word in phrase] for phrase in ranked[:limit]], truncated
@@ -0,0 +1,277 @@
+"""Dependency-free line chart rendering to PNG"""
+
+import functools
+import struct
+import zlib
+
+# Chart.js' default palette, which QuickChart used for us
+PALETTE = [
+    (54, 162, 235),
+    (255, 99, 132),
+    (75, 192, 192),
+    (255, 159, 64),
+    (153, 102, 255),
+    (255, 205, 86),
+    (201, 203, 207),
+]
+
+# fmt: off
+FONT = {
+    "A": "01110 10001 10001 11111 10001 10001 10001",
+    "B": "11110 10001 10001 11110 10001 10001 11110",
+    "C": "01110 10001 10000 10000 10000 10001 01110",
+    "D": "11100 10010 10001 10001 10001 10010 11100",
+    "E": "11111 10000 10000 11110 10000 10000 11111",
+    "F": "11111 10000 10000 11110 10000 10000 10000",
+    "G": "01110 10001 10000 10111 10001 10001 01111",
+    "H": "10001 10001 10001 11111 10001 10001 10001",
+    "I": "01110 00100 00100 00100 00100 00100 01110",
+    "J": "00111 00010 00010 00010 00010 10010 01100",
+    "K": "10001 10010 10100 11000 10100 10010 10001",
+    "L": "10000 10000 10000 10000 10000 10000 11111",
+    "M": "10001 11011 10101 10101 10001 10001 10001",
+    "N": "10001 10001 11001 10101 10011 10001 10001",
+    "O": "01110 10001 10001 10001 10001 10001 01110",
+    "P": "11110 10001 10001 11110 10000 10000 10000",
+    "Q": "01110 10001 10001 10001 10101 10010 01101",
+    "R": "11110 10001 10001 11110 10100 10010 10001",
+    "S": "01111 10000 10000 01110 00001 00001 11110",
+    "T": "11111 00100 00100 00100 00100 00100 00100",
+    "U": "10001 10001 10001 10001 10001 10001 01110",
+    "V": "10001 10001 10001 10001 10001 01010 00100",
+    "W": "10001 10001 10001 10101 10101 10101 01010",
+    "X": "10001 10001 01010 00100 01010 10001 10001",
+    "Y": "10001 10001 10001 01010 00100 00100 00100",
+    "Z": "11111 00001 00010 00100 01000 10000 11111",
+    "0": "01110 10001 10011 10101 11001 10001 01110",
+    "1": "00100 01100 00100 00100 00100 00100 01110",
+    "2": "01110 10001 00001 00010 00100 01000 11111",
+    "3": "11111 00010 00100 00010 00001 10001 01110",
+    "4": "00010 00110 01010 10010 11111 00010 00010",
+    "5": "11111 10000 11110 00001 00001 10001 01110",
+    "6": "00110 01000 10000 11110 10001 10001 01110",
+    "7": "11111 00001 00010 00100 01000 01000 01000",
+    "8": "01110 10001 10001 01110 10001 10001 01110",
+    "9": "01110 10001 10001 01111 00001 00010 01100",
+    "(": "00010 00100 01000 01000 01000 00100 00010",
+    ")": "01000 00100 00010 00010 00010 00100 01000",
+    "#": "01010 01010 11111 01010 11111 01010 01010",
+    ":": "00000 01100 01100 00000 01100 01100 00000",
+    "-": "00000 00000 00000 11111 00000 00000 00000",
+    "+": "00000 00100 00100 11111 00100 00100 00000",
+    ".": "00000 00000 00000 00000 00000 01100 01100",
+    ",": "00000 00000 00000 00000 01100 00100 01000",
+    "/": "00000 00001 00010 00100 01000 10000 00000",
+    " ": "00000 00000 00000 00000 00000 00000 00000",
+    "?": "01110 10001 00001 00010 00100 00000 00100",
+}
+# fmt: on
+GLYPHS = {
+    char: [[bit == "1" for bit in row] for row in rows.split()]
+    for char, rows in FONT.items()
+}
+
+
+@functools.lru_cache(maxsize=32)
+def _blend_tables(color, alpha):
+    return [
+        bytes(round(c * alpha + v * (1 - alpha)) for v in range(256)) for c in color
+    ]
+
+
+class Canvas:
+    def __init__(self, width, height, background=(255, 255, 255)):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def set(self, x, y, color):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = 3 * (y * self.width + x)
+            self.pixels[i : i + 3] = bytes(color)
+
+    def fill_rect(self, x0, y0, x1, y1, color, alpha=1.0):
+        x0, x1 = max(0, min(x0, x1)), min(self.width, max(x0, x1))
+        y0, y1 = max(0, min(y0, y1)), min(self.height, max(y0, y1))
+        if x0 >= x1 or y0 >= y1:
+            return
+        if alpha >= 1.0:
+            span = bytes(color) * (x1 - x0)
+            for y in range(y0, y1):
+                i = 3 * (y * self.width + x0)
+                self.pixels[i : i + len(span)] = span
+            return
+        # Blend each channel through a lookup table, one row slice at a time
+        tables = _blend_tables(tuple(color), alpha)
+        for y in range(y0, y1):
+            i = 3 * (y * self.width + x0)
+            j = 3 * (y * self.width + x1)
+            for channel, table in enumerate(tables):
+                row = self.pixels[i + channel : j : 3]
+                self.pixels[i + channel : j : 3] = row.translate(table)
+
+    def line(self, x0, y0, x1, y1, color, width=1):
+        x0, y0, x1, y1 = round(x0), round(y0), round(x1), round(y1)
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        lo, hi = -(width // 2), (width + 1) // 2
+        while True:
+            if width == 1:
+                self.set(x0, y0, color)
+            else:
+                self.fill_rect(x0 + lo, y0 + lo, x0 + hi, y0 + hi, color)
+            if x0 == x1 and y0 == y1:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def text(self, x, y, text, color=(0, 0, 0), scale=1):
+        for char in text.upper():
+            glyph = GLYPHS.get(char, GLYPHS["?"])
+            for row, bits in enumerate(glyph):
+                for col, bit in enumerate(bits):
+                    if bit:
+                        self.fill_rect(
+                            x + col * scale,
+                            y + row * scale,
+                            x + (col + 1) * scale,
+                            y + (row + 1) * scale,
+                            color,
+                        )
+            x += 6 * scale
+
+    def to_png(self):
+        stride = 3 * self.width
+        raw = b"".join(
+            b"\x00" + self.pixels[y * stride : (y + 1) * stride]
+            for y in range(self.height)
+        )
+
+        def chunk(kind, data):
+            body = kind + data
+            return (
+                struct.pack(">I", len(data))
+                + body
+                + struct.pack(">I", zlib.crc32(body))
+            )
+
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(
+                b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+            )
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b"")
+        )
+
+
+def text_width(text, scale=1):
+    return 6 * scale * len(text) - scale
+
+
+def render_line_chart(
+    datasets,
+    x_range,
+    y_range,
+    x_ticks,
+    y_ticks,
+    title="",
+    y_label="",
+    width=1000,
+    height=600,
+):
+    """Renders a line chart and returns it as PNG bytes.
+
+    Each dataset is a dict with `label`, `points` (a list of (x, y) pairs,
+    where y may be None to break the line), and optionally `color` (r, g, b),
+    `alpha`, `line_width` and `fill` (shade everything below the line).
+    Ticks are lists of (value, label) pairs.
+    """
+    canvas = Canvas(width, height)
+    (x_min, x_max), (y_min, y_max) = x_range, y_range
+    legend_width = 12 + max([text_width(d["label"]) for d in datasets] + [0]) + 20
+    left, right = 60, width - legend_width
+    top, bottom = 40, height - 40
+
+    def px(x):
+        return left + (x - x_min) * (right - left) / ((x_max - x_min) or 1)
+
+    def py(y):
+        y = min(max(y, y_min), y_max)
+        return bottom - (y - y_min) * (bottom - top) / ((y_max - y_min) or 1)
+
+    for i, dataset in enumerate(datasets):
+        dataset.setdefault("color", PALETTE[i % len(PALETTE)])
+
+    # Filled areas go underneath everything else
+    for dataset in datasets:
+        if not dataset.get("fill"):
+            continue
+        points = dataset["points"]
+        for (xa, ya), (xb, yb) in zip(points, points[1:]):
+            if ya is None or yb is None:
+                continue
+            x0, x1 = round(px(xa)), round(px(xb))
+            if ya == yb:
+                canvas.fill_rect(
+                    max(x0, left),
+                    round(py(ya)),
+                    min(x1, right),
+                    bottom,
+                    dataset["color"],
+                    dataset.get("alpha", 0.2),
+                )
+                continue
+            for x in range(max(x0, left), min(x1, right)):
+                t = (x - x0) / ((x1 - x0) or 1)
+                canvas.fill_rect(
+                    x,
+                    round(py(ya + t * (yb - ya))),
+                    x + 1,
+                    bottom,
+                    dataset["color"],
+                    dataset.get("alpha", 0.2),
+                )
+
+    grid = (225, 225, 225)
+    axis = (102, 102, 102)
+    for value, label in y_ticks:
+        y = round(py(value))
+        canvas.line(left, y, right, y, grid)
+        canvas.text(left - 6 - text_width(label), y - 3, label, axis)
+    for value, label in x_ticks:
+        x = round(px(value))
+        canvas.line(x, top, x, bottom, grid)
+        canvas.text(x - text_width(label) // 2, bottom + 8, label, axis)
+    canvas.line(left, top, left, bottom, axis)
+    canvas.line(left, bottom, right, bottom, axis)
+
+    for dataset in datasets:
+        line_width = dataset.get("line_width", 2)
+        if not line_width:
+            continue
+        points = dataset["points"]
+        for (xa, ya), (xb, yb) in zip(points, points[1:]):
+            if ya is None or yb is None:
+                continue
+            canvas.line(px(xa), py(ya), px(xb), py(yb), dataset["color"], line_width)
+
+    if title:
+        canvas.text((width - text_width(title, 2)) // 2, 12, title, scale=2)
+    if y_label:
+        canvas.text(8, top - 24, y_label, axis)
+    y = top
+    for dataset in datasets:
+        alpha = dataset.get("alpha", 0.2) if dataset.get("fill") else 1.0
+        canvas.fill_rect(right + 12, y, right + 20, y + 7, dataset["color"], alpha)
+        canvas.text(right + 24, y, dataset["label"], axis)
+        y += 14
+
+    return canvas.to_png()
@@ -0,0 +1,229 @@
+"""Breaking classical ciphers by scoring candidates against English.
+
+Every monoalphabetic candidate (shifts, Atbash, affine) is a permutation of
+the alphabet, so instead of decrypting the text once per key, we count the
+ciphertext's n-grams once and score each key by looking up where it sends
+them. Vigenère keys are found per column of the text, using the index of
+coincidence to pick likely periods first, and then refined against the
+whole text. Decryptions for display go through str.translate, so case and
+punctuation survive.
+"""
+
+import collections
+import string
+
+from extensions.util.ngrams import MONOGRAMS, encode
+
+LOWER = string.ascii_lowercase
+UPPER = string.ascii_uppercase
+COPRIMES = [1, 3, 5, 7, 9, 11, 15, 17, 19, 21, 23, 25]
+# Index of coincidence of English text, and of uniformly random letters
+ENGLISH_IOC = 0.0667
+RANDOM_IOC = 1 / 26
+
+
+def translation(mapping):
+    """A str.translate table sending letter i to letter mapping[i],
+    keeping case"""
+    return str.maketrans(
+        LOWER + UPPER,
+        "".join(LOWER[i] for i in mapping) + "".join(UPPER[i] for i in mapping),
+    )
+
+
+def affine_candidates():
+    """(name, decryption mapping) for every shift, Atbash, and every other
+    affine cipher"""
+    candidates = []
+    for m in COPRIMES:
+        for k in range(26):
+            # Decrypting is y -> m * y + k, so encrypting is x -> a * x + b
+            mapping = [(m * y + k) % 26 for y in range(26)]
+            if m == 1:
+                name = f"ROT{k}"
+            elif m == 25 and k == 25:
+                name = "Atbash"
+            else:
+                a = pow(m, -1, 26)
+                name = f"Affine {a}x+{-a * k % 26}"
+            candidates.append((name, mapping))
+    return candidates
+
+
+AFFINE_CANDIDATES = affine_candidates()
+
+
+class _NgramCounts:
+    """The ciphertext's n-grams with their counts, so a key can be scored
+    by where it sends each distinct n-gram"""
+
+    def __init__(self, codes, model):
+        self.model = model
+        n = min(model.n, len(codes))
+        self.ngrams = list(
+            collections.Counter(
+                tuple(codes[i : i + n]) for i in range(len(codes) - n + 1)
+            ).items()
+        )
+
+    def score(self, mapping):
+        logprobs = self.model.logprobs
+        if self.model.n == 1:
+            return sum(count * logprobs[mapping[c]] for (c,), count in self.ngrams)
+        total = 0.0
+        for ngram, count in self.ngrams:
+            index = 0
+            for c in ngram:
+                index = index * 26 + mapping[c]
+            total += count * logprobs[index]
+        return total
+
+
+def _model_for(codes, model):
+    # Too short for n-grams to say much, so fall back to letter frequencies
+    return model if len(codes) >= 2 * model.n else MONOGRAMS
+
+
+def rank_monoalphabetic(
+    text, model=MONOGRAMS, candidates=AFFINE_CANDIDATES, limit=None
+):
+    """[(score per letter, name, plaintext)] for the best `limit`
+    candidates (or all of them), best first"""
+    codes = encode(text)
+    if not codes:
+        return []
+    counts = _NgramCounts(codes, _model_for(codes, model))
+    scored = sorted(
+        ((counts.score(mapping), name, mapping) for name, mapping in candidates),
+        key=lambda candidate: -candidate[0],
+    )
+    return [
+        (score / len(codes), name, text.translate(translation(mapping)))
+        for score, name, mapping in scored[:limit]
+    ]
+
+
+def index_of_coincidence(codes):
+    if len(codes) < 2:
+        return 0.0
+    counts = collections.Counter(codes)
+    return sum(f * (f - 1) for f in counts.values()) / (len(codes) * (len(codes) - 1))
+
+
+def likely_periods(codes, max_period=20, top=3, min_column=10):
+    """(period, mean column index of coincidence) for the likeliest
+    periods, most English-like first. A multiple of the true period scores
+    about as well as it does, so we prefer a divisor if it's nearly as good,
+    but the best-scoring period itself always makes the list. Columns need
+    `min_column` letters for their IoC to mean much."""
+    periods = {}
+    for period in range(1, max(1, min(max_period, len(codes) // min_column)) + 1):
+        columns = [codes[i::period] for i in range(period)]
+        periods[period] = sum(map(index_of_coincidence, columns)) / period
+    ranked = sorted(periods, key=lambda period: -periods[period])
+    chosen = []
+    for period in ranked:
+        divisors = [d for d in periods if d < period and period % d == 0]
+        best = max(divisors, key=periods.get, default=None)
+        if best is not None and periods[best] - RANDOM_IOC >= 0.8 * (
+            periods[period] - RANDOM_IOC
+        ):
+            period = best
+        if period not in chosen:
+            chosen.append(period)
+    chosen = chosen[:top]
+    if ranked[0] not in chosen:
+        chosen[-1] = ranked[0]
+    return [(period, periods[period]) for period in chosen]
+
+
+def vigenere_decrypt_codes(codes, shifts):
+    """Integer-encoded Vigenère decryption: each column of the text is one
+    bytes.translate with its own shift table"""
+    plain = bytearray(len(codes))
+    period = len(shifts)
+    for column, shift in enumerate(shifts):
+        table = bytes((c - shift) % 26 for c in range(26)) + bytes(230)
+        plain[column::period] = codes[column::period].translate(table)
+    return bytes(plain)
+
+
+def vigenere_decrypt(text, key):
+    """Decrypts `text` with a Vigenère key, keeping case and punctuation
+    (which don't use up key letters)"""
+    shifts = [ord(c) - 97 for c in key.lower() if c in LOWER]
+    if not shifts:
+        return text
+    tables = [translation([(y - shift) % 26 for y in range(26)]) for shift in shifts]
+    result = []
+    n = 0
+    for c in text:
+        if c.isascii() and c.isalpha():
+            c = c.translate(tables[n % len(tables)])
+            n += 1
+        result.append(c)
+    return "".join(result)
+
+
+def _column_shifts(codes, period):
+    """The best shift for each column on its own, by letter frequencies"""
+    shifts = []
+    logprobs = MONOGRAMS.logprobs
+    for column in range(period):
+        counts = collections.Counter(codes[column::period])
+        shifts.append(
+            max(
+                range(26),
+                key=lambda shift: sum(
+                    count * logprobs[(c - shift) % 26] for c, count in counts.items()
+                ),
+            )
+        )
+    return shifts
+
+
+def crack_vigenere(text, model=MONOGRAMS, max_period=20, top=3, rounds=3):
+    """[(score per letter, key, period IoC, plaintext)] for the most likely
+    keys, best first"""
+    codes = encode(text)
+    if len(codes) < 2:
+        return []
+    model = _model_for(codes, model)
+    results = []
+    for period, ioc in likely_periods(codes, max_period, top):
+        shifts = _column_shifts(codes, period)
+        best = model.score(vigenere_decrypt_codes(codes, shifts))
+        if model.n > 1:
+            # Columns were solved independently, so let the n-grams that
+            # span them adjust each column in turn
+            for _ in range(rounds):
+                improved = False
+                for column in range(period):
+                    for shift in range(26):
+                        trial = shifts[:column] + [shift] + shifts[column + 1 :]
+                        score = model.score(vigenere_decrypt_codes(codes, trial))
+                        if score > best:
+                            best, shifts, improved = score, trial, True
+                if not improved:
+                    break
+        key = "".join(LOWER[shift] for shift in shifts)
+        # Refining can leave a repeated shorter key, like "lemonlemon"
+        for length in range(1, len(key)):
+            if len(key) % length == 0 and key == key[:length] * (len(key) // length):
+                key = key[:length]
+                break
+        if key not in [k for _, k, _, _ in results]:
+            results.append((best / len(codes), key, ioc, vigenere_decrypt(text, key)))
+    if model.n == 1:
+        # Letter frequencies can't tell a key from a longer one that overfits
+        # its columns, and short columns make long periods' IoC noisy, so
+        # go by IoC, preferring shorter periods that are nearly as good
+        best_ioc = max(ioc for _, _, ioc, _ in results)
+        return sorted(
+            results,
+            key=lambda result: (
+                result[2] - RANDOM_IOC < 0.9 * (best_ioc - RANDOM_IOC),
+                len(result[1]),
+            ),
+        )
+    return sorted(results, key=lambda result: -result[0])
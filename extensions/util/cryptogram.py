@@ -0,0 +1,102 @@
+"""Solving simple substitution ciphers by hill climbing on n-gram scores.
+
+A key is a bytes.translate table sending each ciphertext letter (0-25) to a
+plaintext letter. From a starting key we try swapping pairs of its letters,
+keeping any swap that makes the decryption more English-like, until a
+thousand swaps in a row fail. Then we restart, usually from the best key so
+far with a few letters shuffled, but sometimes from a random key, until time
+runs out. The best key across restarts wins.
+
+Hill climbing is pure CPU, so it runs in worker processes: call init() in
+each worker (as a ProcessPoolExecutor initializer) with the model's
+log probabilities, then solve() there, several at once for more restarts.
+"""
+
+import array
+import collections
+import random
+import time
+
+# The usual order of letter frequencies in English, for a first guess
+ENGLISH_ORDER = b"etaoinshrdlcumwfgypbvkjxqz"
+STALL = 1000
+# Every this many restarts, start over from a random key
+RANDOM_RESTART = 4
+
+# Set up by init() in each worker process
+_logprobs = None
+_n = None
+
+
+def init(logprobs, n):
+    global _logprobs, _n
+    _logprobs = array.array("d")
+    _logprobs.frombytes(logprobs)
+    _n = n
+
+
+def _score(plain):
+    logprobs = _logprobs
+    top = 26 ** (_n - 1)
+    total = 0.0
+    index = 0
+    for i, c in enumerate(plain):
+        index = index % top * 26 + c
+        if i >= _n - 1:
+            total += logprobs[index]
+    return total
+
+
+def _decrypt(codes, key):
+    return codes.translate(bytes(key) + bytes(230))
+
+
+def frequency_key(codes):
+    """Maps the commonest ciphertext letters to the commonest in English"""
+    counts = collections.Counter(codes)
+    order = sorted(range(26), key=lambda c: -counts[c])
+    key = bytearray(26)
+    for c, plain in zip(order, ENGLISH_ORDER):
+        key[c] = plain - ord("a")
+    return key
+
+
+def solve(codes, budget=3.0, seed=None):
+    """(score, key) for the best key found within `budget` seconds, for
+    integer-encoded ciphertext `codes`"""
+    deadline = time.perf_counter() + budget
+    rng = random.Random(seed)
+    present = sorted(set(codes))
+    # Swapping two letters that aren't in the text changes nothing
+    swaps = [(i, j) for i in present for j in range(26) if j not in present or j > i]
+    best_key = frequency_key(codes)
+    best = _score(_decrypt(codes, best_key))
+    key = bytearray(best_key)
+    restarts = 0
+    while time.perf_counter() < deadline:
+        score = _score(_decrypt(codes, key))
+        stalled = 0
+        while stalled < STALL:
+            i, j = rng.choice(swaps)
+            key[i], key[j] = key[j], key[i]
+            trial = _score(_decrypt(codes, key))
+            if trial > score:
+                score = trial
+                stalled = 0
+            else:
+                key[i], key[j] = key[j], key[i]
+                stalled += 1
+            if stalled % 256 == 0 and time.perf_counter() > deadline:
+                break
+        if score > best:
+            best, best_key = score, bytearray(key)
+        restarts += 1
+        if restarts % RANDOM_RESTART == 0:
+            key = bytearray(range(26))
+            rng.shuffle(key)
+            continue
+        key = bytearray(best_key)
+        for _ in range(rng.randint(2, 6)):
+            i, j = rng.choice(swaps)
+            key[i], key[j] = key[j], key[i]
+    return best, bytes(best_key)
@@ -0,0 +1,92 @@
+"""Solve rate forecasting from puzzle solve times"""
+
+import bisect
+import math
+
+# Two-sided 90% confidence
+Z = 1.645
+
+
+class SolveForecast:
+    """Solve times (in seconds), kept sorted overall and per round.
+
+    Adding a solve is one insort, and any windowed rate is two bisects, so
+    queries stay cheap no matter how many solves we've seen.
+    """
+
+    def __init__(self, window_hours=3.0, start=None):
+        self.window = window_hours * 3600
+        self.start = start
+        self.times = []
+        self.round_times = {}
+        self.solves = {}
+
+    def add(self, name, solve_time, round_name):
+        if name in self.solves:
+            self.remove(name)
+        self.solves[name] = (solve_time, round_name)
+        bisect.insort(self.times, solve_time)
+        bisect.insort(self.round_times.setdefault(round_name, []), solve_time)
+
+    def load(self, solves):
+        """Bulk add (name, solve time, round name) tuples, sorting just once"""
+        for name, solve_time, round_name in solves:
+            self.solves[name] = (solve_time, round_name)
+        self.times = []
+        self.round_times = {}
+        for solve_time, round_name in self.solves.values():
+            self.times.append(solve_time)
+            self.round_times.setdefault(round_name, []).append(solve_time)
+        self.times.sort()
+        for times in self.round_times.values():
+            times.sort()
+
+    def remove(self, name):
+        solve_time, round_name = self.solves.pop(name)
+        for times in [self.times, self.round_times[round_name]]:
+            del times[bisect.bisect_left(times, solve_time)]
+
+    def _window(self, now):
+        window = self.window
+        if self.start is not None:
+            window = min(window, now - self.start)
+        return max(window, 60.0)
+
+    def recent(self, now, round_name=None):
+        """Number of solves in the window ending at `now`"""
+        times = self.times if round_name is None else self.round_times.get(round_name)
+        if not times:
+            return 0
+        begin = bisect.bisect_left(times, now - self._window(now))
+        return bisect.bisect_right(times, now) - begin
+
+    def rate(self, now, round_name=None):
+        """Solves per hour over the window"""
+        return 3600 * self.recent(now, round_name) / self._window(now)
+
+    def project(self, remaining, now, round_name=None):
+        """Hours until `remaining` more solves, if we keep up the recent pace.
+
+        Solves are treated as a Poisson process, and the band comes from the
+        score interval on its rate. Estimates are None when there's no pace
+        to extrapolate from.
+        """
+        count = self.recent(now, round_name)
+        hours = self._window(now) / 3600
+        spread = Z * math.sqrt(count + Z * Z / 4)
+        rate = count / hours
+        rate_low = max(0.0, count + Z * Z / 2 - spread) / hours
+        rate_high = (count + Z * Z / 2 + spread) / hours
+
+        def eta(rate):
+            if not remaining:
+                return 0.0
+            return remaining / rate if rate > 0 else None
+
+        return {
+            "solves_per_hour": rate,
+            "remaining": remaining,
+            "hours_to_finish": eta(rate),
+            "hours_to_finish_low": eta(rate_high),
+            "hours_to_finish_high": eta(rate_low),
+        }
@@ -0,0 +1,114 @@
+"""Hint request/response tracking from the Hunt website's activity log"""
+
+import datetime
+import json
+import statistics
+
+REQUESTED = "hint_requested"
+RESPONDED = "hint_responded"
+
+
+def title_key(title):
+    """Lowercase letters and digits of a puzzle title, for matching the
+    Hunt website's titles to ours ("Puzzle 1" and "Puzzle 2" stay apart)"""
+    return "".join(c for c in title.lower() if c.isalnum())
+
+
+def _log_time(log, default):
+    """POSIX time of an activity log entry, or `default` if it has none we
+    can read"""
+    value = log.get("timestamp", None) or log.get("time", None)
+    if isinstance(value, (int, float)):
+        # Some sites use milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(
+                value.replace("Z", "+00:00")
+            ).timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+class PuzzleHints:
+    __slots__ = ("title", "requested_at", "responded_at", "latencies")
+
+    def __init__(self, title):
+        self.title = title
+        # Time of the oldest request still waiting on a response
+        self.requested_at = None
+        self.responded_at = None
+        self.latencies = []
+
+    @property
+    def pending(self):
+        return self.requested_at is not None
+
+    def stats(self):
+        if not self.latencies:
+            return None
+        return {
+            "responses": len(self.latencies),
+            "mean": statistics.fmean(self.latencies),
+            "median": statistics.median(self.latencies),
+            "max": max(self.latencies),
+        }
+
+
+class HintTracker:
+    """Hint state per puzzle, built up from successive activity log scrapes.
+
+    Each scrape is the whole log, so entries we've already seen are skipped,
+    and update() returns just the new ones. Entries without a timestamp get
+    the time we first saw them, which is as good as our polling interval.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.puzzles = {}
+
+    def update(self, logs, now):
+        """Returns new (event type, PuzzleHints) pairs, oldest first"""
+        events = []
+        for log in logs:
+            kind = log.get("type", None)
+            if kind not in [REQUESTED, RESPONDED]:
+                continue
+            key = json.dumps(log, sort_keys=True)
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            events.append((_log_time(log, now), kind, log.get("resource_title", "?")))
+
+        changes = []
+        for timestamp, kind, title in sorted(events, key=lambda event: event[0]):
+            puzzle = self.puzzles.setdefault(title, PuzzleHints(title))
+            if kind == REQUESTED:
+                if puzzle.requested_at is None:
+                    puzzle.requested_at = timestamp
+            else:
+                if puzzle.requested_at is not None:
+                    puzzle.latencies.append(max(0.0, timestamp - puzzle.requested_at))
+                puzzle.requested_at = None
+                puzzle.responded_at = timestamp
+            changes.append((kind, puzzle))
+        return changes
+
+    def pending(self):
+        return sorted(
+            (puzzle for puzzle in self.puzzles.values() if puzzle.pending),
+            key=lambda puzzle: puzzle.requested_at,
+        )
+
+    def answered(self):
+        """Puzzles with at least one response, most recent first"""
+        return sorted(
+            (puzzle for puzzle in self.puzzles.values() if puzzle.responded_at),
+            key=lambda puzzle: -puzzle.responded_at,
+        )
+
+    def all_latencies(self):
+        return [
+            latency for puzzle in self.puzzles.values() for latency in puzzle.latencies
+        ]
@@ -0,0 +1,107 @@
+"""Conditional fetches of Hunt website pages, and reading the data in them"""
+
+import aiohttp
+import hashlib
+import json
+import time
+
+
+class FetchError(Exception):
+    def __init__(self, status):
+        super().__init__(f"Scrape error code {status}")
+        self.status = status
+
+
+class Page:
+    __slots__ = ("text", "digest", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, text, etag=None, last_modified=None):
+        self.text = text
+        self.digest = hashlib.sha256(text.encode()).hexdigest()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+
+
+class HuntSite:
+    """Fetches Hunt website pages over one shared session.
+
+    We remember each page's ETag and Last-Modified, and send them back so an
+    unchanged page costs a 304 rather than the whole body. Servers that
+    ignore those still get caught by comparing a hash of the body, so either
+    way fetch() can tell callers whether there's anything new to parse.
+
+    The cookie and team name go with each fetch, rather than the session,
+    so changes to them in the hunt config take effect straight away.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.pages = {}
+
+    async def fetch(self, url, cookie="", team_name="Unknown"):
+        """Returns (page, changed since our last fetch)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(headers={"accept": "text/html"})
+        page = self.pages.get(url, None)
+        headers = {
+            "cookie": cookie,
+            "user-agent": "Puzzleboss v0.1 HuntTeam:" + team_name,
+        }
+        if page and page.etag:
+            headers["if-none-match"] = page.etag
+        if page and page.last_modified:
+            headers["if-modified-since"] = page.last_modified
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and page:
+                page.fetched_at = time.time()
+                return page, False
+            if response.status != 200:
+                raise FetchError(response.status)
+            new_page = Page(
+                await response.text(),
+                etag=response.headers.get("etag", None),
+                last_modified=response.headers.get("last-modified", None),
+            )
+        self.pages[url] = new_page
+        return new_page, not page or page.digest != new_page.digest
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+_decoder = json.JSONDecoder()
+
+
+def extract_globals(text, names):
+    """Finds `window.<name> = <JSON>` assignments in a page, for each of
+    `names`, in a single scan. Each value is decoded straight from its
+    offset with raw_decode, so nested objects and arrays come through whole.
+    Missing names are left out; undecodable values raise JSONDecodeError.
+    """
+    wanted = set(names)
+    found = {}
+    pos = text.find("window.")
+    while pos >= 0 and wanted:
+        start = pos + len("window.")
+        end = start
+        while end < len(text) and (text[end].isalnum() or text[end] in "_$"):
+            end += 1
+        name = text[start:end]
+        value_start = end
+        while value_start < len(text) and text[value_start] in " \t":
+            value_start += 1
+        is_assignment = text.startswith("=", value_start) and not text.startswith(
+            "==", value_start
+        )
+        if name in wanted and is_assignment:
+            value_start += 1
+            while value_start < len(text) and text[value_start] in " \t\r\n":
+                value_start += 1
+            found[name], value_end = _decoder.raw_decode(text, value_start)
+            wanted.discard(name)
+            pos = text.find("window.", value_end)
+            continue
+        pos = text.find("window.", end)
+    return found
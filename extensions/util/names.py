@@ -0,0 +1,110 @@
+"""Fuzzy matching of people's names, for spotting duplicate accounts"""
+
+import difflib
+import unicodedata
+
+# Letters from other scripts that render (near enough) like Latin ones.
+# NFKC already takes care of fullwidth, script and math-styled variants.
+# fmt: off
+CONFUSABLES = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "і": "i", "ї": "i", "ј": "j",
+    "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c", "т": "t",
+    "у": "y", "х": "x", "ѕ": "s", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "α": "a", "β": "b", "γ": "y", "ε": "e", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ω": "w",
+    "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ß": "ss",
+    "æ": "ae", "œ": "oe", "þ": "th",
+})
+# fmt: on
+
+
+def normalize(name):
+    """Reduces a name to the lowercase ASCII letters it looks like, so
+    `Ａlice_2`, `alice.` and `аlice` (Cyrillic а) all become `alice`"""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKC", name).casefold().translate(CONFUSABLES)
+    return "".join(
+        c
+        for c in unicodedata.normalize("NFKD", name)
+        if "a" <= c <= "z" and not unicodedata.combining(c)
+    )
+
+
+def _blocks(key, size=3):
+    """Cheap keys that two similar names very likely share at least one of"""
+    if len(key) <= size:
+        return [key]
+    return [key[:size], key[-size:]]
+
+
+def find_duplicates(
+    usernames, aliases=None, threshold=0.85, min_length=3, max_block=50
+):
+    """Pairs of ids whose names look like they belong to the same person.
+
+    `usernames` maps each id to its username, and `aliases` to any other
+    names (like global names). Lots of people go by "Alex", so aliases only
+    count when they're exactly (after normalizing) another account's
+    username, which suggests the same owner.
+
+    Usernames that normalize to the same key are duplicates outright.
+    Beyond that, usernames sharing a prefix or suffix block are compared
+    with difflib, so we only ever score pairs that have a chance of
+    matching. Blocks bigger than `max_block` are too generic to mean
+    anything and get skipped. Only direct matches count: chains of fuzzy
+    matches soon link up different people.
+
+    Returns (id, id, similarity) tuples, most similar first.
+    """
+    by_username = {}
+    by_alias = {}
+    for i, name in usernames.items():
+        key = normalize(name)
+        if len(key) >= min_length:
+            by_username.setdefault(key, set()).add(i)
+    for i, names in (aliases or {}).items():
+        for name in names:
+            key = normalize(name)
+            if len(key) >= min_length:
+                by_alias.setdefault(key, set()).add(i)
+
+    pairs = {}
+
+    def match(ids_a, ids_b, similarity):
+        for i in ids_a:
+            for j in ids_b:
+                if i != j:
+                    pair = (i, j) if i < j else (j, i)
+                    pairs[pair] = max(pairs.get(pair, 0.0), similarity)
+
+    for key, ids in by_username.items():
+        match(ids, ids | by_alias.get(key, set()), 1.0)
+
+    blocks = {}
+    for key in by_username:
+        for block in _blocks(key):
+            blocks.setdefault(block, []).append(key)
+    compared = set()
+    for keys in blocks.values():
+        if len(keys) < 2 or len(keys) > max_block:
+            continue
+        for n, a in enumerate(keys):
+            matcher = difflib.SequenceMatcher(None, b=a)
+            for b in keys[n + 1 :]:
+                pair = (a, b) if a < b else (b, a)
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                matcher.set_seq1(b)
+                if (
+                    matcher.real_quick_ratio() >= threshold
+                    and matcher.quick_ratio() >= threshold
+                    and matcher.ratio() >= threshold
+                ):
+                    match(by_username[a], by_username[b], matcher.ratio())
+
+    return sorted(
+        ((i, j, similarity) for (i, j), similarity in pairs.items()),
+        key=lambda pair: -pair[2],
+    )
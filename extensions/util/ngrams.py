@@ -0,0 +1,110 @@
+"""English letter n-gram statistics, for scoring candidate decryptions.
+
+Text is scored as integer-encoded letters (a=0 ... z=25, everything else
+dropped), with log probabilities kept in one flat array indexed by the
+n-gram read as a base-26 number, so scoring is a single pass of integer
+arithmetic and array lookups.
+"""
+
+import array
+import collections
+import itertools
+import math
+import string
+
+ALPHABET = string.ascii_lowercase
+
+# Letter frequencies in English text, in percent
+ENGLISH_FREQUENCIES = dict(
+    zip(
+        ALPHABET,
+        map(
+            float,
+            """
+            8.167 1.492 2.782 4.253 12.702 2.228 2.015 6.094 6.966 0.153 0.772
+            4.025 2.406 6.749 7.507 1.929 0.095 5.987 6.327 9.056 2.758 0.978
+            2.360 0.150 1.974 0.074
+            """.split(),
+        ),
+    )
+)
+
+_ENCODE = bytes.maketrans((ALPHABET + ALPHABET.upper()).encode(), bytes(range(26)) * 2)
+_NON_LETTERS = bytes(c for c in range(256) if chr(c) not in ALPHABET + ALPHABET.upper())
+
+
+def encode(text):
+    """The letters of `text` as bytes from 0 to 25"""
+    return text.encode("ascii", "ignore").translate(_ENCODE, _NON_LETTERS)
+
+
+def decode(codes):
+    return bytes(c + 97 for c in codes).decode()
+
+
+class NgramModel:
+    """Log10 probabilities of every letter n-gram, with a floor for those
+    we've never seen"""
+
+    def __init__(self, counts, n):
+        self.n = n
+        total = sum(counts.values())
+        self.floor = math.log10(min(counts.values()) / 100 / total)
+        self.logprobs = array.array("d", [self.floor]) * 26**n
+        for ngram, count in counts.items():
+            self.logprobs[self.index(ngram)] = math.log10(count / total)
+
+    @staticmethod
+    def index(ngram):
+        index = 0
+        for c in encode(ngram):
+            index = index * 26 + c
+        return index
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads `NGRAM count` lines (space or tab separated), like the
+        widely shared english_quadgrams.txt"""
+        counts = collections.Counter()
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                ngram, _, count = line.strip().replace("\t", " ").partition(" ")
+                ngram = ngram.lower()
+                if ngram and set(ngram) <= set(ALPHABET):
+                    counts[ngram] += int(count or 1)
+        lengths = {len(ngram) for ngram in counts}
+        if len(lengths) != 1:
+            raise ValueError(f"{path} should have n-grams of exactly one length")
+        return cls(counts, lengths.pop())
+
+    @classmethod
+    def from_words(cls, words, n=4, limit=100000):
+        """A rough model from a frequency-ranked wordlist, for when we don't
+        have real n-gram counts: each word counts in proportion to 1/rank,
+        roughly how often it appears in text (Zipf's law). N-grams spanning
+        two words are missing, but it's plenty for hill climbing."""
+        counts = collections.Counter()
+        for rank, word in enumerate(itertools.islice(words, limit)):
+            weight = 1 / (rank + 1)
+            for i in range(len(word) - n + 1):
+                counts[word[i : i + n]] += weight
+        if not counts:
+            raise ValueError(f"No words long enough for {n}-grams")
+        return cls(counts, n)
+
+    def score(self, codes):
+        """Log10 likelihood of integer-encoded text"""
+        logprobs = self.logprobs
+        if self.n == 1:
+            return sum(logprobs[c] for c in codes)
+        top = 26 ** (self.n - 1)
+        total = 0.0
+        index = 0
+        for i, c in enumerate(codes):
+            index = index % top * 26 + c
+            if i >= self.n - 1:
+                total += logprobs[index]
+        return total
+
+
+MONOGRAMS = NgramModel(ENGLISH_FREQUENCIES, 1)
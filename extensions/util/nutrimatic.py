@@ -0,0 +1,375 @@
+"""Local nutrimatic-style pattern search over a frequency-ranked phrase list.
+
+Supports a useful subset of https://nutrimatic.org syntax:
+
+    a-z 0-9     literal letters and digits
+    (space)     a word break
+    -           an optional word break
+    A C V       any letter, consonant, or vowel (aeiou)
+    _ # .       any letter or digit, any digit, any character at all
+    [abc] [^a-e]    character classes
+    (...) | ...     grouping and alternation
+    * + ? {n} {m,n} repetition
+    <...>       anagram of the single characters / classes inside
+    "..."       no implicit word breaks inside
+
+Outside quotes, word breaks may fall anywhere, like on nutrimatic.org.
+
+Patterns compile to an NFA, which we run over the phrase list as if it were a
+trie: the list is sorted, so every prefix is a contiguous range, and each
+child range is found with a bisect. Subtrees are skipped as soon as no NFA
+state survives, and NFA steps are memoized into a DFA as we go. A phrase
+list built into a store (see extensions.util.wordstore) is walked through
+its DAWG instead, which also skips suffixes we've already ruled out.
+"""
+
+import bisect
+import string
+import time
+
+from extensions.util.words import read_ranked
+
+LETTERS = frozenset(string.ascii_lowercase)
+DIGITS = frozenset(string.digits)
+VOWELS = frozenset("aeiou")
+SPACE = frozenset(" ")
+CLASSES = {
+    "A": LETTERS,
+    "C": LETTERS - VOWELS,
+    "V": VOWELS,
+    "_": LETTERS | DIGITS,
+    "#": DIGITS,
+    ".": LETTERS | DIGITS | SPACE,
+}
+
+
+class PatternError(ValueError):
+    pass
+
+
+def normalize(text):
+    """Lowercase letters, digits and single spaces, like nutrimatic's corpus"""
+    text = "".join(c if c.isalnum() else " " for c in text.lower())
+    return " ".join(word for word in text.split() if word.isascii())
+
+
+class _Parser:
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+        self.quoted = False
+
+    def error(self, message):
+        raise PatternError(f"{message} at position {self.pos + 1}")
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self):
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def parse(self):
+        ast = self.alternation()
+        if self.peek() is not None:
+            self.error(f"Unexpected {self.peek()!r}")
+        return ast
+
+    def alternation(self):
+        options = [self.sequence()]
+        while self.peek() == "|":
+            self.take()
+            options.append(self.sequence())
+        return options[0] if len(options) == 1 else ("alt", options)
+
+    def sequence(self):
+        items = []
+        while self.peek() not in [None, "|", ")"]:
+            if self.quoted and self.peek() == '"':
+                break
+            items.append(self.repeat())
+        return ("seq", items)
+
+    def repeat(self):
+        ast = self.atom()
+        while self.peek() in ["*", "+", "?", "{"]:
+            c = self.take()
+            if c == "*":
+                ast = ("rep", ast, 0, None)
+            elif c == "+":
+                ast = ("rep", ast, 1, None)
+            elif c == "?":
+                ast = ("rep", ast, 0, 1)
+            else:
+                end = self.pattern.find("}", self.pos)
+                if end < 0:
+                    self.error("Unclosed {")
+                bounds = self.pattern[self.pos : end].split(",")
+                self.pos = end + 1
+                try:
+                    low = int(bounds[0] or 0)
+                    high = int(bounds[-1]) if bounds[-1] else None
+                except ValueError:
+                    self.error("Bad {m,n}")
+                if len(bounds) > 2 or (high is not None and high < low):
+                    self.error("Bad {m,n}")
+                if max(low, high or 0) > 50:
+                    self.error("Too many repeats")
+                ast = ("rep", ast, low, high)
+        return ast
+
+    def atom(self):
+        c = self.take()
+        if c == "(":
+            ast = self.alternation()
+            if self.take() != ")":
+                self.error("Unclosed (")
+            return ast
+        if c == '"' and not self.quoted:
+            self.quoted = True
+            ast = self.alternation()
+            if self.take() != '"':
+                self.error('Unclosed "')
+            self.quoted = False
+            return ("quote", ast)
+        if c == "<":
+            atoms = []
+            while self.peek() not in [None, ">"]:
+                atom = self.atom()
+                if atom[0] != "chars":
+                    self.error("Only single characters can go in an anagram")
+                atoms.append(atom[1])
+            if self.take() != ">":
+                self.error("Unclosed <")
+            if len(atoms) > 20:
+                self.error("Anagram is too long")
+            return ("anagram", tuple(atoms))
+        if c == "[":
+            return ("chars", self.char_class())
+        if c == "-":
+            return ("rep", ("chars", SPACE), 0, 1)
+        if c in CLASSES:
+            return ("chars", CLASSES[c])
+        if c is not None and (c in LETTERS or c in DIGITS or c == " "):
+            return ("chars", frozenset(c))
+        self.pos -= 1
+        self.error(f"Unsupported {c!r}" if c else "Unexpected end")
+
+    def char_class(self):
+        negate = self.peek() == "^"
+        if negate:
+            self.take()
+        chars = set()
+        while self.peek() not in [None, "]"]:
+            c = self.take()
+            if self.peek() == "-" and self.pattern[self.pos + 1 : self.pos + 2] not in [
+                "",
+                "]",
+            ]:
+                self.take()
+                end = self.take()
+                chars.update(chr(i) for i in range(ord(c), ord(end) + 1))
+            elif c in CLASSES:
+                chars.update(CLASSES[c])
+            else:
+                chars.add(c.lower())
+        if self.take() != "]":
+            self.error("Unclosed [")
+        chars &= CLASSES["."]
+        return frozenset(CLASSES["."] - chars if negate else chars)
+
+
+# NFA node kinds
+CHAR, SPLIT, ANAGRAM, MATCH = range(4)
+
+
+class _Node:
+    __slots__ = ("kind", "chars", "atoms", "out", "out2", "quoted")
+
+    def __init__(self, kind, out=None, out2=None, chars=None, atoms=None):
+        self.kind = kind
+        self.out = out
+        self.out2 = out2
+        self.chars = chars
+        self.atoms = atoms
+        self.quoted = False
+
+
+def _build(ast, next_node, quoted=False):
+    """Thompson construction, back to front, so every node's successor
+    already exists when we make it"""
+    kind = ast[0]
+    if kind == "chars":
+        node = _Node(CHAR, out=next_node, chars=ast[1])
+        node.quoted = quoted
+        return node
+    if kind == "seq":
+        for item in reversed(ast[1]):
+            next_node = _build(item, next_node, quoted)
+        return next_node
+    if kind == "alt":
+        starts = [_build(option, next_node, quoted) for option in ast[1]]
+        node = starts[-1]
+        for start in reversed(starts[:-1]):
+            node = _Node(SPLIT, out=start, out2=node)
+        return node
+    if kind == "quote":
+        return _build(ast[1], next_node, True)
+    if kind == "anagram":
+        node = _Node(ANAGRAM, out=next_node, atoms=ast[1])
+        node.quoted = quoted
+        return node
+    if kind == "rep":
+        _, child, low, high = ast
+        if high is None:
+            loop = _Node(SPLIT, out2=next_node)
+            loop.out = _build(child, loop, quoted)
+            next_node = loop
+        else:
+            for _ in range(high - low):
+                next_node = _Node(
+                    SPLIT, out=_build(child, next_node, quoted), out2=next_node
+                )
+        for _ in range(low):
+            next_node = _build(child, next_node, quoted)
+        return next_node
+    raise PatternError(f"Unknown {kind}")
+
+
+class Pattern:
+    """A compiled pattern. States are (node, mask) pairs, where the mask says
+    which atoms an anagram still has to place. Steps between sets of states
+    are memoized per character, so repeated steps are dict hits."""
+
+    def __init__(self, pattern):
+        self.match = _Node(MATCH)
+        self.start = self._closure({(_build(_Parser(pattern).parse(), self.match), 0)})
+        self.transitions = {}
+
+    def _closure(self, states):
+        stack = list(states)
+        closed = set()
+        while stack:
+            state = stack.pop()
+            if state in closed:
+                continue
+            node, mask = state
+            if node.kind == SPLIT:
+                stack += [(node.out, 0), (node.out2, 0)]
+                continue
+            if node.kind == ANAGRAM and mask == 0:
+                # Entering an anagram, with every atom still to place
+                if not node.atoms:
+                    stack.append((node.out, 0))
+                    continue
+                state = (node, (1 << len(node.atoms)) - 1)
+            closed.add(state)
+        return frozenset(closed)
+
+    def _step(self, states, c):
+        next_states = set()
+        for node, mask in states:
+            if node.kind == CHAR:
+                if c in node.chars:
+                    next_states.add((node.out, 0))
+                elif c == " " and not node.quoted:
+                    next_states.add((node, mask))
+            elif node.kind == ANAGRAM:
+                used = set()
+                for i, atom in enumerate(node.atoms):
+                    if mask >> i & 1 and atom not in used and c in atom:
+                        used.add(atom)
+                        remaining = mask & ~(1 << i)
+                        if remaining:
+                            next_states.add((node, remaining))
+                        else:
+                            next_states.add((node.out, 0))
+                if c == " " and not node.quoted and mask != (1 << len(node.atoms)) - 1:
+                    next_states.add((node, mask))
+        return self._closure(next_states)
+
+    def step(self, states, c):
+        transitions = self.transitions.get(states)
+        if transitions is None:
+            transitions = self.transitions[states] = {}
+        next_states = transitions.get(c)
+        if next_states is None:
+            next_states = transitions[c] = self._step(states, c)
+        return next_states
+
+    def accepts(self, states):
+        return any(node is self.match for node, _ in states)
+
+
+class PhraseIndex:
+    """Phrases sorted alphabetically, with their frequency ranks (0 is the
+    most common) alongside. `phrases` only needs __len__ and __getitem__,
+    so it can be a list or anything that looks like one, like a WordStore's
+    phrases, in which case we search the store's DAWG."""
+
+    def __init__(self, phrases, ranks, store=None):
+        self.phrases = phrases
+        self.ranks = ranks
+        self.store = store
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads a phrase list, one per line, most common first. Lines can
+        also be `phrase<TAB>count`, in which case counts decide the order.
+        Stores built with `extensions.util.wordstore --phrases` are opened
+        in place instead."""
+        from extensions.util.wordstore import WordStore, is_store
+
+        if is_store(path):
+            store = WordStore(path)
+            return cls(store.phrases, store.alpha_ranks, store)
+        by_rank = read_ranked(path, normalize)
+        phrases = sorted(by_rank)
+        rank_of = {phrase: rank for rank, phrase in enumerate(by_rank)}
+        return cls(phrases, [rank_of[phrase] for phrase in phrases])
+
+    def search(self, pattern, limit=10, budget=2.0, max_matches=5000):
+        """The `limit` most common phrases matching a pattern string, and
+        whether the search was cut short by `budget` seconds or
+        `max_matches`"""
+        compiled = Pattern(pattern)
+        phrases = self.phrases
+        if not phrases:
+            return [], False
+        if self.store is not None:
+            matches, truncated = self.store.walk(
+                compiled.start, compiled.step, compiled.accepts, budget, max_matches
+            )
+            matches.sort(key=lambda i: self.ranks[i])
+            return [phrases[i] for i in matches[:limit]], truncated
+        deadline = time.perf_counter() + budget
+        matches = []
+        truncated = False
+        # (prefix, lo, hi, states): the range of phrases starting with prefix
+        stack = [("", 0, len(phrases), compiled.start)]
+        visited = 0
+        while stack:
+            prefix, lo, hi, states = stack.pop()
+            visited += 1
+            if visited % 1024 == 0 and time.perf_counter() > deadline:
+                truncated = True
+                break
+            depth = len(prefix)
+            if len(phrases[lo]) == depth:
+                if compiled.accepts(states):
+                    matches.append(lo)
+                    if len(matches) >= max_matches:
+                        truncated = True
+                        break
+                lo += 1
+            while lo < hi:
+                c = phrases[lo][depth]
+                child = prefix + c
+                end = bisect.bisect_left(phrases, prefix + chr(ord(c) + 1), lo, hi)
+                child_states = compiled.step(states, c)
+                if child_states:
+                    stack.append((child, lo, end, child_states))
+                lo = end
+        matches.sort(key=lambda i: self.ranks[i])
+        return [phrases[i] for i in matches[:limit]], truncated
@@ -0,0 +1,403 @@
+"""Local Qat-style word search (see https://www.quinapalus.com/qat.html).
+
+Supports a subset of Qat's syntax:
+
+    a-z         literal letters
+    .  @  #     any letter, any vowel (aeiou), any consonant
+    *           any run of letters, including none
+    [abc] [^a-e]    letter sets
+    A-Z         variables: each stands for the same run of 1+ letters
+                wherever it appears, across every pattern
+    /abc..*     anagram of the letters (and wildcards) that follow
+    5:...  5-7:...  length limits on a pattern
+    ;           separates simultaneous constraints: extra patterns (each
+                matching its own word), `|A|=3` / `|A|>2` / `|A|<5` /
+                `|A|=2-4` variable lengths, and `!=ABC` distinct variables
+
+Each pattern is narrowed down by length and the letters it must contain,
+using the WordIndex, before the survivors are checked against a compiled
+regex (variables become named groups and backreferences). Multi-pattern
+queries are then joined on their shared variables, a few thousand of the
+commonest words at a time, until there are enough results.
+"""
+
+import bisect
+import re
+import time
+
+from extensions.util.words import ALPHABET, letter_counts, letter_mask
+
+VOWELS = "aeiou"
+CONSONANTS = "".join(c for c in ALPHABET if c not in VOWELS)
+LENGTH_PREFIX = re.compile(r"(\d+)(?:-(\d*))?:")
+LENGTH_CONDITION = re.compile(r"\|([A-Z])\|(=|<|>)(\d+)(?:-(\d+))?$")
+DISTINCT = re.compile(r"!=([A-Z]{2,})$")
+
+
+class QatError(ValueError):
+    pass
+
+
+class TooBroadError(QatError):
+    """A query we understand, but which would take far too long"""
+
+
+def _letter_set(query, pos):
+    """Parses a [...] set starting at query[pos], returning (letters, end)"""
+    end = query.find("]", pos)
+    if end < 0:
+        raise QatError("Unclosed [")
+    body = query[pos + 1 : end]
+    negate = body.startswith("^")
+    if negate:
+        body = body[1:]
+    letters = set()
+    i = 0
+    while i < len(body):
+        if i + 2 < len(body) and body[i + 1] == "-":
+            letters.update(chr(c) for c in range(ord(body[i]), ord(body[i + 2]) + 1))
+            i += 3
+        else:
+            letters.add(body[i])
+            i += 1
+    if not letters <= set(ALPHABET):
+        raise QatError(f"Bad letter set [{query[pos + 1 : end]}]")
+    if negate:
+        letters = set(ALPHABET) - letters
+    return "".join(sorted(letters)), end + 1
+
+
+WILDCARDS = {".": ALPHABET, "@": VOWELS, "#": CONSONANTS}
+
+
+class _Pattern:
+    """One pattern, matched against one word"""
+
+    def __init__(self, text, var_lengths):
+        self.variables = []
+        # Whether we need every way the variables could split up a word,
+        # rather than just the first the regex finds
+        self.all_bindings = False
+        self.min_length = 1
+        self.max_length = None
+        prefix = LENGTH_PREFIX.match(text)
+        if prefix:
+            self.min_length = int(prefix.group(1))
+            if prefix.group(2) is None:
+                self.max_length = self.min_length
+            elif prefix.group(2):
+                self.max_length = int(prefix.group(2))
+            text = text[prefix.end() :]
+        if not text:
+            raise QatError("Empty pattern")
+        self.anagram = None
+        if text.startswith("/"):
+            self._parse_anagram(text[1:])
+        else:
+            self._parse(text, var_lengths)
+
+    def _parse(self, text, var_lengths):
+        regex = []
+        # (letters, None) for one letter, (None, variable) for a variable,
+        # and (None, None) for *
+        self.tokens = []
+        required = 0
+        min_length = 0
+        max_length = 0
+        i = 0
+        while i < len(text):
+            c = text[i]
+            i += 1
+            if c in ALPHABET:
+                regex.append(c)
+                required |= letter_mask(c)
+                self.tokens.append((c, None))
+            elif c in WILDCARDS:
+                regex.append(f"[{WILDCARDS[c]}]")
+                self.tokens.append((WILDCARDS[c], None))
+            elif c == "[":
+                letters, i = _letter_set(text, i - 1)
+                regex.append(f"[{letters}]")
+                self.tokens.append((letters, None))
+            elif c == "*":
+                regex.append("[a-z]*")
+                self.tokens.append((None, None))
+                max_length = None
+                continue
+            elif c in ALPHABET.upper():
+                self.tokens.append((None, c))
+                low, high = var_lengths.get(c, (1, None))
+                min_length += low
+                if high is None or max_length is None:
+                    max_length = None
+                else:
+                    max_length += high
+                if c in self.variables:
+                    regex.append(f"(?P={c})")
+                    continue
+                self.variables.append(c)
+                quantifier = f"{{{low},{'' if high is None else high}}}"
+                regex.append(f"(?P<{c}>[a-z]{quantifier})")
+                continue
+            else:
+                raise QatError(f"Unsupported {c!r}")
+            # Anything else is exactly one letter
+            min_length += 1
+            if max_length is not None:
+                max_length += 1
+        self.regex = re.compile("".join(regex))
+        self.var_lengths = var_lengths
+        self.required = required
+        self.min_length = max(self.min_length, min_length)
+        if max_length is not None and (
+            self.max_length is None or max_length < self.max_length
+        ):
+            self.max_length = max_length
+
+    def _parse_anagram(self, text):
+        letters = []
+        wildcards = []
+        extra = False
+        i = 0
+        while i < len(text):
+            c = text[i]
+            i += 1
+            if c in ALPHABET:
+                letters.append(c)
+            elif c in WILDCARDS:
+                wildcards.append(WILDCARDS[c])
+            elif c == "[":
+                group, i = _letter_set(text, i - 1)
+                wildcards.append(group)
+            elif c == "*":
+                extra = True
+            else:
+                raise QatError(f"Unsupported {c!r} in an anagram")
+        self.anagram = (letter_counts("".join(letters)), wildcards, extra)
+        self.required = letter_mask("".join(letters))
+        size = len(letters) + len(wildcards)
+        self.min_length = max(self.min_length, size)
+        if not extra and (self.max_length is None or size < self.max_length):
+            self.max_length = size
+        self.exact_letters = None
+        if not wildcards and not extra:
+            self.exact_letters = "".join(letters)
+
+    def match(self, word):
+        """A list of possible variable bindings if `word` matches, else None"""
+        if self.anagram is None:
+            match = self.regex.fullmatch(word)
+            if not match:
+                return None
+            if not self.all_bindings:
+                return [match.groupdict()]
+            return list(self._bindings(word, 0, 0, {}))
+        counts, wildcards, extra = self.anagram
+        leftover = []
+        word_counts = letter_counts(word)
+        for n in range(26):
+            have = word_counts[n] - counts[n]
+            if have < 0:
+                return None
+            leftover += [ALPHABET[n]] * have
+        if not extra and len(leftover) != len(wildcards):
+            return None
+        return [{}] if _assign(leftover, wildcards, extra) else None
+
+    def _bindings(self, word, pos, token, bound):
+        """Every assignment of variables that makes `word[pos:]` match
+        `self.tokens[token:]`"""
+        if token == len(self.tokens):
+            if pos == len(word):
+                yield dict(bound)
+            return
+        letters, variable = self.tokens[token]
+        if letters is not None:
+            if pos < len(word) and word[pos] in letters:
+                yield from self._bindings(word, pos + 1, token + 1, bound)
+        elif variable is None:
+            for end in range(pos, len(word) + 1):
+                yield from self._bindings(word, end, token + 1, bound)
+        elif variable in bound:
+            value = bound[variable]
+            if word.startswith(value, pos):
+                yield from self._bindings(word, pos + len(value), token + 1, bound)
+        else:
+            low, high = self.var_lengths.get(variable, (1, None))
+            longest = len(word) - pos if high is None else min(high, len(word) - pos)
+            for length in range(low, longest + 1):
+                bound[variable] = word[pos : pos + length]
+                yield from self._bindings(word, pos + length, token + 1, bound)
+            bound.pop(variable, None)
+
+    def search(self, index, deadline, limit=None):
+        """(word ID, bindings) for matching words, most common first. With a
+        `limit`, we stop once we've found that many words."""
+        if self.anagram is not None and self.exact_letters is not None:
+            # No wildcards, so it's one lookup by signature
+            if self.min_length > self.max_length:
+                return []
+            return [(i, {}) for i in index.anagrams(self.exact_letters)]
+        matches = []
+        candidates = index.candidates(
+            self.min_length, self.max_length, self.required, ordered=limit is not None
+        )
+        for n, i in enumerate(candidates):
+            if n % 4096 == 0 and time.perf_counter() > deadline:
+                raise TimeoutError
+            bindings = self.match(index.words[i])
+            if bindings:
+                matches += [(i, binding) for binding in bindings]
+                limit = None if limit is None else limit - 1
+                if limit == 0:
+                    break
+        return matches
+
+
+def _assign(letters, wildcards, extra):
+    """Whether each wildcard can take a different one of `letters` (with
+    `extra` allowing letters left over)"""
+    if not wildcards:
+        return extra or not letters
+    # Most constrained wildcard first
+    wildcard = min(wildcards, key=len)
+    rest = list(wildcards)
+    rest.remove(wildcard)
+    for c in set(letters):
+        if c in wildcard:
+            remaining = list(letters)
+            remaining.remove(c)
+            if _assign(remaining, rest, extra):
+                return True
+    return False
+
+
+class Query:
+    """A full query: patterns plus constraints on their variables"""
+
+    def __init__(self, query):
+        var_lengths = {}
+        distinct = []
+        pattern_texts = []
+        for part in query.replace(" ", "").split(";"):
+            if not part:
+                continue
+            condition = LENGTH_CONDITION.match(part)
+            distinct_match = DISTINCT.match(part)
+            if condition:
+                var, op, low, high = condition.groups()
+                low = int(low)
+                if op == "=":
+                    bounds = (low, int(high) if high else low)
+                elif op == "<":
+                    bounds = (1, low - 1)
+                else:
+                    bounds = (low + 1, None)
+                var_lengths[var] = bounds
+            elif distinct_match:
+                distinct.append(distinct_match.group(1))
+            else:
+                pattern_texts.append(part)
+        if not pattern_texts:
+            raise QatError("No patterns")
+        if len(pattern_texts) > 4:
+            raise QatError("Too many patterns")
+        self.patterns = [_Pattern(text, var_lengths) for text in pattern_texts]
+        if len(self.patterns) > 1 and not any(p.required for p in self.patterns):
+            # Every pattern would match most of the wordlist, and the join
+            # would be the product of those
+            raise TooBroadError("At least one of the patterns needs some letters")
+        self.distinct = distinct
+        for pattern in self.patterns:
+            pattern.all_bindings = bool(pattern.variables) and (
+                len(self.patterns) > 1 or bool(distinct)
+            )
+
+    def _is_distinct(self, bindings):
+        for variables in self.distinct:
+            values = [bindings[v] for v in variables if v in bindings]
+            if len(set(values)) != len(values):
+                return False
+        return True
+
+    def search(self, index, limit=100, budget=2.0):
+        """Up to `limit` tuples of words, one per pattern, most common
+        first, and whether we ran out of time"""
+        deadline = time.perf_counter() + budget
+        # Candidates come most common first, so a lone pattern can stop early
+        single = limit if len(self.patterns) == 1 else None
+        try:
+            matches = [
+                pattern.search(index, deadline, single) for pattern in self.patterns
+            ]
+        except TimeoutError:
+            return [], True
+        for found in matches:
+            found.sort(key=lambda match: match[0])
+        # Results rank by their rarest word, and IDs are ranks, so joining
+        # just the words below some ID gives exactly the best results of the
+        # full join. Raise that cutoff until we have enough of them.
+        most = max((found[-1][0] for found in matches if found), default=0)
+        cutoff = 1024
+        while True:
+            within = [
+                found[: bisect.bisect_left(found, (cutoff,))] for found in matches
+            ]
+            joined, truncated = self._join(within, deadline)
+            ranked = self._rank(index, joined, limit)
+            if truncated or len(ranked) >= limit or cutoff > most:
+                return ranked, truncated
+            cutoff *= 4
+
+    def _join(self, matches, deadline):
+        """Rows of (pattern number, word ID) pairs and their bindings, for
+        every combination of matches which agree on their shared
+        variables, and whether we had to stop early"""
+        remaining = list(range(len(self.patterns)))
+        partial = [((), {})]
+        while remaining and partial:
+            # Every partial result has the same variables bound
+            bound = partial[0][1]
+            # Patterns sharing variables narrow the results down, where others
+            # multiply them, so join those first, rarest first
+            n = min(
+                remaining,
+                key=lambda n: (
+                    not self._shares(n, bound),
+                    not any(
+                        self._shares(n, self.patterns[m].variables)
+                        for m in remaining
+                        if m != n
+                    ),
+                    len(matches[n]),
+                ),
+            )
+            remaining.remove(n)
+            shared = [v for v in self.patterns[n].variables if v in bound]
+            by_shared = {}
+            for i, bindings in matches[n]:
+                key = tuple(bindings[v] for v in shared)
+                by_shared.setdefault(key, []).append((i, bindings))
+            joined = []
+            for ids, bindings in partial:
+                key = tuple(bindings[v] for v in shared)
+                for i, more in by_shared.get(key, []):
+                    combined = dict(bindings, **more)
+                    if self._is_distinct(combined):
+                        joined.append((ids + ((n, i),), combined))
+                if len(joined) > 100000 or time.perf_counter() > deadline:
+                    return joined, True
+            partial = joined
+        return partial, False
+
+    def _shares(self, n, variables):
+        return any(v in variables for v in self.patterns[n].variables)
+
+    def _rank(self, index, results, limit):
+        """Distinct word tuples in pattern order, ranked by their rarest word"""
+        rows = {}
+        for ids, _ in results:
+            ids = tuple(i for _, i in sorted(ids))
+            rows[ids] = max(ids)
+        ranked = sorted(rows, key=rows.get)[:limit]
+        return [[index.words[i] for i in ids] for ids in ranked]
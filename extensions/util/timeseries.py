@@ -0,0 +1,202 @@
+"""Columnar on-disk store for metrics snapshots.
+
+Every field gets its own file of little-endian float64s, row-aligned with a
+shared `time` column (POSIX seconds), so a query only ever touches the time
+column plus the one field it asks about. Columns are appended to, and read
+back through mmap. Rows older than `raw_hours` get averaged down into
+`bucket_minutes` buckets in a second, coarser tier.
+"""
+
+import array
+import bisect
+import math
+import mmap
+import os
+import sys
+
+TIME = "time"
+SUFFIX = ".col"
+WIDTH = array.array("d").itemsize
+NAN = float("nan")
+
+
+def flatten(payload, prefix=""):
+    """{"members": {"online": 5}} -> {"members.online": 5}, numbers only"""
+    flat = {}
+    for key, val in payload.items():
+        name = f"{prefix}{key}"
+        if isinstance(val, dict):
+            flat.update(flatten(val, prefix=f"{name}."))
+        elif isinstance(val, (int, float)):
+            flat[name] = float(val)
+    return flat
+
+
+def _pack(values):
+    column = array.array("d", values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _unpack(data):
+    column = array.array("d")
+    column.frombytes(data)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+class _Tier:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _column_path(self, field):
+        return os.path.join(self.path, field + SUFFIX)
+
+    def fields(self):
+        return sorted(
+            name[: -len(SUFFIX)]
+            for name in os.listdir(self.path)
+            if name.endswith(SUFFIX) and name != TIME + SUFFIX
+        )
+
+    def num_rows(self):
+        try:
+            return os.path.getsize(self._column_path(TIME)) // WIDTH
+        except FileNotFoundError:
+            return 0
+
+    def append(self, rows):
+        """Appends rows (dicts of field -> value, each with a `time`).
+        Fields missing from a row, or new to the tier, are filled with NaN."""
+        if not rows:
+            return
+        num_rows = self.num_rows()
+        fields = set(self.fields())
+        for row in rows:
+            fields.update(field for field in row if field != TIME)
+        for field in [TIME] + sorted(fields):
+            path = self._column_path(field)
+            with open(path, "ab") as f:
+                missing = num_rows - f.tell() // WIDTH
+                if missing > 0:
+                    f.write(_pack([NAN] * missing))
+                f.write(_pack([row.get(field, NAN) for row in rows]))
+
+    def read(self, field, start=0, stop=None):
+        """Values of one column from row `start` up to `stop`"""
+        try:
+            with open(self._column_path(field), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if stop is None or stop * WIDTH > size:
+                    stop = size // WIDTH
+                if start >= stop:
+                    return array.array("d")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _unpack(mm[start * WIDTH : stop * WIDTH])
+        except FileNotFoundError:
+            return array.array("d")
+
+    def bisect_time(self, timestamp):
+        """Index of the first row at or after `timestamp`, without reading
+        the whole time column"""
+        try:
+            with open(self._column_path(TIME), "rb") as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return 0
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    times = memoryview(mm).cast("d")
+                    try:
+                        if sys.byteorder == "little":
+                            return bisect.bisect_left(times, timestamp)
+                        return bisect.bisect_left(_unpack(mm[:]), timestamp)
+                    finally:
+                        times.release()
+        except FileNotFoundError:
+            return 0
+
+    def truncate_front(self, num_rows):
+        """Drops the first `num_rows` rows from every column"""
+        for field in [TIME] + self.fields():
+            path = self._column_path(field)
+            with open(path, "rb") as f:
+                f.seek(num_rows * WIDTH)
+                rest = f.read()
+            with open(path + ".tmp", "wb") as f:
+                f.write(rest)
+            os.replace(path + ".tmp", path)
+
+
+class ColumnStore:
+    def __init__(self, path, raw_hours=24, bucket_minutes=15):
+        self.raw = _Tier(os.path.join(path, "raw"))
+        self.coarse = _Tier(os.path.join(path, f"{bucket_minutes}m"))
+        self.raw_seconds = raw_hours * 3600
+        self.bucket_seconds = bucket_minutes * 60
+
+    def fields(self):
+        return sorted(set(self.raw.fields()) | set(self.coarse.fields()))
+
+    def append(self, timestamp, values):
+        self.append_many([(timestamp, values)])
+
+    def append_many(self, rows):
+        """Appends (timestamp, values) pairs, which must be in time order"""
+        if not rows:
+            return
+        self.raw.append(
+            [dict(values, **{TIME: timestamp}) for timestamp, values in rows]
+        )
+        newest = rows[-1][0]
+        oldest = self.raw.read(TIME, 0, 1)
+        # Downsample in batches, once we're a full raw_hours past due
+        if oldest and oldest[0] < newest - 2 * self.raw_seconds:
+            self.downsample(newest)
+
+    def downsample(self, now):
+        """Averages raw rows older than raw_hours into whole buckets"""
+        cutoff = now - self.raw_seconds
+        cutoff -= cutoff % self.bucket_seconds
+        split = self.raw.bisect_time(cutoff)
+        if not split:
+            return
+        times = self.raw.read(TIME, 0, split)
+        buckets = {}
+        for field in self.raw.fields():
+            for timestamp, value in zip(times, self.raw.read(field, 0, split)):
+                if math.isnan(value):
+                    continue
+                bucket = timestamp - timestamp % self.bucket_seconds
+                sums = buckets.setdefault(bucket, {})
+                total, count = sums.get(field, (0.0, 0))
+                sums[field] = (total + value, count + 1)
+        self.coarse.append(
+            [
+                dict(
+                    {field: total / count for field, (total, count) in sums.items()},
+                    **{TIME: bucket},
+                )
+                for bucket, sums in sorted(buckets.items())
+            ]
+        )
+        self.raw.truncate_front(split)
+
+    def query(self, field, since, until=None):
+        """(timestamp, value) pairs for one field, oldest first, skipping
+        gaps. Downsampled rows fill in wherever raw rows no longer reach."""
+        points = []
+        raw_start = self.raw.read(TIME, 0, 1)
+        coarse_until = raw_start[0] if raw_start else until
+        for tier, tier_until in [(self.coarse, coarse_until), (self.raw, until)]:
+            start = tier.bisect_time(since)
+            stop = None if tier_until is None else tier.bisect_time(tier_until)
+            times = tier.read(TIME, start, stop)
+            values = tier.read(field, start, start + len(times))
+            points += [
+                (timestamp, value)
+                for timestamp, value in zip(times, values)
+                if not math.isnan(value)
+            ]
+        return points
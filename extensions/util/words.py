@@ -0,0 +1,108 @@
+"""Frequency-ranked wordlists, indexed for the solving tools"""
+
+import array
+import heapq
+import itertools
+import string
+
+ALPHABET = string.ascii_lowercase
+
+
+def read_ranked(path, normalize):
+    """Entries of a wordlist, most common first, run through `normalize`
+    (which can return "" to skip one). Lines are either one entry each,
+    already in order, or `entry<TAB>count`."""
+    best = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f):
+            entry, _, count = line.rstrip("\n").partition("\t")
+            entry = normalize(entry)
+            if not entry:
+                continue
+            try:
+                score = (-float(count), line_number)
+            except ValueError:
+                score = (0.0, line_number)
+            if entry not in best or score < best[entry]:
+                best[entry] = score
+    return sorted(best, key=best.get)
+
+
+def normalize_word(text):
+    """Just the letters, lowercased, for single-word lists"""
+    word = text.strip().lower()
+    if not word.isascii() or not word.isalpha():
+        return ""
+    return word
+
+
+def letter_mask(word):
+    """Bitmask of the letters a-z in `word`, ignoring anything else"""
+    mask = 0
+    for c in word:
+        if c in ALPHABET:
+            mask |= 1 << (ord(c) - 97)
+    return mask
+
+
+def signature(word):
+    """Sorted letters, shared by every anagram of a word"""
+    return "".join(sorted(word))
+
+
+def letter_counts(word):
+    counts = [0] * 26
+    for c in word:
+        counts[ord(c) - 97] += 1
+    return counts
+
+
+class WordIndex:
+    """Words (lowercase a-z only) in frequency order, so a word's ID is also
+    its rank. Alongside them we keep IDs by length and by anagram signature,
+    plus a bitmask of the letters in each word, so most searches can throw
+    out the bulk of the list before looking at any words."""
+
+    def __init__(self, words):
+        self.words = words
+        self.masks = array.array("L")
+        self.by_length = {}
+        self.by_signature = {}
+        for i, word in enumerate(words):
+            self.masks.append(letter_mask(word))
+            self.by_length.setdefault(len(word), []).append(i)
+            self.by_signature.setdefault(signature(word), []).append(i)
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads a wordlist, or opens it in place if it's a store built by
+        extensions.util.wordstore"""
+        from extensions.util.wordstore import WordStore, is_store
+
+        if is_store(path):
+            return WordStore(path)
+        return cls(read_ranked(path, normalize_word))
+
+    def candidates(
+        self, min_length=1, max_length=None, required=0, allowed=None, ordered=True
+    ):
+        """IDs of words in a length range containing every letter in the
+        `required` mask, and none outside the `allowed` mask, lazily. They
+        come most common first if `ordered`, otherwise length by length,
+        which is cheaper for full scans."""
+        buckets = [
+            bucket
+            for length, bucket in self.by_length.items()
+            if length >= min_length and (max_length is None or length <= max_length)
+        ]
+        ids = heapq.merge(*buckets) if ordered else itertools.chain(*buckets)
+        masks = self.masks
+        if allowed is not None:
+            forbidden = ~allowed & ((1 << len(ALPHABET)) - 1)
+            ids = (i for i in ids if not masks[i] & forbidden)
+        if not required:
+            return ids
+        return (i for i in ids if masks[i] & required == required)
+
+    def anagrams(self, word):
+        return self.by_signature.get(signature(word), [])
@@ -0,0 +1,380 @@
+"""Compact, memory-mapped wordlists.
+
+A store is one read-only file holding a frequency-ranked wordlist in a few
+flat arrays, which we mmap rather than load. Opening one is instant, its
+pages are shared between every process that has it open, and nothing is
+kept in Python objects per word: entries are only decoded when asked for.
+
+Sections (all integers are little-endian uint32):
+
+    blob      every entry's text, bucketed by length, sorted within buckets
+    buckets   (length, first entry, blob offset) per length bucket
+    ranks     entry -> frequency rank (0 is the most common)
+    byrank    rank -> entry
+    lenrank   ranks of each length bucket's words, in rank order (so each
+              bucket's slice lines up with its entries)
+    masks     rank -> bitmask of the letters a-z in it
+    sigs      ranks, sorted by anagram signature, then rank
+    alpha     alphabetical position -> entry
+    final, counts, edgeidx, labels, targets
+              a DAWG (minimal acyclic automaton) of every entry: whether
+              each node ends an entry, how many entries lie below it, where
+              its edges start, and the edges' labels and target nodes
+
+Build one from a text wordlist with
+
+    python -m extensions.util.wordstore [--phrases] words.txt words.store
+
+and point the wordlist config at the .store file instead.
+"""
+
+import array
+import bisect
+import mmap
+import struct
+import sys
+import time
+
+from extensions.util.words import WordIndex, letter_mask, read_ranked, signature
+
+MAGIC = b"PZWL"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+SECTION = struct.Struct("<8sQQ")
+
+
+def is_store(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _u32(values):
+    column = array.array("I", values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _build_dawg(words):
+    """(final, counts, edgeidx, labels, targets) for sorted `words`, using
+    Daciuk et al.'s incremental construction for sorted input"""
+    edges = [{}]
+    final = [False]
+    register = {}
+    # (parent, label, child) along the previous word, not yet minimized
+    unchecked = []
+
+    def minimize(down_to):
+        while len(unchecked) > down_to:
+            parent, label, child = unchecked.pop()
+            key = (final[child], tuple(sorted(edges[child].items())))
+            if key in register:
+                edges[parent][label] = register[key]
+            else:
+                register[key] = child
+
+    previous = ""
+    for word in words:
+        common = 0
+        while (
+            common < len(word)
+            and common < len(previous)
+            and word[common] == previous[common]
+        ):
+            common += 1
+        minimize(common)
+        node = unchecked[-1][2] if unchecked else 0
+        for label in word[common:]:
+            edges.append({})
+            final.append(False)
+            child = len(edges) - 1
+            edges[node][label] = child
+            unchecked.append((node, label, child))
+            node = child
+        final[node] = True
+        previous = word
+    minimize(0)
+
+    # Renumber the surviving nodes breadth-first from the root
+    numbering = {0: 0}
+    order = [0]
+    for node in order:
+        for _, child in sorted(edges[node].items()):
+            if child not in numbering:
+                numbering[child] = len(order)
+                order.append(child)
+    # Entries below each node, children first (BFS order isn't topological,
+    # since nodes are shared)
+    counts = [None] * len(order)
+    stack = [0]
+    while stack:
+        node = stack[-1]
+        pending = [
+            child for child in edges[node].values() if counts[numbering[child]] is None
+        ]
+        if pending:
+            stack += pending
+            continue
+        stack.pop()
+        counts[numbering[node]] = int(final[node]) + sum(
+            counts[numbering[child]] for child in edges[node].values()
+        )
+    edgeidx = [0]
+    labels = bytearray()
+    targets = []
+    for node in order:
+        for label, child in sorted(edges[node].items()):
+            labels.append(ord(label))
+            targets.append(numbering[child])
+        edgeidx.append(len(targets))
+    return (
+        bytes(int(final[node]) for node in order),
+        counts,
+        edgeidx,
+        bytes(labels),
+        targets,
+    )
+
+
+def build(entries, path):
+    """Writes a store for `entries` (ASCII strings, most common first)"""
+    num_entries = len(entries)
+    # entry -> rank, with entries bucketed by length then sorted
+    entry_ranks = sorted(
+        range(num_entries), key=lambda rank: (len(entries[rank]), entries[rank])
+    )
+    by_rank = [0] * num_entries
+    for entry, rank in enumerate(entry_ranks):
+        by_rank[rank] = entry
+
+    blob = bytearray()
+    buckets = []
+    lenrank = []
+    for entry, rank in enumerate(entry_ranks):
+        text = entries[rank]
+        if not buckets or buckets[-1][0] != len(text):
+            buckets.append((len(text), entry, len(blob)))
+        blob += text.encode("ascii")
+    for n, (_, first, _) in enumerate(buckets):
+        last = buckets[n + 1][1] if n + 1 < len(buckets) else num_entries
+        lenrank += sorted(entry_ranks[first:last])
+
+    alphabetical = sorted(
+        range(num_entries), key=lambda entry: entries[entry_ranks[entry]]
+    )
+    final, counts, edgeidx, labels, targets = _build_dawg(
+        entries[entry_ranks[entry]] for entry in alphabetical
+    )
+    sections = [
+        (b"blob", bytes(blob)),
+        (b"buckets", _u32(value for bucket in buckets for value in bucket)),
+        (b"ranks", _u32(entry_ranks)),
+        (b"byrank", _u32(by_rank)),
+        (b"lenrank", _u32(lenrank)),
+        (b"masks", _u32(letter_mask(entry) for entry in entries)),
+        (
+            b"sigs",
+            _u32(
+                sorted(
+                    range(num_entries),
+                    key=lambda rank: (signature(entries[rank]), rank),
+                )
+            ),
+        ),
+        (b"alpha", _u32(alphabetical)),
+        (b"final", final),
+        (b"counts", _u32(counts)),
+        (b"edgeidx", _u32(edgeidx)),
+        (b"labels", labels),
+        (b"targets", _u32(targets)),
+    ]
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        offset = HEADER.size + SECTION.size * len(sections)
+        table = []
+        for name, data in sections:
+            offset += -offset % 8
+            table.append((name, offset, len(data)))
+            offset += len(data)
+        for entry in table:
+            f.write(SECTION.pack(*entry))
+        for (name, offset, _), (_, data) in zip(table, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+
+
+class _View:
+    """A read-only sequence computed from another"""
+
+    def __init__(self, length, getter):
+        self.length = length
+        self.getter = getter
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        return self.getter(i)
+
+
+class _Stop(Exception):
+    pass
+
+
+class WordStore(WordIndex):
+    """A store opened read-only, which can stand in for a WordIndex (and
+    back a nutrimatic PhraseIndex) without loading anything up front"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_sections = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} isn't a version {VERSION} wordlist store")
+        self.sections = {}
+        # Every view into the mmap, to release before closing it
+        self.views = []
+        for n in range(num_sections):
+            name, offset, size = SECTION.unpack_from(
+                self.mm, HEADER.size + n * SECTION.size
+            )
+            self.sections[name.rstrip(b"\0").decode()] = (offset, size)
+
+        self.blob = self._bytes("blob")
+        self.final = self._bytes("final")
+        self.labels = self._bytes("labels")
+        for name in [
+            "ranks",
+            "byrank",
+            "lenrank",
+            "masks",
+            "sigs",
+            "alpha",
+            "counts",
+            "edgeidx",
+            "targets",
+        ]:
+            setattr(self, name, self._u32(name))
+        buckets = self._u32("buckets")
+        self.buckets = [tuple(buckets[n : n + 3]) for n in range(0, len(buckets), 3)]
+        self.bucket_starts = [first for _, first, _ in self.buckets]
+
+        num_entries = len(self.ranks)
+        self.words = _View(num_entries, lambda rank: self.entry(self.byrank[rank]))
+        self.by_length = {}
+        for n, (length, first, _) in enumerate(self.buckets):
+            last = self.buckets[n + 1][1] if n + 1 < len(self.buckets) else num_entries
+            self.by_length[length] = self.lenrank[first:last]
+            self.views.append(self.by_length[length])
+        self.phrases = _View(num_entries, lambda i: self.entry(self.alpha[i]))
+        self.alpha_ranks = _View(num_entries, lambda i: self.ranks[self.alpha[i]])
+        self._signatures = _View(
+            num_entries, lambda i: signature(self.words[self.sigs[i]])
+        )
+
+    def _bytes(self, name):
+        offset, size = self.sections[name]
+        view = memoryview(self.mm)
+        self.views += [view, view[offset : offset + size]]
+        return self.views[-1]
+
+    def _u32(self, name):
+        data = self._bytes(name)
+        if sys.byteorder == "little":
+            self.views.append(data.cast("I"))
+            return self.views[-1]
+        column = array.array("I")
+        column.frombytes(data)
+        column.byteswap()
+        return column
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def entry(self, entry):
+        n = bisect.bisect_right(self.bucket_starts, entry) - 1
+        length, first, offset = self.buckets[n]
+        start = offset + (entry - first) * length
+        return bytes(self.blob[start : start + length]).decode("ascii")
+
+    def anagrams(self, word):
+        key = signature(word)
+        lo = bisect.bisect_left(self._signatures, key)
+        hi = bisect.bisect_right(self._signatures, key, lo)
+        return list(self.sigs[lo:hi])
+
+    def walk(self, start, step, accepts, budget=2.0, max_matches=5000):
+        """Runs an automaton over the DAWG: `step(state, c)` gives the next
+        state (falsy once it can't match), and `accepts(state)` says whether
+        it matches. Returns alphabetical positions of the matching entries,
+        and whether we stopped early. Since the DAWG shares suffixes, we
+        remember which (node, state) pairs led nowhere and never retry them."""
+        final, counts, edgeidx = self.final, self.counts, self.edgeidx
+        labels, targets = self.labels, self.targets
+        deadline = time.perf_counter() + budget
+        matches = []
+        dead = set()
+        visits = 0
+
+        def visit(node, state, position):
+            nonlocal visits
+            visits += 1
+            if visits % 1024 == 0 and time.perf_counter() > deadline:
+                raise _Stop
+            found = False
+            if final[node]:
+                if accepts(state):
+                    matches.append(position)
+                    found = True
+                    if len(matches) >= max_matches:
+                        raise _Stop
+                position += 1
+            for edge in range(edgeidx[node], edgeidx[node + 1]):
+                child = targets[edge]
+                next_state = step(state, chr(labels[edge]))
+                if next_state and (child, next_state) not in dead:
+                    found = visit(child, next_state, position) or found
+                position += counts[child]
+            if not found:
+                dead.add((node, state))
+            return found
+
+        try:
+            visit(0, start, 0)
+        except _Stop:
+            return matches, True
+        return matches, False
+
+    def close(self):
+        for view in reversed(self.views):
+            view.release()
+        self.mm.close()
+
+
+def main():
+    import argparse
+    from extensions.util.nutrimatic import normalize
+    from extensions.util.words import normalize_word
+
+    parser = argparse.ArgumentParser(description="Builds a wordlist store")
+    parser.add_argument(
+        "--phrases",
+        action="store_true",
+        help="keep spaces and digits, for nutrimatic, rather than just words",
+    )
+    parser.add_argument("wordlist", help="one entry per line, or entry<TAB>count")
+    parser.add_argument("store", help="where to write the store")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    entries = read_ranked(args.wordlist, normalize if args.phrases else normalize_word)
+    build(entries, args.store)
+    print(f"Stored {len(entries)} entries in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#! /usr/bin/python3
+
+"""Summarizes a bot.log after the fact: metrics snapshots, Puzzleboss REST
+calls and command invocations, in one streaming pass over the file.
+
+Rather than splitting the whole log into lines, we mmap it and jump straight
+from one marker to the next with find(), so only the lines we care about ever
+get decoded. Memory use is bounded by the number of distinct commands, REST
+paths, hours and metrics fields, not by the size of the log.
+
+Usage: ./logstats.py logs/bot.log [--store logs/metrics] [--json out.json]
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+from extensions.util.timeseries import ColumnStore, flatten
+
+SNAPSHOT = b"<<<METRICS_SNAPSHOT>>> "
+COMMAND = b"<<<COMMAND>>> "
+GET = b"] - GET to "
+POST = b"] - POST to "
+
+COMMAND_LINE = re.compile(
+    r"!(\S+(?: \S+)*?) by (\d+) in (\d+) (ok|failed) \(([\d.]+)s\)"
+)
+REST_LINE = re.compile(r"(\S+) ;.* Response status = (\d+)")
+ID_PART = re.compile(r"/\d+(?=/|$)")
+
+
+class Stats:
+    """Streaming min/max/mean"""
+
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+        }
+
+
+class LogStats:
+    def __init__(self, store=None, batch_size=1000):
+        self.store = store
+        self.batch = []
+        self.batch_size = batch_size
+        self.minutes = {}
+        self.first = None
+        self.last = None
+        self.fields = {}
+        self.snapshots = 0
+        self.commands = {}
+        self.commands_per_hour = {}
+        self.rest = {}
+
+    def timestamp(self, line):
+        """POSIX time from the asctime at the start of a log line"""
+        minute = line[:16]
+        if minute not in self.minutes:
+            self.minutes[minute] = time.mktime(time.strptime(minute, "%Y-%m-%d %H:%M"))
+        return self.minutes[minute] + int(line[17:19])
+
+    def on_snapshot(self, line, message):
+        payload = json.loads(message[message.index("{") :])
+        values = flatten(payload)
+        for field, value in values.items():
+            self.fields.setdefault(field, Stats()).add(value)
+        self.snapshots += 1
+        if self.store is not None:
+            self.batch.append((self.timestamp(line), values))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def on_command(self, line, message):
+        match = COMMAND_LINE.match(message)
+        if not match:
+            return
+        name, _, _, result, elapsed = match.groups()
+        if name not in self.commands:
+            self.commands[name] = {"failed": 0, "seconds": Stats()}
+        self.commands[name]["seconds"].add(float(elapsed))
+        if result == "failed":
+            self.commands[name]["failed"] += 1
+        hour = line[:13] + ":00"
+        self.commands_per_hour[hour] = self.commands_per_hour.get(hour, 0) + 1
+
+    def on_rest(self, method):
+        def handle(line, message):
+            match = REST_LINE.match(message)
+            if not match:
+                return
+            path, status = match.groups()
+            key = "{} {}".format(method, ID_PART.sub("/{id}", path))
+            if key not in self.rest:
+                self.rest[key] = {}
+            self.rest[key][status] = self.rest[key].get(status, 0) + 1
+
+        return handle
+
+    def flush(self):
+        if self.store is not None and self.batch:
+            self.store.append_many(self.batch)
+        self.batch = []
+
+    def scan(self, path):
+        handlers = {
+            SNAPSHOT: self.on_snapshot,
+            COMMAND: self.on_command,
+            GET: self.on_rest("GET"),
+            POST: self.on_rest("POST"),
+        }
+        if not os.path.getsize(path):
+            return
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            # Next occurrence of each marker, visited in file order
+            upcoming = [(mm.find(marker), marker) for marker in handlers]
+            upcoming = [(pos, marker) for pos, marker in upcoming if pos >= 0]
+            heapq.heapify(upcoming)
+            while upcoming:
+                pos, marker = heapq.heappop(upcoming)
+                start = mm.rfind(b"\n", 0, pos) + 1
+                end = mm.find(b"\n", pos)
+                if end < 0:
+                    end = len(mm)
+                line = mm[start:end].decode("utf-8", errors="replace")
+                message = mm[pos + len(marker) : end].decode("utf-8", errors="replace")
+                try:
+                    timestamp = self.timestamp(line)
+                    handlers[marker](line, message)
+                    if self.first is None:
+                        self.first = timestamp
+                    self.last = timestamp
+                except ValueError:
+                    # Not one of ours after all, or a truncated line
+                    pass
+                pos = mm.find(marker, end)
+                if pos >= 0:
+                    heapq.heappush(upcoming, (pos, marker))
+        self.flush()
+
+    def to_dict(self):
+        def iso(timestamp):
+            if timestamp is None:
+                return None
+            return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+        return {
+            "first": iso(self.first),
+            "last": iso(self.last),
+            "snapshots": self.snapshots,
+            "metrics": {
+                field: stats.to_dict() for field, stats in sorted(self.fields.items())
+            },
+            "commands": {
+                name: dict(command["seconds"].to_dict(), failed=command["failed"])
+                for name, command in sorted(
+                    self.commands.items(), key=lambda item: -item[1]["seconds"].count
+                )
+            },
+            "commands_per_hour": dict(sorted(self.commands_per_hour.items())),
+            "rest": {
+                key: statuses
+                for key, statuses in sorted(
+                    self.rest.items(), key=lambda item: -sum(item[1].values())
+                )
+            },
+        }
+
+
+def print_report(report, out=sys.stdout):
+    print(f"Log covers {report['first']} to {report['last']}", file=out)
+
+    print(f"\n{report['snapshots']} metrics snapshots:", file=out)
+    for field, stats in report["metrics"].items():
+        print(
+            "  {:<40} min {:>8g}  max {:>8g}  mean {:>10.2f}".format(
+                field, stats["min"], stats["max"], stats["mean"]
+            ),
+            file=out,
+        )
+
+    print("\nCommands:", file=out)
+    for name, stats in report["commands"].items():
+        print(
+            "  !{:<24} {:>6} calls  {:>4} failed  mean {:.3f}s  max {:.3f}s".format(
+                name, stats["count"], stats["failed"], stats["mean"], stats["max"]
+            ),
+            file=out,
+        )
+
+    print("\nCommands per hour:", file=out)
+    busiest = max(report["commands_per_hour"].values(), default=0)
+    for hour, count in report["commands_per_hour"].items():
+        bar = "#" * round(40 * count / busiest)
+        print(f"  {hour}  {count:>5}  {bar}", file=out)
+
+    print("\nPuzzleboss REST calls:", file=out)
+    for key, statuses in report["rest"].items():
+        print(
+            "  {:<40} {:>6}  ({})".format(
+                key,
+                sum(statuses.values()),
+                ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items())),
+            ),
+            file=out,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("logs", nargs="+", help="bot.log files, oldest first")
+    parser.add_argument(
+        "--store", help="also write metrics snapshots into a columnar store here"
+    )
+    parser.add_argument("--json", help="write the full report as JSON here")
+    args = parser.parse_args()
+
+    stats = LogStats(store=ColumnStore(args.store) if args.store else None)
+    started = time.perf_counter()
+    for path in args.logs:
+        stats.scan(path)
+    report = stats.to_dict()
+
+    print_report(report)
+    print(f"\n(Scanned in {time.perf_counter() - started:.2f}s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
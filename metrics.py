@@ -0,0 +1,225 @@
+"""Prometheus-style metrics, served as text from a small local HTTP endpoint"""
+
+import asyncio
+import bisect
+import logging
+import time
+
+from config import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}
+background_tasks = set()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{%s}" % ",".join(
+            '{}="{}"'.format(
+                label,
+                value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+            )
+            for label, value in pairs
+        )
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            # Per-bucket counts (non-cumulative), then sum and count
+            self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        counts, total, n = self.values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[key][1:] = [total + value, n + 1]
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, n) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = self._format_labels(key, ("le", str(bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {n}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _get_or_create(cls, name, help, labels, **kwargs):
+    if name not in registry:
+        registry[name] = cls(name, help, labels, **kwargs)
+    return registry[name]
+
+
+def counter(name, help, labels=()):
+    return _get_or_create(Counter, name, help, labels)
+
+
+def gauge(name, help, labels=()):
+    return _get_or_create(Gauge, name, help, labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+
+def render():
+    lines = []
+    for metric in registry.values():
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+COMMAND_LATENCY = histogram(
+    "puzzcord_command_duration_seconds",
+    "Time spent handling a command",
+    labels=["command"],
+)
+GATEWAY_EVENTS = counter(
+    "puzzcord_gateway_events_total",
+    "Gateway events received from Discord",
+    labels=["event"],
+)
+DB_LATENCY = histogram(
+    "puzzcord_db_query_duration_seconds",
+    "Time spent on SQL queries",
+    labels=["query"],
+)
+REST_LATENCY = histogram(
+    "puzzcord_rest_request_duration_seconds",
+    "Time spent on Puzzleboss REST calls",
+    labels=["method", "status"],
+)
+DISCORD_RATE_LIMITS = counter(
+    "puzzcord_discord_rate_limits_total",
+    "429 responses from the Discord API",
+)
+DISCORD_RATE_LIMITS.inc(0)
+EVENT_LOOP_LAG = gauge(
+    "puzzcord_event_loop_lag_seconds",
+    "How late a 1 second asyncio sleep woke up, most recently",
+)
+
+
+class RateLimitHandler(logging.Handler):
+    """Counts the warnings discord.py logs whenever it gets a 429"""
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING:
+            return
+        if "rate limit" in record.getMessage().lower():
+            DISCORD_RATE_LIMITS.inc()
+
+
+async def track_event_loop_lag(interval=1.0):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, time.perf_counter() - start - interval))
+
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Drain the headers; we don't need any of them
+        while (await reader.readline()) not in [b"\r\n", b"\n", b""]:
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+            status = "200 OK"
+            body = render().encode()
+        else:
+            status = "404 Not Found"
+            body = b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logging.error(e, exc_info=e)
+    finally:
+        writer.close()
+
+
+async def start(port_key):
+    """Starts /metrics on the configured port, plus the bookkeeping tasks.
+    `port_key` picks which process's port to use from `metrics_server`."""
+    server_config = config.get("metrics_server", None)
+    if not server_config or not server_config.get(port_key, None):
+        logging.info("No metrics_server config found, not serving /metrics")
+        return None
+    logging.getLogger("discord.http").addHandler(RateLimitHandler())
+    task = asyncio.create_task(track_event_loop_lag())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    server = await asyncio.start_server(
+        _handle_request,
+        host=server_config.get("host", "127.0.0.1"),
+        port=server_config[port_key],
+    )
+    logging.info("Serving /metrics on {}".format(server.sockets[0].getsockname()))
+    return server